@@ -1,6 +1,121 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.options import InlineModelAdmin
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponse
 
-from .models import Edge, File, Node, Pause, Skill, SkillProgress, Tree
+from .models import (
+    Edge, File, Node, Pause, ProgressEvent, RequestProfile, Skill, SkillProgress, Tree, TreeProgress,
+)
+from .ordering import graph_edit_errors, rebuild_learning_order, rebuild_pending
+from .packages import clone_tree
+from .profiling import dump_stats, load_stats, report
+
+
+class LearningOrderAdminMixin:
+    """Rebuild learning order inside the admin's transaction and report graph problems."""
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        for tree_id, errors in rebuild_pending().items():
+            for error in errors:
+                self.message_user(request, f'Tree {tree_id}: {error}', messages.WARNING)
+
+
+def check_graph_edit(tree_id, edges, replaced=()):
+    """Raise ValidationError if the tree would have a cycle with `edges` in place of the edges `replaced`."""
+    errors = graph_edit_errors(tree_id, add=edges, remove=replaced)
+    if errors:
+        raise ValidationError(errors)
+
+
+class EdgeForm(forms.ModelForm):
+    """Rejects edges between two trees and edges that would close a prerequisite cycle."""
+
+    class Meta:
+        model = Edge
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        from_node, to_node = cleaned_data.get('from_node'), cleaned_data.get('to_node')
+        if from_node is None or to_node is None or cleaned_data.get('priority') is None:
+            return cleaned_data
+        if from_node.tree_id != to_node.tree_id:
+            raise ValidationError('Both nodes of an edge must be in the same tree.')
+        replaced = [self.instance.pk] if self.instance.pk else []
+        check_graph_edit(from_node.tree_id, [(from_node.pk, to_node.pk, cleaned_data['priority'])], replaced)
+        return cleaned_data
+
+
+class OutgoingEdgeFormSet(BaseInlineFormSet):
+    """Checks a node's outgoing edges together, since rows can replace each other."""
+
+    def clean(self):
+        super().clean()
+        node = self.instance
+        edges, replaced = [], []
+        for form in self.forms:
+            if form.instance.pk:
+                replaced.append(form.instance.pk)
+            cleaned_data = getattr(form, 'cleaned_data', None)
+            if not cleaned_data or (self.can_delete and self._should_delete_form(form)):
+                continue
+            to_node = cleaned_data.get('to_node')
+            if to_node is None or cleaned_data.get('priority') is None:
+                continue
+            if to_node.tree_id != node.tree_id:
+                raise ValidationError(f'{to_node} is not in the same tree as this node.')
+            edges.append((node.pk, to_node.pk, cleaned_data['priority']))
+        # A new node has no incoming edges, so its outgoing ones cannot close a cycle
+        if node.pk is not None:
+            check_graph_edit(node.tree_id, edges, replaced)
+
+
+class NodeForm(forms.ModelForm):
+    """Keeps a node with prerequisites in its tree; their edges would join two trees."""
+
+    class Meta:
+        model = Node
+        fields = '__all__'
+
+    def clean_tree(self):
+        tree = self.cleaned_data['tree']
+        node = self.instance
+        if node.pk and tree.pk != node.tree_id and node.incoming_edges.exists():
+            raise ValidationError('Remove the edges leading to this node before moving it to another tree.')
+        return tree
+
+
+class RelatedChoicesMixin:
+    """
+    Label Node choices without two queries per option (Node.__str__ reads the
+    tree and skill), and in inlines evaluate each select's choices once per
+    formset instead of once per form. Inlines name the relations their rows'
+    __str__ reads in `select_related_fields`.
+    """
+
+    select_related_fields = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        return queryset
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.related_model is Node and 'queryset' not in kwargs:
+            kwargs['queryset'] = Node.objects.select_related('tree', 'skill')
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if (
+            field is not None
+            and isinstance(self, InlineModelAdmin)
+            and db_field.name not in self.raw_id_fields
+            and db_field.name not in self.autocomplete_fields
+        ):
+            field.choices = list(field.choices)
+        return field
 
 
 @admin.register(File)
@@ -10,8 +125,9 @@ class FileAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description']
 
 
-class PauseInline(admin.TabularInline):
+class PauseInline(RelatedChoicesMixin, admin.TabularInline):
     model = Pause
+    select_related_fields = ['skill']
     extra = 1
 
 
@@ -19,7 +135,7 @@ class PauseInline(admin.TabularInline):
 class SkillAdmin(admin.ModelAdmin):
     list_display = ['title', 'duration', 'creator', 'created_at']
     list_filter = ['creator', 'created_at']
-    search_fields = ['title', 'text']
+    search_fields = ['title', 'text', 'key']
     filter_horizontal = ['resources']
     inlines = [PauseInline]
 
@@ -31,36 +147,62 @@ class PauseAdmin(admin.ModelAdmin):
     search_fields = ['title']
 
 
-class NodeInline(admin.TabularInline):
+class NodeInline(RelatedChoicesMixin, admin.TabularInline):
     model = Node
+    select_related_fields = ['tree', 'skill']
     extra = 1
 
 
-class EdgeInline(admin.TabularInline):
+class EdgeInline(RelatedChoicesMixin, admin.TabularInline):
     model = Edge
     fk_name = 'from_node'
+    formset = OutgoingEdgeFormSet
+    select_related_fields = ['from_node__skill', 'to_node__skill']
     extra = 1
 
 
 @admin.register(Tree)
-class TreeAdmin(admin.ModelAdmin):
+class TreeAdmin(LearningOrderAdminMixin, admin.ModelAdmin):
     list_display = ['title', 'goal_skill', 'is_free', 'created_at']
     list_filter = ['is_free', 'created_at']
     search_fields = ['title', 'description']
+    readonly_fields = ['graph_errors']
     inlines = [NodeInline]
+    actions = ['rebuild_order', 'clone']
+
+    def get_queryset(self, request):
+        # Tree.layout is not editable and can be large
+        return super().get_queryset(request).defer('layout')
+
+    @admin.action(description='Clone selected trees')
+    def clone(self, request, queryset):
+        for tree in queryset:
+            copy = clone_tree(tree)
+            self.message_user(request, f'{tree}: cloned as tree {copy.pk}')
+
+    @admin.action(description='Rebuild learning order')
+    def rebuild_order(self, request, queryset):
+        for tree in queryset:
+            errors = rebuild_learning_order(tree.pk)
+            if errors:
+                self.message_user(request, f'{tree}: ' + '; '.join(errors), messages.WARNING)
+            else:
+                self.message_user(request, f'{tree}: learning order rebuilt')
 
 
 @admin.register(Node)
-class NodeAdmin(admin.ModelAdmin):
-    list_display = ['tree', 'skill']
+class NodeAdmin(LearningOrderAdminMixin, admin.ModelAdmin):
+    list_display = ['tree', 'skill', 'position', 'depth']
     list_filter = ['tree']
     search_fields = ['skill__title']
+    form = NodeForm
     inlines = [EdgeInline]
 
 
 @admin.register(Edge)
-class EdgeAdmin(admin.ModelAdmin):
+class EdgeAdmin(RelatedChoicesMixin, LearningOrderAdminMixin, admin.ModelAdmin):
     list_display = ['from_node', 'to_node', 'optional', 'priority']
+    form = EdgeForm
     list_filter = ['optional', 'from_node__tree']
 
 
@@ -69,3 +211,59 @@ class SkillProgressAdmin(admin.ModelAdmin):
     list_display = ['user', 'skill', 'status', 'video_position', 'started_at', 'completed_at']
     list_filter = ['status', 'skill']
     search_fields = ['user__username', 'skill__title']
+
+
+@admin.register(TreeProgress)
+class TreeProgressAdmin(admin.ModelAdmin):
+    list_display = ['user', 'tree', 'completed_nodes', 'total_nodes', 'next_node', 'updated_at']
+    list_filter = ['tree']
+    search_fields = ['user__username', 'tree__title']
+    raw_id_fields = ['next_node', 'last_node']
+
+
+@admin.register(ProgressEvent)
+class ProgressEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'skill', 'kind', 'node', 'position', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['user__username', 'skill__title']
+    raw_id_fields = ['user', 'skill', 'node']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view', 'status', 'duration_ms', 'queries', 'trigger', 'user']
+    list_filter = ['trigger', 'view', 'method']
+    search_fields = ['path', 'view']
+    list_select_related = ['user']
+    exclude = ['stats']
+    readonly_fields = [
+        'created_at', 'method', 'path', 'view', 'status', 'user', 'trigger', 'duration_ms', 'queries', 'summary',
+    ]
+    actions = ['download', 'hot_functions']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Download profile (.prof, merged if several)')
+    def download(self, request, queryset):
+        stats = load_stats(queryset.values_list('stats', flat=True).iterator())
+        ids = list(queryset.values_list('pk', flat=True)[:2])
+        name = f'request-{ids[0]}.prof' if len(ids) == 1 else 'requests-merged.prof'
+        response = HttpResponse(dump_stats(stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+    @admin.action(description='Show hot functions across selected requests')
+    def hot_functions(self, request, queryset):
+        stats = load_stats(queryset.values_list('stats', flat=True).iterator())
+        count = queryset.count()
+        text = (
+            f'{count} profiled requests\n\n'
+            f'By own time:\n{report(stats, "tottime")}\n'
+            f'By cumulative time:\n{report(stats, "cumulative")}'
+        )
+        return HttpResponse(text, content_type='text/plain; charset=utf-8')
+
@@ -0,0 +1,273 @@
+"""
+Compiled tree artifacts.
+
+Everything `tree_detail` needs that does not depend on the current user (node
+table, edges, goal node, learning sequence, the precomputed layout and the
+compact structure payload) is compiled once per tree version and kept in a
+bounded, process-local LRU cache. `Tree.version` is bumped by the signal handlers in `skills.signals`
+whenever the tree's graph or content changes, so every worker notices stale
+entries on its next lookup.
+"""
+import json
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+from django.conf import settings
+from django.db.models import F
+
+from .metrics import cache_requests, tree_edges, tree_nodes
+from .models import Node, Tree
+
+# Bump with the decoder in tree_detail.html whenever the structure payload changes shape
+STRUCTURE_FORMAT = 3
+
+
+class TreeArtifact:
+    """Immutable, user-independent snapshot of one tree version."""
+
+    def __init__(self, tree_id, version, node_ids, node_skill, edges, goal_node_id,
+                 sequence, sequence_items, skills, layout):
+        self.tree_id = tree_id
+        self.version = version
+        # Node ids in tree order, plus node_id -> skill_id
+        self.node_ids = node_ids
+        self.node_skill = node_skill
+        # (from_node_id, to_node_id, priority) tuples
+        self.edges = edges
+        self.goal_node_id = goal_node_id
+        # Learning order: node ids, leaves first, goal last
+        self.sequence = sequence
+        # Index maps for the status engine
+        self.position_of = {node_id: i for i, node_id in enumerate(sequence)}
+        self.sequence_skills = [node_skill[node_id] for node_id in sequence]
+        # Sidebar entries, without per-user flags
+        self.sequence_items = sequence_items
+        # Skill dictionary of the structure payload: ids, names and video URLs
+        self.skills = skills
+        # Tree.layout: drawing size and node coordinates from skills.layout
+        self.layout = layout
+
+    @cached_property
+    def skill_ids(self):
+        return frozenset(self.node_skill.values())
+
+    @cached_property
+    def structure_json(self):
+        """
+        Serialized payload for the `tree_structure` endpoint, decoded by
+        `decodeStructure` in tree_detail.html. Every skill is sent once;
+        nodes, edges and the sequence refer to skills and nodes by index.
+        """
+        node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        skill_index = {skill_id: i for i, skill_id in enumerate(self.skills['ids'])}
+        edges = []
+        for from_id, to_id, _ in self.edges:
+            edges.extend((node_index[from_id], node_index[to_id]))
+        coordinates = self.layout.get('nodes', {})
+        xy = []
+        for node_id in self.node_ids:
+            xy.extend(coordinates.get(str(node_id), ()))
+        return json.dumps({
+            'format': STRUCTURE_FORMAT,
+            'version': self.version,
+            'skills': self.skills,
+            'nodes': {
+                # Ids as differences from the previous one: mostly 1s
+                'ids': [b - a for a, b in zip([0] + self.node_ids, self.node_ids)],
+                'skills': [skill_index[self.node_skill[node_id]] for node_id in self.node_ids],
+            },
+            'edges': edges,
+            'sequence': [node_index[node_id] for node_id in self.sequence],
+            # Flat x, y pairs in node order; empty unless every node has one (the client lays out then)
+            'layout': {
+                'width': self.layout.get('width', 0),
+                'height': self.layout.get('height', 0),
+                'xy': xy if len(xy) == 2 * len(self.node_ids) else [],
+            },
+        }, separators=(',', ':'))
+
+
+def build_artifacts(trees):
+    """Compile artifacts for several trees with a fixed number of queries."""
+    trees = list(trees)
+    nodes_by_tree = {tree.pk: [] for tree in trees}
+    # Pauses are served per skill by skills.pauses when the player opens
+    nodes = Node.objects.filter(tree_id__in=nodes_by_tree).select_related('skill').prefetch_related(
+        'incoming_edges',
+    )
+    for node in nodes:
+        nodes_by_tree[node.tree_id].append(node)
+    # Callers load trees with only('id', 'version'); the layout comes in one query for all of them
+    layouts = dict(Tree.objects.filter(pk__in=nodes_by_tree).values_list('pk', 'layout'))
+    return {
+        tree.pk: _compile(tree, nodes_by_tree[tree.pk], layouts.get(tree.pk) or {})
+        for tree in trees
+    }
+
+
+def build_artifact(tree):
+    """Compile the artifact for the current state of `tree`."""
+    return build_artifacts([tree])[tree.pk]
+
+
+def _compile(tree, nodes, layout):
+    node_by_id = {n.id: n for n in nodes}
+
+    # Skills are shared by every node instance, so they are listed once
+    skills = {'ids': [], 'names': [], 'videos': []}
+    seen_skills = set()
+    edges = []
+    for node in nodes:
+        if node.skill_id not in seen_skills:
+            seen_skills.add(node.skill_id)
+            skills['ids'].append(node.skill_id)
+            skills['names'].append(node.skill.title)
+            skills['videos'].append(node.skill.video_url)
+        for edge in node.incoming_edges.all():
+            # Edges from other trees cannot be drawn
+            if edge.from_node_id in node_by_id:
+                edges.append((edge.from_node_id, node.id, edge.priority))
+
+    # Learning order is materialized on the nodes by skills.ordering
+    sequence = [n.id for n in sorted(
+        (n for n in nodes if n.position is not None),
+        key=lambda n: n.position,
+    )]
+
+    sequence_items = []
+    for node_id in sequence:
+        node = node_by_id[node_id]
+        sequence_items.append({
+            'node_id': f'n{node_id}',
+            'skill_id': node.skill_id,
+            'name': node.skill.title,
+        })
+
+    tree_nodes.set(len(nodes), tree=tree.pk)
+    tree_edges.set(len(edges), tree=tree.pk)
+    return TreeArtifact(
+        tree_id=tree.pk,
+        version=tree.version,
+        node_ids=[n.id for n in nodes],
+        node_skill={n.id: n.skill_id for n in nodes},
+        edges=edges,
+        goal_node_id=sequence[-1] if sequence else None,
+        sequence=sequence,
+        sequence_items=sequence_items,
+        skills=skills,
+        layout=layout,
+    )
+
+
+class ArtifactCache:
+    """Thread-safe LRU of compiled artifacts, one entry per tree."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tree):
+        """Return the artifact for `tree`, compiling it if missing or stale."""
+        return self.get_many([tree])[tree.pk]
+
+    def get_many(self, trees):
+        """Return {tree_id: artifact}, compiling all misses in one batch."""
+        found = {}
+        missing = []
+        with self._lock:
+            for tree in trees:
+                artifact = self._entries.get(tree.pk)
+                if artifact is not None and artifact.version == tree.version:
+                    self._entries.move_to_end(tree.pk)
+                    found[tree.pk] = artifact
+                else:
+                    missing.append(tree)
+        if found:
+            cache_requests.inc(len(found), cache='tree_artifact', result='hit')
+        if not missing:
+            return found
+
+        cache_requests.inc(len(missing), cache='tree_artifact', result='miss')
+        # Compile outside the lock; concurrent misses just build twice
+        built = build_artifacts(missing)
+        with self._lock:
+            for tree_id, artifact in built.items():
+                self._entries[tree_id] = artifact
+                self._entries.move_to_end(tree_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        found.update(built)
+        return found
+
+    def invalidate(self, tree_ids):
+        with self._lock:
+            for tree_id in tree_ids:
+                self._entries.pop(tree_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+artifact_cache = ArtifactCache(settings.TREE_ARTIFACT_CACHE_SIZE)
+
+
+def bump_tree_versions(tree_ids):
+    """Advance the version of the given trees and drop their local artifacts."""
+    tree_ids = {tid for tid in tree_ids if tid is not None}
+    if not tree_ids:
+        return
+    Tree.objects.filter(pk__in=tree_ids).update(version=F('version') + 1)
+    artifact_cache.invalidate(tree_ids)
+
+
+def get_tree_artifact(tree):
+    """Return the compiled artifact for `tree` (needs `tree.version` loaded)."""
+    return artifact_cache.get(tree)
+
+
+def get_tree_artifacts(trees):
+    """Return {tree_id: artifact} for several trees."""
+    return artifact_cache.get_many(trees)
+
+
+class SkillTreeIndex:
+    """Inverted index: skill id -> ids of the trees that contain it."""
+
+    def __init__(self, artifacts):
+        self.signature = frozenset((a.tree_id, a.version) for a in artifacts)
+        self.trees_by_skill = {}
+        for artifact in artifacts:
+            for skill_id in artifact.skill_ids:
+                self.trees_by_skill.setdefault(skill_id, set()).add(artifact.tree_id)
+
+    def trees_for(self, skill_ids):
+        tree_ids = set()
+        for skill_id in skill_ids:
+            tree_ids.update(self.trees_by_skill.get(skill_id, ()))
+        return tree_ids
+
+
+_index_lock = threading.Lock()
+_index = None
+
+
+def get_skill_tree_index(artifacts):
+    """Return the inverted index for `artifacts`, reusing it while no tree changed."""
+    global _index
+    signature = frozenset((a.tree_id, a.version) for a in artifacts)
+    with _index_lock:
+        if _index is not None and _index.signature == signature:
+            cache_requests.inc(cache='skill_tree_index', result='hit')
+            return _index
+    cache_requests.inc(cache='skill_tree_index', result='miss')
+    index = SkillTreeIndex(artifacts)
+    with _index_lock:
+        _index = index
+    return index
+
@@ -0,0 +1,87 @@
+"""
+Cross-tree "continue learning" overview.
+
+Completion and next node for every tree come from the user's TreeProgress
+rows, the cached artifacts and the user's skill bitmaps, so the query count
+does not grow with the number of trees. Rows computed for an older tree
+version are re-derived in memory; trees sharing none of the user's completed
+skills are answered from the inverted skill index without running the status
+engine. Trees touched by unfolded progress events (skills.events) are always
+re-derived.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.urls import reverse
+
+from .artifacts import get_skill_tree_index, get_tree_artifacts
+from .events import progress_tail, resume_node_id
+from .metrics import cache_requests
+from .models import Tree, TreeProgress
+from .status import compute_status
+
+logger = logging.getLogger(__name__)
+
+
+def dashboard_rows(user):
+    """Return one progress row per tree: in-progress trees first, finished trees last."""
+    started = time.perf_counter()
+    trees = list(Tree.objects.only('id', 'title', 'version', 'is_free').order_by('-preview_type', 'pk'))
+    artifacts = get_tree_artifacts(trees)
+    index = get_skill_tree_index(artifacts.values())
+
+    completed_skill_ids = user.completed_skill_set()
+    ignored_skill_ids = user.ignored_skill_set()
+    touched_tree_ids = index.trees_for(completed_skill_ids)
+    tail = progress_tail(user)
+    pending_tree_ids = index.trees_for(tail.states) | set(tail.cursors)
+    last_node_id = resume_node_id(user)
+    progress_rows = {row.tree_id: row for row in TreeProgress.objects.filter(user=user)}
+
+    rows = []
+    for tree in trees:
+        artifact = artifacts[tree.pk]
+        row = progress_rows.get(tree.pk)
+        cursor = row.last_node_id if row is not None else last_node_id
+        cursor = tail.cursors.get(tree.pk, cursor)
+        if row is not None and row.tree_version == artifact.version and tree.pk not in pending_tree_ids:
+            # Maintained incrementally by skills.progress
+            completed, next_node_id = row.completed_nodes, row.next_node_id
+            cache_requests.inc(cache='tree_progress', result='hit')
+        elif row is not None or tree.pk in touched_tree_ids or cursor in artifact.position_of:
+            cache_requests.inc(cache='tree_progress', result='miss')
+            status = compute_status(artifact, completed_skill_ids, ignored_skill_ids, cursor)
+            completed, next_node_id = status.completed_count, status.next_node_id
+        else:
+            # Nothing done here yet: the first step is next
+            completed = 0
+            next_node_id = artifact.sequence[0] if artifact.sequence else None
+
+        total = len(artifact.sequence)
+        percent = round(100 * completed / total) if total else 0
+        next_skill = None
+        if next_node_id is not None:
+            next_skill = artifact.sequence_items[artifact.position_of[next_node_id]]['name']
+        rows.append({
+            'tree_id': tree.pk,
+            'title': tree.title,
+            'url': reverse('skills:tree_detail', args=[tree.pk]),
+            'is_free': tree.is_free,
+            'completed': completed,
+            'total': total,
+            'percent': percent,
+            'next_node_id': next_node_id,
+            'resume_node_id': cursor if cursor in artifact.position_of else None,
+            'next_skill': next_skill,
+        })
+
+    rows.sort(key=lambda row: (row['percent'] == 100, row['percent'] == 0))
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > settings.DASHBOARD_BUDGET_MS:
+        logger.warning(
+            'Dashboard for user %s took %.1f ms for %d trees (budget %d ms)',
+            user.pk, elapsed_ms, len(trees), settings.DASHBOARD_BUDGET_MS,
+        )
+    return rows
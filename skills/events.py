@@ -0,0 +1,270 @@
+"""
+Append-only progress event log.
+
+With PROGRESS_EVENT_LOG on, learner writes append `ProgressEvent` rows instead
+of updating the M2M tables, skill bitmaps, `User.last_node` and `TreeProgress`
+in place, so a batch of toggles costs one INSERT. `compact_progress_events`
+folds the oldest events into those tables (and `SkillProgress`) in bulk and
+deletes them; a background thread per worker runs it every
+PROGRESS_COMPACT_SECONDS. Reads see the compacted state plus the user's
+unfolded tail (`progress_tail`).
+
+completed, ignored and reset set the state of one skill (reset = neither).
+Events that carry a node move that node's tree resume cursor: to the node for
+completed, cleared otherwise. started and position only feed SkillProgress.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from users.skillsets import rebuild_skill_bitmaps
+
+from .models import ProgressEvent, SkillProgress
+
+logger = logging.getLogger(__name__)
+
+Kind = ProgressEvent.Kind
+
+# Kinds that change whether a skill is completed or ignored
+STATE_KINDS = (Kind.COMPLETED, Kind.IGNORED, Kind.RESET)
+
+# Events folded per compaction transaction
+COMPACT_BATCH = 2000
+
+# Marks "no cursor change in the tail"
+UNCHANGED = object()
+
+
+class ProgressTail:
+    """A user's unfolded state changes, replayed in log order."""
+
+    def __init__(self, rows=()):
+        self.states = {}
+        self.cursors = {}
+        self.last_node_id = UNCHANGED
+        for row in rows:
+            self.add(*row)
+
+    def add(self, kind, skill_id, node_id, tree_id):
+        self.states[skill_id] = kind
+        if node_id is not None:
+            cursor = node_id if kind == Kind.COMPLETED else None
+            self.cursors[tree_id] = cursor
+            self.last_node_id = cursor
+
+    def __bool__(self):
+        return bool(self.states) or self.last_node_id is not UNCHANGED
+
+    def apply(self, skill_ids, kind):
+        """Return `skill_ids` (a set or SkillBitmap) with the tail's changes for `kind` applied."""
+        if not self.states:
+            return skill_ids
+        add = {skill_id for skill_id, state in self.states.items() if state == kind}
+        remove = self.states.keys() - add
+        if hasattr(skill_ids, 'with_ids'):
+            return skill_ids.with_ids(add).without_ids(remove)
+        return (set(skill_ids) - remove) | add
+
+
+def progress_tail(user):
+    """The user's unfolded events, loaded once per user instance."""
+    if not settings.PROGRESS_EVENT_LOG:
+        return ProgressTail()
+    tail = getattr(user, '_progress_tail', None)
+    if tail is None:
+        rows = (
+            ProgressEvent.objects.filter(user_id=user.pk, kind__in=STATE_KINDS)
+            .order_by('pk')
+            .values_list('kind', 'skill_id', 'node_id', 'node__tree_id')
+        )
+        tail = user._progress_tail = ProgressTail(rows)
+    return tail
+
+
+def resume_node_id(user):
+    """`User.last_node_id` including unfolded events."""
+    last_node_id = progress_tail(user).last_node_id
+    return user.last_node_id if last_node_id is UNCHANGED else last_node_id
+
+
+def append_progress_events(user, events):
+    """Insert events for `user` in one statement and schedule compaction."""
+    if not events:
+        return
+    ProgressEvent.objects.bulk_create(events)
+    user.__dict__.pop('_progress_tail', None)
+    compactor.ensure_started()
+
+
+@transaction.atomic
+def compact_progress_events(limit=COMPACT_BATCH):
+    """Fold up to `limit` of the oldest events into the progress tables. Returns the number folded."""
+    from .progress import record_skill_change
+
+    event_ids = list(ProgressEvent.objects.order_by('pk').values_list('pk', flat=True)[:limit])
+    if not event_ids:
+        return 0
+    events = list(
+        ProgressEvent.objects.select_for_update(of=('self',))
+        .filter(pk__in=event_ids).order_by('pk')
+        .values_list('user_id', 'skill_id', 'node_id', 'node__tree_id', 'kind', 'position', 'created_at')
+    )
+
+    tails = defaultdict(ProgressTail)
+    user_ids = set()
+    skill_ids = set()
+    positions = {}
+    for user_id, skill_id, node_id, tree_id, kind, position, created_at in events:
+        user_ids.add(user_id)
+        skill_ids.add(skill_id)
+        if kind in STATE_KINDS:
+            tails[user_id].add(kind, skill_id, node_id, tree_id)
+        if kind == Kind.POSITION:
+            positions[user_id] = position
+
+    User = get_user_model()
+    changes = _fold_skill_sets(User, tails, skill_ids)
+    _fold_skill_progress(events, user_ids, skill_ids)
+
+    users = {user.pk: user for user in User.objects.filter(pk__in=user_ids)}
+    for user_id, tail in tails.items():
+        if tail.last_node_id is not UNCHANGED:
+            users[user_id].last_node_id = tail.last_node_id
+    for user_id, position in positions.items():
+        users[user_id].last_video_position = position
+    User.objects.bulk_update(users.values(), ['last_node', 'last_video_position'])
+
+    ProgressEvent.objects.filter(pk__in=event_ids).delete()
+
+    for user_id, (added, removed) in changes.items():
+        user = users[user_id]
+        # Rows describe the folded state only; newer events are overlaid at read time
+        user._progress_tail = ProgressTail()
+        record_skill_change(user, added=added, removed=removed, cursors=tails[user_id].cursors)
+    return len(events)
+
+
+def _fold_skill_sets(User, tails, skill_ids):
+    """Bring the M2M rows in line with each tail; returns {user_id: (added, removed)} completions."""
+    stored = {}
+    for relation in ('completed_skills', 'ignored_skills'):
+        through = getattr(User, relation).through
+        stored[relation] = set(through.objects.filter(
+            user_id__in=tails, skill_id__in=skill_ids,
+        ).values_list('user_id', 'skill_id'))
+
+    changes = {}
+    changed_users = set()
+    for relation, wanted_kind in (('completed_skills', Kind.COMPLETED), ('ignored_skills', Kind.IGNORED)):
+        through = getattr(User, relation).through
+        add, remove = defaultdict(set), defaultdict(set)
+        for user_id, tail in tails.items():
+            for skill_id, kind in tail.states.items():
+                present = (user_id, skill_id) in stored[relation]
+                if kind == wanted_kind and not present:
+                    add[user_id].add(skill_id)
+                elif kind != wanted_kind and present:
+                    remove[user_id].add(skill_id)
+        through.objects.bulk_create([
+            through(user_id=user_id, skill_id=skill_id)
+            for user_id, skills in add.items() for skill_id in skills
+        ], ignore_conflicts=True)
+        if remove:
+            through.objects.filter(reduce(or_, (
+                Q(user_id=user_id, skill_id__in=skills) for user_id, skills in remove.items()
+            ))).delete()
+        changed_users.update(add, remove)
+        if relation == 'completed_skills':
+            changes = {user_id: (add[user_id], remove[user_id]) for user_id in tails}
+
+    if changed_users:
+        rebuild_skill_bitmaps(changed_users)
+    return changes
+
+
+def _fold_skill_progress(events, user_ids, skill_ids):
+    """Replay events onto SkillProgress rows: status, completion time and video position."""
+    rows = {
+        (row.user_id, row.skill_id): row
+        for row in SkillProgress.objects.filter(user_id__in=user_ids, skill_id__in=skill_ids)
+    }
+    created = {}
+    touched = {}
+    for user_id, skill_id, node_id, tree_id, kind, position, created_at in events:
+        if kind == Kind.IGNORED:
+            continue
+        key = (user_id, skill_id)
+        row = rows.get(key) or created.get(key)
+        if row is None:
+            row = created[key] = SkillProgress(user_id=user_id, skill_id=skill_id)
+        if kind == Kind.COMPLETED:
+            row.status = SkillProgress.Status.COMPLETED
+            row.completed_at = created_at
+        elif kind == Kind.RESET:
+            row.status = SkillProgress.Status.NOT_STARTED
+            row.completed_at = None
+        else:
+            if row.status == SkillProgress.Status.NOT_STARTED:
+                row.status = SkillProgress.Status.IN_PROGRESS
+            if position is not None:
+                row.video_position = position
+        if key in rows:
+            touched[key] = row
+
+    SkillProgress.objects.bulk_create(created.values(), batch_size=500)
+    SkillProgress.objects.bulk_update(
+        touched.values(), ['status', 'completed_at', 'video_position'], batch_size=500,
+    )
+
+
+def compact_all(limit=COMPACT_BATCH):
+    """Compact until the log is empty; returns the number of events folded."""
+    total = 0
+    while True:
+        folded = compact_progress_events(limit)
+        total += folded
+        if folded < limit:
+            return total
+
+
+class Compactor:
+    """Per-worker background thread running compact_all every `interval` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='progress-compactor', daemon=True)
+                self._thread.start()
+                atexit.register(self.run_once)
+
+    def run_once(self):
+        try:
+            return compact_all()
+        except Exception:
+            # Another worker may hold the write lock; the events stay for the next run
+            logger.exception('Progress event compaction failed')
+            return 0
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            close_old_connections()
+            self.run_once()
+
+
+compactor = Compactor(settings.PROGRESS_COMPACT_SECONDS)
@@ -0,0 +1,181 @@
+"""
+Graph engine for skill trees: goal detection and learning-order sequencing.
+
+Sequencing is an iterative, explicit-stack depth-first traversal of the
+prerequisite graph starting at the goal node, so very deep prerequisite chains
+cannot hit Python's recursion limit. It runs in O(nodes + edges) and reports
+cycles instead of silently cutting them.
+"""
+
+
+class CycleError(ValueError):
+    """The prerequisite graph contains a cycle."""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__('Prerequisite cycle: ' + ' -> '.join(str(n) for n in cycle))
+
+
+def build_prereqs_map(edges):
+    """
+    Build node_id -> [prereq_node_id, ...] from (from_node_id, to_node_id, priority)
+    tuples. Prerequisites are ordered by ascending priority; ties keep edge order.
+    """
+    by_target = {}
+    for from_id, to_id, priority in edges:
+        by_target.setdefault(to_id, []).append((priority, from_id))
+    prereqs_map = {}
+    for to_id, prereqs in by_target.items():
+        # list.sort is stable, so equal priorities keep their edge order
+        prereqs.sort(key=lambda p: p[0])
+        prereqs_map[to_id] = [from_id for _, from_id in prereqs]
+    return prereqs_map
+
+
+def learning_sequence(prereqs_map, goal_id, strict=True):
+    """
+    Post-order DFS over prerequisites from `goal_id`: leaves first, goal last.
+
+    With `strict`, a cycle raises CycleError carrying the offending path.
+    Otherwise back edges are skipped, which matches the legacy recursive order.
+    """
+    sequence = []
+    visited = {goal_id}
+    on_path = {goal_id}
+    # Each frame is (node_id, index of the next prerequisite to visit)
+    stack = [(goal_id, 0)]
+    while stack:
+        node_id, index = stack[-1]
+        prereqs = prereqs_map.get(node_id, ())
+        if index < len(prereqs):
+            stack[-1] = (node_id, index + 1)
+            prereq_id = prereqs[index]
+            if prereq_id not in visited:
+                visited.add(prereq_id)
+                on_path.add(prereq_id)
+                stack.append((prereq_id, 0))
+            elif strict and prereq_id in on_path:
+                path = [frame[0] for frame in stack]
+                raise CycleError(path[path.index(prereq_id):] + [prereq_id])
+        else:
+            stack.pop()
+            on_path.discard(node_id)
+            sequence.append(node_id)
+    return sequence
+
+
+def find_cycle(prereqs_map):
+    """Return one prerequisite cycle as a list of node ids, or None."""
+    visited = set()
+    for start in prereqs_map:
+        if start in visited:
+            continue
+        on_path = {start}
+        visited.add(start)
+        stack = [(start, 0)]
+        while stack:
+            node_id, index = stack[-1]
+            prereqs = prereqs_map.get(node_id, ())
+            if index < len(prereqs):
+                stack[-1] = (node_id, index + 1)
+                prereq_id = prereqs[index]
+                if prereq_id in on_path:
+                    path = [frame[0] for frame in stack]
+                    return path[path.index(prereq_id):] + [prereq_id]
+                if prereq_id not in visited:
+                    visited.add(prereq_id)
+                    on_path.add(prereq_id)
+                    stack.append((prereq_id, 0))
+            else:
+                stack.pop()
+                on_path.discard(node_id)
+    return None
+
+
+def prerequisite_depths(prereqs_map, sequence):
+    """
+    Longest prerequisite distance from the goal for every node in `sequence`
+    (the goal, last in the sequence, is 0).
+    """
+    depths = {node_id: 0 for node_id in sequence}
+    # Reversed post-order visits every node before its prerequisites
+    for node_id in reversed(sequence):
+        depth = depths[node_id] + 1
+        for prereq_id in prereqs_map.get(node_id, ()):
+            if prereq_id in depths and depths[prereq_id] < depth:
+                depths[prereq_id] = depth
+    return depths
+
+
+def find_goal_ids(node_ids, edges):
+    """Node ids without outgoing edges, in `node_ids` order: goal candidates."""
+    has_outgoing = {from_id for from_id, _, _ in edges}
+    return [node_id for node_id in node_ids if node_id not in has_outgoing]
+
+
+def validate_graph(node_ids, edges, complete=True):
+    """
+    Check that a tree has exactly one goal node, no cycles and no nodes the
+    goal cannot reach. Returns a list of human-readable problems. With
+    `complete=False` only cycles are reported: a tree built one node at a
+    time passes through states with several goals or stranded nodes.
+    """
+    errors = []
+    goal_ids = find_goal_ids(node_ids, edges) if complete else []
+    if complete and len(goal_ids) != 1:
+        errors.append(f'Expected exactly one goal node, found {len(goal_ids)}: {goal_ids}')
+
+    prereqs_map = build_prereqs_map(edges)
+    cycle = find_cycle(prereqs_map)
+    if cycle:
+        errors.append('Prerequisite cycle: ' + ' -> '.join(str(n) for n in cycle))
+
+    if goal_ids:
+        reachable = set(learning_sequence(prereqs_map, goal_ids[0], strict=False))
+        unreachable = [node_id for node_id in node_ids if node_id not in reachable]
+        if unreachable:
+            errors.append(f'Nodes not leading to the goal: {unreachable}')
+    return errors
+
+
+def compute_learning_order(node_ids, edges):
+    """
+    Return ({node_id: (position, depth)}, errors) for one tree's graph.
+    Nodes the goal does not need are left out.
+    """
+    errors = validate_graph(node_ids, edges)
+    goal_ids = find_goal_ids(node_ids, edges)
+    if not goal_ids:
+        return {}, errors
+
+    prereqs_map = build_prereqs_map(edges)
+    try:
+        sequence = learning_sequence(prereqs_map, goal_ids[0])
+    except CycleError:
+        # Already reported by validate_graph; fall back to skipping back edges
+        sequence = learning_sequence(prereqs_map, goal_ids[0], strict=False)
+    depths = prerequisite_depths(prereqs_map, sequence)
+    return {node_id: (i, depths[node_id]) for i, node_id in enumerate(sequence)}, errors
+
+
+def find_goal_node(nodes):
+    """Return the first node without outgoing edges inside its tree, or None."""
+    node_ids = {n.id for n in nodes}
+    for node in nodes:
+        outgoing_ids = {e.to_node_id for e in node.outgoing_edges.all() if e.to_node_id in node_ids}
+        if not outgoing_ids:
+            return node
+    return None
+
+
+def compute_dfs_sequence(nodes, goal_node, strict=False):
+    """
+    Compute DFS sequence from goal node.
+    - Traverse prerequisites with priorities reversed (highest priority first in DFS)
+    - Post-order gives the learning order: leaves first, goal last
+    """
+    edges = []
+    for node in nodes:
+        for edge in node.incoming_edges.all():
+            edges.append((edge.from_node_id, node.id, edge.priority))
+    return learning_sequence(build_prereqs_map(edges), goal_node.id, strict=strict)
@@ -0,0 +1,186 @@
+"""
+Write-behind buffer for video position heartbeats.
+
+The player reports its position every few seconds. Heartbeats only replace
+the latest position per (user, skill) in this worker's memory; a background
+thread writes the buffer out every HEARTBEAT_FLUSH_SECONDS with one upsert
+into SkillProgress and one bulk_update of User.last_video_position. The
+buffer is also flushed when it grows past HEARTBEAT_MAX_BUFFER and when the
+worker exits, so at most one interval of positions is lost on a crash.
+A zero interval writes every heartbeat through immediately. With the progress
+event log on, a flush appends position events instead (see skills.events).
+"""
+import atexit
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections, transaction
+
+from skilltrees.db import db_sync_to_async
+
+from .events import compactor
+from .metrics import heartbeat_buffered, heartbeat_positions_written, heartbeats
+from .models import ProgressEvent, Skill, SkillProgress
+
+logger = logging.getLogger(__name__)
+
+# The largest value a PositiveIntegerField holds on every backend
+MAX_POSITION = 2 ** 31 - 1
+
+
+def parse_position(body):
+    """
+    The position of a heartbeat body {"position": seconds}, in whole seconds.
+    Raises ValueError unless it is a finite number in [0, MAX_POSITION].
+    """
+    try:
+        position = json.loads(body or b'null')['position']
+    except (ValueError, TypeError, KeyError):
+        position = None
+    # NaN fails both comparisons, infinities the upper bound
+    if isinstance(position, bool) or not isinstance(position, (int, float)) or not 0 <= position <= MAX_POSITION:
+        raise ValueError('Expected {"position": seconds}')
+    return int(position)
+
+
+class HeartbeatBuffer:
+    """Latest position per (user_id, skill_id), flushed in batches."""
+
+    def __init__(self, interval, max_size):
+        self.interval = interval
+        self.max_size = max_size
+        # Insertion order is recency order: the last entry per user is its latest heartbeat
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, skill_id, position):
+        with self._lock:
+            self._positions.pop((user_id, skill_id), None)
+            self._positions[(user_id, skill_id)] = position
+            size = len(self._positions)
+        heartbeats.inc()
+        heartbeat_buffered.set(size)
+        if self.interval <= 0:
+            # Write-through: no buffering
+            self.flush()
+            return
+        self._ensure_flusher()
+        if size >= self.max_size:
+            self._wake.set()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def flush(self):
+        """Write buffered positions; returns the number of (user, skill) pairs written."""
+        with self._flush_lock:
+            with self._lock:
+                positions, self._positions = self._positions, {}
+            if not positions:
+                return 0
+            try:
+                written = write_positions(positions)
+            except OperationalError:
+                # The database is unavailable or locked: try the whole batch again later
+                logger.exception('Failed to flush %d video positions', len(positions))
+                self._requeue(positions)
+                written = 0
+            except Exception:
+                # Some row cannot be written; find it instead of failing every flush after this one
+                logger.exception('Failed to flush %d video positions, writing them one by one', len(positions))
+                written = self._write_each(positions)
+            finally:
+                heartbeat_buffered.set(len(self._positions))
+            heartbeat_positions_written.inc(written)
+            return written
+
+    def _requeue(self, positions):
+        with self._lock:
+            # Keep newer heartbeats that arrived during the failed flush
+            self._positions = {**positions, **self._positions}
+
+    def _write_each(self, positions):
+        """Write one (user, skill) pair at a time, dropping the pairs that cannot be written."""
+        written = 0
+        items = list(positions.items())
+        for index, (key, position) in enumerate(items):
+            try:
+                written += write_positions({key: position})
+            except OperationalError:
+                self._requeue(dict(items[index:]))
+                break
+            except Exception:
+                logger.exception('Dropping video position %r of (user, skill) %r', position, key)
+        return written
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='heartbeat-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval or None)
+            self._wake.clear()
+            close_old_connections()
+            self.flush()
+
+
+@transaction.atomic
+def write_positions(positions):
+    """Upsert SkillProgress.video_position and update User.last_video_position in bulk."""
+    skill_ids = set(Skill.objects.filter(
+        pk__in={skill_id for _, skill_id in positions},
+    ).values_list('pk', flat=True))
+    if settings.PROGRESS_EVENT_LOG:
+        events = ProgressEvent.objects.bulk_create([
+            ProgressEvent(user_id=user_id, skill_id=skill_id, kind=ProgressEvent.Kind.POSITION, position=position)
+            for (user_id, skill_id), position in positions.items()
+            if skill_id in skill_ids
+        ], batch_size=500)
+        compactor.ensure_started()
+        return len(events)
+
+    rows, users = [], {}
+    for (user_id, skill_id), position in positions.items():
+        if skill_id in skill_ids:
+            rows.append(SkillProgress(
+                user_id=user_id, skill_id=skill_id, video_position=position,
+                status=SkillProgress.Status.IN_PROGRESS,
+            ))
+            users[user_id] = position
+    SkillProgress.objects.bulk_create(
+        rows, batch_size=500,
+        update_conflicts=True, unique_fields=['user', 'skill'], update_fields=['video_position'],
+    )
+    User = get_user_model()
+    User.objects.bulk_update(
+        [User(pk=user_id, last_video_position=position) for user_id, position in users.items()],
+        ['last_video_position'], batch_size=500,
+    )
+    return len(rows)
+
+
+heartbeat_buffer = HeartbeatBuffer(settings.HEARTBEAT_FLUSH_SECONDS, settings.HEARTBEAT_MAX_BUFFER)
+
+
+def record_heartbeat(user_id, skill_id, position):
+    heartbeat_buffer.record(user_id, skill_id, position)
+
+
+async def arecord_heartbeat(user_id, skill_id, position):
+    """record_heartbeat for async views; only write-through, which flushes right away, leaves the event loop."""
+    if heartbeat_buffer.interval <= 0:
+        await db_sync_to_async(record_heartbeat)(user_id, skill_id, position)
+    else:
+        record_heartbeat(user_id, skill_id, position)
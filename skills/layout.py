@@ -0,0 +1,290 @@
+"""
+Layered (Sugiyama-style) layout of a tree's prerequisite graph.
+
+The layout runs left to right like the dagre layout the page used to run in
+the browser: prerequisites on the left, the goal on the right. The classic
+phases are:
+
+1. Break cycles by reversing DFS back edges (cyclic trees are already
+   reported in `Tree.graph_errors`, but they still get drawn).
+2. Rank nodes by longest path from the sources, then pull every node right
+   next to its nearest dependent so edges stay short.
+3. Split edges spanning several ranks with dummy nodes, shortest edges
+   first, up to MAX_DUMMIES in all. Longer edges take no part in ordering
+   and placement; they are still drawn, just without a reserved route. This
+   keeps a prerequisite shared by a long chain from costing a dummy per rank
+   per edge (quadratic in the chain's length).
+4. Order each rank with alternating barycenter sweeps, keeping the order
+   with the fewest edge crossings.
+5. Place nodes vertically as close to the mean of their neighbours as their
+   order and spacing allow (isotonic regression per rank), which also
+   straightens long edges.
+
+`tree_layout` returns what is stored in `Tree.layout`: the drawing's width
+and height and each node's cytoscape center coordinates, or {} for trees
+over MAX_LAYOUT_NODES, which the page lays out with dagre instead.
+"""
+from bisect import bisect_right
+
+NODE_WIDTH = 140
+NODE_HEIGHT = 35
+RANK_SEP = 100
+NODE_SEP = 50
+EDGE_SEP = 10
+ORDER_SWEEPS = 8
+PLACEMENT_SWEEPS = 4
+# Work limits: dummy nodes over all split edges, and the largest tree laid out here
+MAX_DUMMIES = 20000
+MAX_LAYOUT_NODES = 20000
+
+
+def tree_layout(node_ids, edges):
+    """The `Tree.layout` value for a tree's node ids and edges."""
+    if len(node_ids) > MAX_LAYOUT_NODES:
+        return {}
+    positions, width, height = layered_layout(node_ids, edges)
+    return {
+        'width': width,
+        'height': height,
+        'nodes': {str(node_id): [x, y] for node_id, (x, y) in positions.items()},
+    }
+
+
+def layered_layout(node_ids, edges):
+    """
+    Return ({node_id: (x, y)}, width, height) for one tree, from its node ids
+    and (from_node_id, to_node_id, priority) edges.
+    """
+    node_ids = list(node_ids)
+    if not node_ids:
+        return {}, 0, 0
+    known = set(node_ids)
+    successors = {node_id: [] for node_id in node_ids}
+    seen = set()
+    # Prerequisites in priority order, so ties in the ordering favour it
+    for from_id, to_id, _ in sorted(edges, key=lambda e: e[2]):
+        if from_id == to_id or from_id not in known or to_id not in known or (from_id, to_id) in seen:
+            continue
+        seen.add((from_id, to_id))
+        successors[from_id].append(to_id)
+
+    successors = break_cycles(node_ids, successors)
+    ranks = assign_ranks(node_ids, successors)
+    layers, successors, predecessors = split_long_edges(node_ids, ranks, successors)
+    layers = order_layers(layers, successors, predecessors)
+    ys = place_nodes(layers, successors, predecessors, known)
+
+    positions = {}
+    for rank, layer in enumerate(layers):
+        x = rank * (NODE_WIDTH + RANK_SEP) + NODE_WIDTH / 2
+        for node in layer:
+            if node in known:
+                positions[node] = (x, ys[node])
+    top = min(y for _, y in positions.values()) - NODE_HEIGHT / 2
+    positions = {node: (round(x, 1), round(y - top, 1)) for node, (x, y) in positions.items()}
+    width = len(layers) * (NODE_WIDTH + RANK_SEP) - RANK_SEP
+    height = max(y for _, y in positions.values()) + NODE_HEIGHT / 2
+    return positions, width, round(height, 1)
+
+
+def break_cycles(node_ids, successors):
+    """Reverse the back edges of an iterative DFS so the graph is acyclic."""
+    acyclic = {node_id: [] for node_id in node_ids}
+    state = {}  # 1 = on the DFS path, 2 = finished
+    for start in node_ids:
+        if start in state:
+            continue
+        state[start] = 1
+        stack = [(start, 0)]
+        while stack:
+            node, index = stack[-1]
+            if index < len(successors[node]):
+                stack[-1] = (node, index + 1)
+                nxt = successors[node][index]
+                if state.get(nxt) == 1:
+                    acyclic[nxt].append(node)
+                    continue
+                acyclic[node].append(nxt)
+                if nxt not in state:
+                    state[nxt] = 1
+                    stack.append((nxt, 0))
+            else:
+                state[node] = 2
+                stack.pop()
+    # A reversed edge may duplicate an existing one
+    return {node: list(dict.fromkeys(targets)) for node, targets in acyclic.items()}
+
+
+def topological_order(node_ids, successors):
+    indegree = {node_id: 0 for node_id in node_ids}
+    for targets in successors.values():
+        for target in targets:
+            indegree[target] += 1
+    ready = [node_id for node_id in node_ids if indegree[node_id] == 0]
+    order = []
+    while ready:
+        node = ready.pop()
+        order.append(node)
+        for target in successors[node]:
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                ready.append(target)
+    return order
+
+
+def assign_ranks(node_ids, successors):
+    order = topological_order(node_ids, successors)
+    ranks = {node_id: 0 for node_id in node_ids}
+    for node in order:
+        for target in successors[node]:
+            ranks[target] = max(ranks[target], ranks[node] + 1)
+    # Move each node right up to its nearest dependent
+    for node in reversed(order):
+        if successors[node]:
+            ranks[node] = min(ranks[target] for target in successors[node]) - 1
+    return ranks
+
+
+def split_long_edges(node_ids, ranks, successors):
+    """
+    Layers of nodes (dummies are ('d', n) tuples) where every edge joins
+    adjacent layers. Edges are split shortest first while MAX_DUMMIES lasts;
+    the rest are left out.
+    """
+    layers = [[] for _ in range(max(ranks.values()) + 1)]
+    for node_id in node_ids:
+        layers[ranks[node_id]].append(node_id)
+    split = {node_id: [] for node_id in node_ids}
+    # Dummies an edge needs: the ranks it passes through
+    spans = sorted(ranks[target] - ranks[node_id] - 1 for node_id in node_ids for target in successors[node_id])
+    longest, budget = float('inf'), MAX_DUMMIES
+    for span in spans:
+        if span > budget:
+            longest = span - 1
+            break
+        budget -= span
+    dummies = 0
+    for node_id in node_ids:
+        for target in successors[node_id]:
+            if ranks[target] - ranks[node_id] - 1 > longest:
+                continue
+            previous = node_id
+            for rank in range(ranks[node_id] + 1, ranks[target]):
+                dummy = ('d', dummies)
+                dummies += 1
+                layers[rank].append(dummy)
+                split[dummy] = []
+                split[previous].append(dummy)
+                previous = dummy
+            split[previous].append(target)
+    predecessors = {node: [] for node in split}
+    for node, targets in split.items():
+        for target in targets:
+            predecessors[target].append(node)
+    return layers, split, predecessors
+
+
+def order_layers(layers, successors, predecessors):
+    best = [list(layer) for layer in layers]
+    best_crossings = count_crossings(best, successors)
+    current = [list(layer) for layer in layers]
+    for sweep in range(ORDER_SWEEPS):
+        if best_crossings == 0:
+            break
+        if sweep % 2 == 0:
+            for rank in range(1, len(current)):
+                current[rank] = by_barycenter(current[rank], current[rank - 1], predecessors)
+        else:
+            for rank in range(len(current) - 2, -1, -1):
+                current[rank] = by_barycenter(current[rank], current[rank + 1], successors)
+        crossings = count_crossings(current, successors)
+        if crossings < best_crossings:
+            best, best_crossings = [list(layer) for layer in current], crossings
+    return best
+
+
+def by_barycenter(layer, fixed, neighbours):
+    index = {node: i for i, node in enumerate(fixed)}
+    scale = len(fixed) / max(len(layer), 1)
+
+    def barycenter(item):
+        i, node = item
+        linked = [index[n] for n in neighbours[node] if n in index]
+        # Unconnected nodes keep their relative place
+        return sum(linked) / len(linked) if linked else i * scale
+
+    return [node for _, node in sorted(enumerate(layer), key=barycenter)]
+
+
+def count_crossings(layers, successors):
+    total = 0
+    for upper, lower in zip(layers, layers[1:]):
+        lower_index = {node: i for i, node in enumerate(lower)}
+        targets = []
+        for node in upper:
+            targets.extend(sorted(lower_index[target] for target in successors[node]))
+        total += inversions(targets)
+    return total
+
+
+def inversions(values):
+    """Pairs i < j with values[i] > values[j]."""
+    seen = []
+    count = 0
+    for value in values:
+        position = bisect_right(seen, value)
+        count += len(seen) - position
+        seen.insert(position, value)
+    return count
+
+
+def place_nodes(layers, successors, predecessors, real):
+    def height(node):
+        return NODE_HEIGHT if node in real else 0
+
+    def gap(a, b):
+        return (height(a) + height(b)) / 2 + (NODE_SEP if a in real and b in real else EDGE_SEP)
+
+    ys = {}
+    for layer in layers:
+        y = 0
+        for i, node in enumerate(layer):
+            if i:
+                y += gap(layer[i - 1], node)
+            ys[node] = y
+    for sweep in range(PLACEMENT_SWEEPS * 2):
+        ranks = range(1, len(layers)) if sweep % 2 == 0 else range(len(layers) - 2, -1, -1)
+        neighbours = predecessors if sweep % 2 == 0 else successors
+        for rank in ranks:
+            layer = layers[rank]
+            targets = []
+            for node in layer:
+                linked = [ys[n] for n in neighbours[node]]
+                targets.append(sum(linked) / len(linked) if linked else ys[node])
+            for node, y in zip(layer, spaced(targets, [gap(a, b) for a, b in zip(layer, layer[1:])])):
+                ys[node] = y
+    return ys
+
+
+def spaced(targets, gaps):
+    """
+    Positions closest to `targets` (least squares) that keep their order and
+    at least gaps[i] between positions i and i + 1: pool adjacent violators
+    on the targets shifted by the cumulative gaps.
+    """
+    offsets = [0.0]
+    for g in gaps:
+        offsets.append(offsets[-1] + g)
+    blocks = []  # [mean, weight, count]
+    for target, offset in zip(targets, offsets):
+        blocks.append([target - offset, 1, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean, weight, count = blocks.pop()
+            last = blocks[-1]
+            last[0] = (last[0] * last[1] + mean * weight) / (last[1] + weight)
+            last[1] += weight
+            last[2] += count
+    values = []
+    for mean, _, count in blocks:
+        values.extend([mean] * count)
+    return [value + offset for value, offset in zip(values, offsets)]
@@ -0,0 +1,149 @@
+"""
+Helpers for driving a real gunicorn instance over HTTP.
+
+`serve` starts gunicorn in WSGI (sync workers) or ASGI (uvicorn workers) mode
+and waits until it answers; `Session` is a keep-alive HTTP client with a
+cookie jar that handles Django's session and CSRF cookies; `Recorder`
+collects per-endpoint latencies and errors from many threads.
+"""
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+
+SERVER_MODES = {
+    'wsgi': ['skilltrees.wsgi'],
+    'asgi': ['skilltrees.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(mode='wsgi', workers=1, threads=1, env=None):
+    """Run gunicorn for the duration of the block; yields the port."""
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', *SERVER_MODES[mode],
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+    ]
+    if mode == 'wsgi' and threads > 1:
+        command += ['--threads', str(threads)]
+    process = subprocess.Popen(
+        command, cwd=settings.BASE_DIR, env={**os.environ, **(env or {})},
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                Session(port).request('GET', '/')
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'gunicorn ({mode}) did not start')
+                time.sleep(0.2)
+        yield port
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+class Session:
+    """One browser: keep-alive connection, cookies and the CSRF header."""
+
+    def __init__(self, port, cookies=None):
+        self.port = port
+        self.cookies = dict(cookies or {})
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, body bytes); reconnects once if the server closed the connection."""
+        headers = dict(headers or {})
+        headers['Host'] = f'127.0.0.1:{self.port}'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if method == 'POST':
+            headers.setdefault('Content-Type', 'application/json')
+            if 'csrftoken' in self.cookies:
+                headers['X-CSRFToken'] = self.cookies['csrftoken']
+        for attempt in (0, 1):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, data
+
+
+class Recorder:
+    """Thread-safe latency and error counts per endpoint label."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def timed(self, label, session, method, path, body=None, ok=(200, 204, 302)):
+        start = time.perf_counter()
+        try:
+            status, data = session.request(method, path, body)
+        except OSError as exc:
+            status, data = None, str(exc).encode()
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            if status in ok:
+                self.latencies.setdefault(label, []).append(elapsed)
+            else:
+                errors = self.errors.setdefault(label, {})
+                key = error_kind(status, data)
+                errors[key] = errors.get(key, 0) + 1
+        return status, data
+
+    def summary(self, seconds):
+        """Rows of (label, requests, req/s, p50, p90, p99, max, errors)."""
+        rows = []
+        for label in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies.get(label, []))
+            errors = sum(self.errors.get(label, {}).values())
+            if latencies:
+                rows.append((
+                    label, len(latencies), len(latencies) / seconds, statistics.median(latencies),
+                    percentile(latencies, 90), percentile(latencies, 99), latencies[-1], errors,
+                ))
+            else:
+                rows.append((label, 0, 0.0, 0.0, 0.0, 0.0, 0.0, errors))
+        return rows
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def error_kind(status, data):
+    if status is None:
+        return 'connection'
+    if b'database is locked' in data:
+        return 'sqlite-locked'
+    return str(status)
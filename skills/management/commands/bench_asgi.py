@@ -0,0 +1,104 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from skills.loadtest import Recorder, Session, serve
+from skills.models import Node
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares gunicorn sync (WSGI) and uvicorn (ASGI) workers on tree pages, '
+        'toggles and heartbeats (bench users are deleted afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent sessions')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration per mode')
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn worker processes')
+        parser.add_argument('--modes', default='wsgi,asgi')
+        parser.add_argument(
+            '--lock-ms', type=int, default=0,
+            help='Hold the SQLite write lock this long every second to simulate slow writes',
+        )
+
+    def handle(self, *args, **options):
+        nodes = list(Node.objects.values_list('pk', 'tree_id', 'skill_id'))
+        if not nodes:
+            raise CommandError('No nodes; load the fixture or run generate_synthetic first')
+
+        User = get_user_model()
+        users = [
+            User.objects.get_or_create(username=f'bench-asgi-{i}')[0] for i in range(options['clients'])
+        ]
+        try:
+            cookies = []
+            for user in users:
+                client = Client()
+                client.force_login(user)
+                cookies.append({'sessionid': client.cookies['sessionid'].value})
+
+            self.stdout.write(
+                f'{options["clients"]} clients, {options["workers"]} worker(s), {options["seconds"]}s per mode'
+            )
+            self.stdout.write(
+                f'{"mode":<5} {"endpoint":<10} {"requests":>8} {"req/s":>7} {"p50":>7} {"p90":>7} '
+                f'{"p99":>8} {"errors":>6}'
+            )
+            for mode in options['modes'].split(','):
+                recorder = Recorder()
+                with serve(mode, workers=options['workers']) as port:
+                    self.run(port, cookies, nodes, recorder, options['seconds'], options['lock_ms'])
+                total = 0
+                for label, count, rate, p50, p90, p99, _, errors in recorder.summary(options['seconds']):
+                    total += rate
+                    self.stdout.write(
+                        f'{mode:<5} {label:<10} {count:>8} {rate:>7.1f} {p50:>7.1f} {p90:>7.1f} '
+                        f'{p99:>8.1f} {errors:>6}'
+                    )
+                self.stdout.write(f'{mode:<5} {"total":<10} {"":>8} {total:>7.1f}')
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, port, cookies, nodes, recorder, seconds, lock_ms):
+        deadline = time.monotonic() + seconds
+
+        def hold_lock():
+            connection = sqlite3.connect(settings.SQLITE_PATH, timeout=30, isolation_level=None)
+            while time.monotonic() < deadline:
+                connection.execute('BEGIN IMMEDIATE')
+                time.sleep(lock_ms / 1000)
+                connection.execute('COMMIT')
+                time.sleep(max(0, 1 - lock_ms / 1000))
+            connection.close()
+
+        def browse(index):
+            rng = random.Random(index)
+            session = Session(port, cookies[index])
+            node_id, tree_id, skill_id = rng.choice(nodes)
+            # Sets the CSRF cookie used by the POSTs
+            session.request('GET', f'/tree/{tree_id}/')
+            while time.monotonic() < deadline:
+                node_id, tree_id, skill_id = rng.choice(nodes)
+                recorder.timed('tree', session, 'GET', f'/tree/{tree_id}/')
+                recorder.timed('toggle', session, 'POST', f'/node/{node_id}/toggle/')
+                for position in range(3):
+                    recorder.timed(
+                        'heartbeat', session, 'POST', f'/skill/{skill_id}/heartbeat/',
+                        json.dumps({'position': position * 10}),
+                    )
+
+        threads = [threading.Thread(target=browse, args=(i,)) for i in range(len(cookies))]
+        if lock_ms:
+            threads.append(threading.Thread(target=hold_lock))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
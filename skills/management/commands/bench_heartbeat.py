@@ -0,0 +1,89 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from skills import heartbeat
+from skills.models import Skill, SkillProgress
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the sustained video heartbeat rate one worker absorbs, '
+        'buffered versus written through (bench rows are deleted afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--skills', type=int, default=20)
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+        parser.add_argument('--interval', type=float, default=1, help='Flush interval of the buffered run')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        creator = User.objects.create(username='bench-hb-creator', is_staff=True)
+        users = User.objects.bulk_create([User(username=f'bench-hb-{i}') for i in range(options['users'])])
+        skills = Skill.objects.bulk_create([
+            Skill(title=f'bench hb {i}', video_url='https://example.com', text='', duration=1, creator=creator)
+            for i in range(options['skills'])
+        ])
+        original = heartbeat.heartbeat_buffer
+        try:
+            clients = []
+            host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+            for user in users:
+                client = Client(HTTP_HOST=host)
+                client.force_login(user)
+                clients.append(client)
+            urls = [reverse('skills:video_heartbeat', args=[skill.pk]) for skill in skills]
+
+            self.stdout.write(f'{options["users"]} users, {options["skills"]} skills, {options["seconds"]}s per run')
+            self.stdout.write(f'{"mode":<16} {"requests":>9} {"req/s":>9} {"flushes":>8} {"rows":>8}')
+            for mode, interval in (('write-through', 0), (f'buffered {options["interval"]}s', options['interval'])):
+                buffer = CountingBuffer(interval, settings.HEARTBEAT_MAX_BUFFER)
+                heartbeat.heartbeat_buffer = buffer
+                count, elapsed = self.run(clients, urls, options['seconds'])
+                buffer.flush()
+                self.stdout.write(
+                    f'{mode:<16} {count:>9} {count / elapsed:>9.0f} {buffer.flushes:>8} {buffer.rows:>8}'
+                )
+                buffer.interval = 0  # let the flusher thread go idle
+        finally:
+            heartbeat.heartbeat_buffer = original
+            SkillProgress.objects.filter(skill__in=skills).delete()
+            Skill.objects.filter(pk__in=[s.pk for s in skills]).delete()
+            User.objects.filter(pk__in=[u.pk for u in users] + [creator.pk]).delete()
+
+    def run(self, clients, urls, seconds):
+        rng = random.Random(1)
+        count = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while time.perf_counter() < deadline:
+            for _ in range(50):
+                response = rng.choice(clients).post(
+                    rng.choice(urls), json.dumps({'position': count % 3600}), content_type='application/json',
+                )
+                assert response.status_code == 204, response.status_code
+                count += 1
+        return count, time.perf_counter() - start
+
+
+class CountingBuffer(heartbeat.HeartbeatBuffer):
+
+    def __init__(self, interval, max_size):
+        super().__init__(interval, max_size)
+        self.flushes = 0
+        self.rows = 0
+
+    def flush(self):
+        written = super().flush()
+        if written:
+            self.flushes += 1
+            self.rows += written
+        return written
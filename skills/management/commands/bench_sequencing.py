@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.graph import build_prereqs_map, learning_sequence
+
+
+def chain_edges(size):
+    """One prerequisite chain: node i requires node i - 1, goal is the last node."""
+    return [(i - 1, i, 0) for i in range(1, size)]
+
+
+def layered_edges(size, fan_in, rng):
+    """Random DAG where every node requires up to `fan_in` lower-numbered nodes."""
+    edges = []
+    for to_id in range(1, size):
+        for priority, from_id in enumerate(rng.sample(range(to_id), min(fan_in, to_id))):
+            edges.append((from_id, to_id, priority))
+    # Tie everything to the goal so the whole graph is reachable
+    goal = size - 1
+    edges.extend((i, goal, fan_in) for i in range(size - 1) if i % 97 == 0)
+    return edges
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks learning-order sequencing on synthetic graphs up to 100k nodes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Comma-separated node counts')
+        parser.add_argument('--fan-in', type=int, default=2, help='Prerequisites per node in the layered graph')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case, best time is reported')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',')]
+        rng = random.Random(options['seed'])
+
+        self.stdout.write(f'{"shape":<8} {"nodes":>8} {"edges":>8} {"ms":>9} {"ns/elem":>9}')
+        for shape in ('chain', 'layered'):
+            for size in sizes:
+                if shape == 'chain':
+                    edges = chain_edges(size)
+                else:
+                    edges = layered_edges(size, options['fan_in'], rng)
+                best = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    sequence = learning_sequence(build_prereqs_map(edges), size - 1)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                assert sequence[-1] == size - 1
+                per_elem = best * 1e9 / (size + len(edges))
+                self.stdout.write(f'{shape:<8} {size:>8} {len(edges):>8} {best * 1000:>9.2f} {per_elem:>9.0f}')
+
+        self.stdout.write(self.style.SUCCESS('Flat ns/elem across sizes means linear scaling'))
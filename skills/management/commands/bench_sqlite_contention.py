@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from skills.artifacts import build_artifacts
+from skills.models import Node, Tree
+from skills.progress import apply_progress_ops
+from skilltrees.db import use_read_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs concurrent reader and writer processes against a copy of the database, '
+        'with the stock and the tuned SQLite profile'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reader processes')
+        parser.add_argument('--writers', type=int, default=4, help='Writer processes')
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--role', choices=['reader', 'writer'], help='Internal: run one worker')
+
+    def handle(self, *args, **options):
+        if options['role']:
+            return self.worker(options['role'], options['seconds'])
+
+        self.stdout.write(
+            f'{options["readers"]} readers, {options["writers"]} writers, {options["seconds"]}s per profile'
+        )
+        self.stdout.write(
+            f'{"profile":<8} {"role":<7} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"max ms":>8} {"errors":>7}'
+        )
+        for profile, tuned in (('stock', False), ('tuned', True)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                shutil.copyfile(settings.SQLITE_PATH, path)
+                results = self.run_profile(path, tuned, options)
+            for role in ('reader', 'writer'):
+                rows = [r for r in results if r['role'] == role]
+                latencies = sorted(ms for r in rows for ms in r['latencies'])
+                errors = sum(r['errors'] for r in rows)
+                if not latencies:
+                    self.stdout.write(f'{profile:<8} {role:<7} {"-":>8} {"-":>8} {"-":>8} {"-":>8} {errors:>7}')
+                    continue
+                rate = len(latencies) / options['seconds']
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                self.stdout.write(
+                    f'{profile:<8} {role:<7} {rate:>8.0f} {statistics.median(latencies):>8.1f} '
+                    f'{p99:>8.1f} {latencies[-1]:>8.1f} {errors:>7}'
+                )
+
+    def run_profile(self, path, tuned, options):
+        env = dict(os.environ, SQLITE_PATH=path, SQLITE_TUNED=str(tuned), PROGRESS_EVENT_LOG='False')
+        # Seed bench users and switch the copy to the profile's journal mode
+        subprocess.run(
+            [sys.executable, sys.argv[0], 'bench_sqlite_contention', '--role', 'writer', '--seconds', '0'],
+            env=env, check=True, capture_output=True,
+        )
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        procs = [
+            subprocess.Popen(
+                [sys.executable, sys.argv[0], 'bench_sqlite_contention',
+                 '--role', role, '--seconds', str(options['seconds'])],
+                env=env, stdout=subprocess.PIPE, text=True,
+            )
+            for role in roles
+        ]
+        return [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+
+    def worker(self, role, seconds):
+        rng = random.Random(os.getpid())
+        latencies, errors = [], 0
+        if role == 'writer':
+            User = get_user_model()
+            user, _ = User.objects.get_or_create(username=f'bench-writer-{os.getpid() % 1000}')
+            node_ids = list(Node.objects.values_list('pk', flat=True))
+            step = lambda: apply_progress_ops(
+                User.objects.get(pk=user.pk),
+                [{'node': rng.choice(node_ids), 'done': rng.random() < 0.5, 'ignored': None, 'seq': 0}],
+            )
+        else:
+            # What an uncached tree page costs: the artifact build
+            step = use_read_database(lambda request: build_artifacts(list(Tree.objects.all())))
+            step = lambda step=step: step(None)
+
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                step()
+            except OperationalError:
+                errors += 1
+                close_old_connections()
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(json.dumps({'role': role, 'latencies': latencies, 'errors': errors}))
@@ -0,0 +1,166 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from skills.artifacts import artifact_cache
+from skills.graph import compute_dfs_sequence, find_goal_node
+from skills.models import Node, Tree
+from skills.synthetic import delete_synthetic, generate
+
+PREFIX = 'bench-suite'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks sequencing and the tree page endpoints on synthetic trees of growing size '
+        'and writes the results as JSON (generated data is deleted afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,5000', help='Comma-separated nodes per tree')
+        parser.add_argument('--fan-in', type=int, default=2)
+        parser.add_argument('--depth', type=int, default=12)
+        parser.add_argument('--skill-reuse', type=float, default=0.3)
+        parser.add_argument('--completion', type=float, default=0.5)
+        parser.add_argument('--repeat', type=int, default=5, help='Samples per measurement (median is kept)')
+        parser.add_argument('--output', help='JSON file to write (default: bench-<commit>.json)')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against')
+
+    def handle(self, *args, **options):
+        commit = git_commit()
+        params = {k: options[k] for k in ('sizes', 'fan_in', 'depth', 'skill_reuse', 'completion', 'repeat')}
+        results = []
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            delete_synthetic(PREFIX)
+            try:
+                summary = generate(
+                    trees=1, nodes=size, fan_in=options['fan_in'], depth=options['depth'],
+                    skill_reuse=options['skill_reuse'], users=1, completion=options['completion'], prefix=PREFIX,
+                )
+                results.append(self.measure(summary, options['repeat']))
+            finally:
+                delete_synthetic(PREFIX)
+                artifact_cache.clear()
+            self.report(results[-1])
+
+        report = {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'params': params,
+            'results': results,
+        }
+        output = options['output'] or f'bench-{commit or "working"}.json'
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                self.compare(json.load(fh), report)
+
+    def measure(self, summary, repeat):
+        tree = Tree.objects.get(pk=summary['trees'][0])
+        user = get_user_model().objects.get(pk=summary['users'][0])
+
+        nodes = list(Node.objects.filter(tree=tree).prefetch_related('incoming_edges', 'outgoing_edges'))
+        goal = find_goal_node(nodes)
+        dfs_ms = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compute_dfs_sequence(nodes, goal)
+            dfs_ms.append((time.perf_counter() - start) * 1000)
+
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+        client.force_login(user)
+        endpoints = {
+            'tree_detail': reverse('skills:tree_detail', args=[tree.pk]),
+            'tree_structure': reverse('skills:tree_structure', args=[tree.pk]) + f'?v={tree.version}',
+            'tree_progress': reverse('skills:tree_progress', args=[tree.pk]),
+        }
+        measured = {}
+        for name, url in endpoints.items():
+            artifact_cache.clear()
+            cold_ms, queries, size = self.request(client, url)
+            warm = [self.request(client, url) for _ in range(repeat)]
+            measured[name] = {
+                'cold_ms': round(cold_ms, 2),
+                'ms': round(statistics.median(ms for ms, _, _ in warm), 2),
+                'queries': queries,
+                'warm_queries': warm[-1][1],
+                'bytes': size,
+            }
+        return {
+            'nodes': summary['nodes'],
+            'edges': summary['edges'],
+            'skills': summary['skills'],
+            'dfs_ms': round(statistics.median(dfs_ms), 3),
+            'endpoints': measured,
+        }
+
+    def request(self, client, url):
+        """Returns (ms, queries on every database alias, response bytes)."""
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return elapsed, sum(len(context) for context in contexts), len(response.content)
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result["nodes"]} nodes, {result["edges"]} edges: compute_dfs_sequence {result["dfs_ms"]:.2f} ms'
+        )
+        for name, row in result['endpoints'].items():
+            self.stdout.write(
+                f'  {name:<15} cold {row["cold_ms"]:>9.1f} ms  warm {row["ms"]:>8.1f} ms  '
+                f'{row["queries"]:>3} queries (warm {row["warm_queries"]})  {row["bytes"]:>10} bytes'
+            )
+
+    def compare(self, before, after):
+        self.stdout.write(f'Compared with {before.get("commit") or "?"} (new / old):')
+        old = {r['nodes']: r for r in before['results']}
+        for result in after['results']:
+            previous = old.get(result['nodes'])
+            if previous is None:
+                continue
+            line = [f'{result["nodes"]:>7} nodes  dfs {ratio(result["dfs_ms"], previous["dfs_ms"])}']
+            for name, row in result['endpoints'].items():
+                prev_row = previous['endpoints'].get(name)
+                if prev_row:
+                    line.append(
+                        f'{name} {ratio(row["ms"], prev_row["ms"])} '
+                        f'q {prev_row["queries"]}->{row["queries"]} '
+                        f'bytes {ratio(row["bytes"], prev_row["bytes"])}'
+                    )
+            self.stdout.write('  '.join(line))
+
+
+def ratio(new, old):
+    return f'{new / old:.2f}x' if old else '-'
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
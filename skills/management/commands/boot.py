@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.utils.crypto import salted_hmac
+
+from skills.models import BootStep, Tree
+from skills.ordering import store_layout
+
+DEFAULT_FIXTURE = 'skills/fixtures/initial_data.json'
+STATIC_IGNORE = ['CVS', '.*', '*~']
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the deploy steps (collectstatic, migrate, fixture, tree layouts, admin user) in one process, '
+        'skipping every step whose inputs have not changed since it last ran'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Run every step')
+        parser.add_argument('--fixture', default=DEFAULT_FIXTURE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        steps = [
+            ('collectstatic', self.collectstatic),
+            ('migrate', self.migrate),
+            ('loaddata', lambda force: self.loaddata(options['fixture'], force)),
+            ('layouts', self.layouts),
+            ('ensure_admin', self.ensure_admin),
+        ]
+        for name, step in steps:
+            step_started = time.perf_counter()
+            outcome = step(options['force'])
+            self.stdout.write(f'{name:<14} {outcome:<10} {(time.perf_counter() - step_started) * 1000:>7.0f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Booted in {(time.perf_counter() - started) * 1000:.0f} ms'))
+
+    def collectstatic(self, force):
+        # STATIC_ROOT lives in the container, so its fingerprint is kept next to it, not in the database
+        marker = f'{os.path.normpath(settings.STATIC_ROOT)}.fingerprint'
+        fingerprint = static_fingerprint()
+        if not force and os.path.isdir(settings.STATIC_ROOT) and read_file(marker) == fingerprint:
+            return 'up to date'
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(marker, 'w') as fh:
+            fh.write(fingerprint)
+        return 'ran'
+
+    def migrate(self, force):
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        if not force and not executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            return 'up to date'
+        call_command('migrate', interactive=False, verbosity=0)
+        return 'ran'
+
+    def loaddata(self, fixture, force):
+        # Reloading would overwrite admin edits to fixture rows, so only a changed fixture loads
+        with open(fixture, 'rb') as fh:
+            fingerprint = hashlib.sha256(fh.read()).hexdigest()
+        name = f'loaddata:{fixture}'
+        if not force and stored_fingerprint(name) == fingerprint:
+            return 'up to date'
+        try:
+            call_command('loaddata', fixture, verbosity=0)
+        except Exception as exc:
+            self.stderr.write(self.style.WARNING(f'Loading {fixture} failed: {exc}'))
+            return 'failed'
+        store_fingerprint(name, fingerprint)
+        return 'ran'
+
+    def layouts(self, force):
+        # Trees without a stored layout: migrated ones, or laid out by a worker that died first
+        trees = Tree.objects.order_by('pk') if force else Tree.objects.filter(layout={}).order_by('pk')
+        tree_ids = list(trees.values_list('pk', flat=True))
+        for tree_id in tree_ids:
+            store_layout(tree_id)
+        return 'ran' if tree_ids else 'up to date'
+
+    def ensure_admin(self, force):
+        password = os.environ.get('ADMIN_PASSWORD')
+        if not password:
+            return 'skipped'
+        # Keyed with SECRET_KEY and the stored hash, so a password changed in the admin is reset again
+        fingerprint = admin_fingerprint(password)
+        if not force and stored_fingerprint('ensure_admin') == fingerprint:
+            return 'up to date'
+        call_command('ensure_admin', stdout=io.StringIO())
+        store_fingerprint('ensure_admin', admin_fingerprint(password))
+        return 'ran'
+
+
+def static_fingerprint():
+    """Hash of every static source file's path and content."""
+    files = []
+    for finder in get_finders():
+        for path, storage in finder.list(STATIC_IGNORE):
+            with storage.open(path) as fh:
+                files.append((path, hashlib.sha256(fh.read()).hexdigest()))
+    digest = hashlib.sha256(f'{settings.STATIC_URL}|{settings.STORAGES.get("staticfiles")}'.encode())
+    for path, content_hash in sorted(files):
+        digest.update(f'{path}\0{content_hash}\n'.encode())
+    return digest.hexdigest()
+
+
+def admin_fingerprint(password):
+    admin = get_user_model().objects.filter(username='admin').only('password').first()
+    stored = admin.password if admin is not None else ''
+    return salted_hmac('skills.boot.ensure_admin', f'{password}\0{stored}', algorithm='sha256').hexdigest()
+
+
+def stored_fingerprint(name):
+    return BootStep.objects.filter(name=name).values_list('fingerprint', flat=True).first()
+
+
+def store_fingerprint(name, fingerprint):
+    BootStep.objects.update_or_create(name=name, defaults={'fingerprint': fingerprint})
+
+
+def read_file(path):
+    try:
+        with open(path) as fh:
+            return fh.read()
+    except OSError:
+        return None
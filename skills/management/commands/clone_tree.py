@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.models import Tree
+from skills.packages import clone_tree
+
+
+class Command(BaseCommand):
+    help = 'Copies a tree with its nodes and edges, sharing its skills'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tree_id', type=int)
+        parser.add_argument('--title', help='Title of the copy (default: "<title> (copy)")')
+
+    def handle(self, *args, **options):
+        tree = Tree.objects.filter(pk=options['tree_id']).first()
+        if tree is None:
+            raise CommandError(f'Tree {options["tree_id"]} does not exist')
+        clone = clone_tree(tree, title=options['title'])
+        self.stdout.write(self.style.SUCCESS(f'Created tree {clone.pk}: {clone.title}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from skills.events import COMPACT_BATCH, compact_all
+from skills.models import ProgressEvent
+
+
+class Command(BaseCommand):
+    help = 'Folds pending progress events into the progress tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=COMPACT_BATCH, help='Events folded per transaction')
+
+    def handle(self, *args, **options):
+        folded = compact_all(options['batch'])
+        remaining = ProgressEvent.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} events, {remaining} pending'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.packages import export_package
+
+
+class Command(BaseCommand):
+    help = 'Exports trees with their skills, pauses and files as a JSON Lines package (a directory or .zip)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Package directory, or a file ending in .zip')
+        parser.add_argument('--tree', type=int, action='append', dest='trees', help='Tree id (repeatable; default all)')
+        parser.add_argument('--no-files', action='store_true', help='Do not bundle resource files')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = export_package(options['path'], tree_ids=options['trees'], bundle_files=not options['no_files'])
+        for name, count in counts.items():
+            self.stdout.write(f'{name:<14} {count:>8}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported to {options["path"]} in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.synthetic import DEFAULT_PREFIX, delete_synthetic, generate
+
+
+class Command(BaseCommand):
+    help = 'Generates synthetic trees, skills and users in bulk for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trees', type=int, default=10)
+        parser.add_argument('--nodes', type=int, default=200, help='Nodes per tree')
+        parser.add_argument('--fan-in', type=int, default=2, help='Prerequisites per node')
+        parser.add_argument('--depth', type=int, default=8, help='Layers from the leaves to the goal')
+        parser.add_argument(
+            '--skill-reuse', type=float, default=0.3,
+            help='Fraction of nodes that reuse a skill taught by another node (0 = all distinct)',
+        )
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--completion', type=float, default=0.5, help="Fraction of each tree's skills users completed",
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='Name prefix of everything generated')
+        parser.add_argument('--clear', action='store_true', help='Delete earlier data with this prefix first')
+        parser.add_argument('--delete', action='store_true', help='Only delete data with this prefix')
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['delete']:
+            removed = delete_synthetic(options['prefix'])
+            self.stdout.write(f'Deleted {removed} synthetic trees')
+            if options['delete']:
+                return
+
+        start = time.perf_counter()
+        summary = generate(
+            trees=options['trees'], nodes=options['nodes'], fan_in=options['fan_in'],
+            depth=options['depth'], skill_reuse=options['skill_reuse'], users=options['users'],
+            completion=options['completion'], seed=options['seed'], prefix=options['prefix'],
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(summary["trees"])} trees, {summary["nodes"]} nodes, {summary["edges"]} edges, '
+            f'{summary["skills"]} skills and {len(summary["users"])} users in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.packages import PackageError, import_package
+
+
+class Command(BaseCommand):
+    help = 'Imports a tree package: upserts its skills and files by key and creates its trees'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Package directory or .zip file')
+        parser.add_argument(
+            '--creator',
+            help='Username credited for skills whose creator does not exist here (default: first superuser)',
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['creator']:
+            creator = User.objects.filter(username=options['creator']).first()
+            if creator is None:
+                raise CommandError(f'User {options["creator"]} does not exist')
+        else:
+            creator = User.objects.filter(is_superuser=True).order_by('pk').first()
+
+        start = time.perf_counter()
+        try:
+            summary = import_package(options['path'], creator=creator)
+        except PackageError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f'Files: {summary["files_created"]} created, {summary["files_updated"]} updated\n'
+            f'Skills: {summary["skills_created"]} created, {summary["skills_updated"]} updated\n'
+            f'Pauses: {summary["pauses_written"]} written, {summary["pauses_deleted"]} deleted'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(summary["trees"])} trees ({summary["nodes"]} nodes, {summary["edges"]} edges) '
+            f'in {time.perf_counter() - start:.1f}s: ids {", ".join(map(str, summary["trees"])) or "-"}'
+        ))
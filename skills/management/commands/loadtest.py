@@ -0,0 +1,117 @@
+import json
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from skills.loadtest import Recorder, Session, serve
+from skills.models import Node, Tree
+from skills.synthetic import delete_synthetic, generate
+
+PREFIX = 'loadtest'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds synthetic trees and drives concurrent learners through gunicorn: homepage, '
+        'tree page, toggle, ignore and reload (generated data is deleted afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent logged-in sessions')
+        parser.add_argument('--seconds', type=float, default=30)
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=1, help='Threads per sync worker')
+        parser.add_argument('--trees', type=int, default=5)
+        parser.add_argument('--nodes', type=int, default=200, help='Nodes per tree')
+        parser.add_argument('--think-ms', type=int, default=0, help='Pause between steps of one session')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data for another run')
+
+    def handle(self, *args, **options):
+        delete_synthetic(PREFIX)
+        summary = generate(
+            trees=options['trees'], nodes=options['nodes'], users=options['clients'], prefix=PREFIX,
+        )
+        try:
+            trees = {
+                tree.pk: (tree.version, list(Node.objects.filter(tree=tree).values_list('pk', flat=True)))
+                for tree in Tree.objects.filter(pk__in=summary['trees'])
+            }
+            cookies = []
+            for user in get_user_model().objects.filter(pk__in=summary['users']):
+                client = Client()
+                client.force_login(user)
+                cookies.append({'sessionid': client.cookies['sessionid'].value})
+
+            self.stdout.write(
+                f'{options["clients"]} clients, {options["mode"]} with {options["workers"]} worker(s), '
+                f'{summary["nodes"]} nodes in {len(trees)} trees, {options["seconds"]}s'
+            )
+            recorder = Recorder()
+            with serve(options['mode'], workers=options['workers'], threads=options['threads']) as port:
+                self.run(port, cookies, trees, recorder, options['seconds'], options['think_ms'] / 1000)
+            self.report(recorder, options['seconds'])
+        finally:
+            if not options['keep']:
+                delete_synthetic(PREFIX)
+
+    def run(self, port, cookies, trees, recorder, seconds, think):
+        deadline = time.monotonic() + seconds
+
+        def learner(index):
+            rng = random.Random(index)
+            session = Session(port, cookies[index])
+            seq = 0
+            while time.monotonic() < deadline:
+                tree_id = rng.choice(list(trees))
+                version, node_ids = trees[tree_id]
+                # The homepage sets the CSRF cookie the batch POSTs send back
+                recorder.timed('homepage', session, 'GET', '/')
+                self.open_tree(recorder, session, tree_id, version)
+                for label, state in (('toggle', {'done': rng.random() < 0.7}), ('ignore', {'ignored': True})):
+                    time.sleep(think)
+                    seq += 1
+                    recorder.timed(
+                        label, session, 'POST', '/progress/batch/',
+                        json.dumps({'ops': [{'node': rng.choice(node_ids), 'seq': seq, **state}]}),
+                    )
+                time.sleep(think)
+                self.open_tree(recorder, session, tree_id, version, reload=True)
+
+        threads = [threading.Thread(target=learner, args=(i,)) for i in range(len(cookies))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def open_tree(self, recorder, session, tree_id, version, reload=False):
+        """The shell page, then the structure and progress requests its script makes."""
+        prefix = 'reload ' if reload else ''
+        recorder.timed(f'{prefix}tree', session, 'GET', f'/tree/{tree_id}/')
+        if not reload:
+            # The browser caches the versioned structure after the first visit
+            recorder.timed('structure', session, 'GET', f'/tree/{tree_id}/structure/?v={version}')
+        recorder.timed(f'{prefix}progress', session, 'GET', f'/tree/{tree_id}/progress/')
+
+    def report(self, recorder, seconds):
+        self.stdout.write(
+            f'{"endpoint":<16} {"requests":>8} {"req/s":>7} {"p50":>7} {"p90":>7} {"p99":>8} '
+            f'{"max":>8} {"errors":>7} {"err %":>6}'
+        )
+        total = errors_total = 0
+        for label, count, rate, p50, p90, p99, slowest, errors in recorder.summary(seconds):
+            total += count
+            errors_total += errors
+            error_rate = 100 * errors / (count + errors) if count + errors else 0
+            self.stdout.write(
+                f'{label:<16} {count:>8} {rate:>7.1f} {p50:>7.1f} {p90:>7.1f} {p99:>8.1f} '
+                f'{slowest:>8.1f} {errors:>7} {error_rate:>6.2f}'
+            )
+        self.stdout.write(f'{"total":<16} {total:>8} {total / seconds:>7.1f} {"":>42} {errors_total:>7}')
+        for label, kinds in sorted(recorder.errors.items()):
+            detail = ', '.join(f'{kind}: {n}' for kind, n in sorted(kinds.items()))
+            self.stdout.write(f'  {label} errors: {detail}')
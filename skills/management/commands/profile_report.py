@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from skills.models import RequestProfile
+from skills.profiling import dump_stats, load_stats, report
+
+
+class Command(BaseCommand):
+    help = 'Prints the hot functions across stored request profiles, optionally saving them merged as .prof'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only profiles of this view (e.g. skills.views.tree_structure)')
+        parser.add_argument('--path', help='Only profiles whose path starts with this')
+        parser.add_argument('--hours', type=float, help='Only profiles from the last N hours')
+        parser.add_argument('--sort', default='tottime', help='pstats sort key: tottime, cumulative, ncalls, ...')
+        parser.add_argument('--limit', type=int, default=30, help='Functions to print')
+        parser.add_argument('--output', help='Write the merged profile to this .prof file')
+
+    def handle(self, *args, **options):
+        profiles = RequestProfile.objects.all()
+        if options['view']:
+            profiles = profiles.filter(view=options['view'])
+        if options['path']:
+            profiles = profiles.filter(path__startswith=options['path'])
+        if options['hours']:
+            profiles = profiles.filter(created_at__gte=timezone.now() - timedelta(hours=options['hours']))
+
+        count = profiles.count()
+        stats = load_stats(profiles.values_list('stats', flat=True).iterator())
+        if stats is None:
+            raise CommandError('No profiles match')
+        self.stdout.write(f'{count} profiled requests')
+        self.stdout.write(report(stats, options['sort'], options['limit']))
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                fh.write(dump_stats(stats))
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
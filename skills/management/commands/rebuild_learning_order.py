@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.models import Tree
+from skills.ordering import rebuild_learning_order
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored learning order of trees and validates their graphs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tree_ids', nargs='*', type=int, help='Trees to rebuild (default: all)')
+        parser.add_argument('--strict', action='store_true', help='Fail if any tree has graph problems')
+
+    def handle(self, *args, **options):
+        trees = Tree.objects.order_by('pk')
+        if options['tree_ids']:
+            trees = trees.filter(pk__in=options['tree_ids'])
+
+        invalid = 0
+        for tree in trees.only('id', 'title'):
+            errors = rebuild_learning_order(tree.pk, background_layout=False)
+            if errors:
+                invalid += 1
+                self.stdout.write(self.style.WARNING(f'{tree.title}:'))
+                for error in errors:
+                    self.stdout.write(f'  {error}')
+            else:
+                self.stdout.write(f'  {tree.title}: ok')
+
+        if invalid and options['strict']:
+            raise CommandError(f'{invalid} tree(s) have graph problems')
+        self.stdout.write(self.style.SUCCESS('Learning order rebuilt'))
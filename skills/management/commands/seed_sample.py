@@ -1,7 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
 from skills.models import Edge, Node, Skill, Tree
+from skills.ordering import rebuild_pending
 
 User = get_user_model()
 
@@ -33,6 +35,7 @@ SKILLS = [
 class Command(BaseCommand):
     help = 'Seeds the database with sample n8n course data'
 
+    @transaction.atomic
     def handle(self, *args, **options):
         # Get or create admin user
         admin, created = User.objects.get_or_create(
@@ -172,4 +175,8 @@ class Command(BaseCommand):
             edge_count += 1
 
         self.stdout.write(f'  Created {edge_count} edges')
+
+        for tree_id, errors in rebuild_pending().items():
+            for error in errors:
+                self.stdout.write(self.style.WARNING(f'  Tree {tree_id}: {error}'))
         self.stdout.write(self.style.SUCCESS('Sample data seeded successfully!'))
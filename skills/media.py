@@ -0,0 +1,175 @@
+"""
+Delivery of uploaded resource files (`File.file`, `Tree.resources_zip`).
+
+WhiteNoise only serves static files, so `skills.views.resource_file` serves
+MEDIA_URL. Every response carries an ETag and Last-Modified from the file's
+size and mtime plus a long `max-age`, so repeat downloads are 304s. Uploads
+never overwrite each other (the storage renames clashing names), which makes
+the long lifetime safe.
+
+The body is handed off whenever possible:
+
+- MEDIA_ACCEL_REDIRECT: an `X-Accel-Redirect` to an internal nginx location
+  aliasing MEDIA_ROOT; nginx then serves the bytes and the ranges itself.
+- MEDIA_SENDFILE_HEADER: an `X-Sendfile` style header with the absolute path,
+  for Apache's mod_xsendfile or lighttpd.
+- Otherwise a `FileResponse`, which gunicorn's file wrapper sends with
+  os.sendfile(); a single `Range` (206) is sent the same way from its offset.
+"""
+import mimetypes
+import os
+import posixpath
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .metrics import media_responses
+from .models import File, Tree
+
+RESOURCE_FIELDS = (File._meta.get_field('file'), Tree._meta.get_field('resources_zip'))
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileRange:
+    """
+    Bytes [start, start + length) of an open file. fileno() stays available so
+    the WSGI file wrapper can still sendfile() it: gunicorn sends
+    Content-Length bytes from the file's current offset.
+    """
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def resolve(name):
+    """(absolute path, os.stat result) of an uploaded resource, or Http404."""
+    name = posixpath.normpath(name)
+    for field in RESOURCE_FIELDS:
+        # Only the upload directories, never the rest of MEDIA_ROOT
+        if name.startswith(field.upload_to) and '\0' not in name:
+            try:
+                path = field.storage.path(name)
+                info = os.stat(path)
+            except (OSError, ValueError, NotImplementedError):
+                break
+            if stat.S_ISREG(info.st_mode):
+                return path, info
+            break
+    raise Http404('No such resource')
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive of a single `bytes=` range, or None to send the
+    whole file: multiple and malformed ranges are ignored, which RFC 9110
+    allows. Raises RangeNotSatisfiable when the range starts past the end.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    # Each side is ASCII digits or empty, and not both empty (isdigit() alone accepts '²')
+    if not dash or not (first + last).isascii() or not (first + last).isdigit():
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def range_applies(request, etag, mtime):
+    """If-Range: only a strong ETag or the exact date of the current file keeps the range."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def serve_resource(request, name):
+    path, info = resolve(name)
+    etag = f'"{info.st_size:x}-{info.st_mtime_ns:x}"'
+    mtime = int(info.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is not None:
+        mode = 'not_modified'
+    elif settings.MEDIA_ACCEL_REDIRECT or settings.MEDIA_SENDFILE_HEADER:
+        response = HttpResponse(content_type=content_type(path))
+        if settings.MEDIA_ACCEL_REDIRECT:
+            location = settings.MEDIA_ACCEL_REDIRECT.rstrip('/')
+            response['X-Accel-Redirect'] = f'{location}/{quote(posixpath.normpath(name))}'
+            mode = 'accel_redirect'
+        else:
+            response[settings.MEDIA_SENDFILE_HEADER] = path
+            mode = 'sendfile_header'
+    else:
+        response, mode = stream_file(request, path, info.st_size, etag, mtime)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    # Shared caches key on the URL alone, so a 416 must not be stored for it
+    if response.status_code != 416:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_SECONDS)
+    media_responses.inc(mode=mode)
+    return response
+
+
+def stream_file(request, path, size, etag, mtime):
+    byte_range = None
+    if request.headers.get('Range') and range_applies(request, etag, mtime):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response, 'not_satisfiable'
+
+    fh = open(path, 'rb')
+    filename = os.path.basename(path)
+    if byte_range is None:
+        return FileResponse(fh, filename=filename), 'full'
+    start, end = byte_range
+    response = FileResponse(FileRange(fh, start, end - start + 1), filename=filename, status=206)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response, 'partial'
+
+
+def content_type(path):
+    guessed, encoding = mimetypes.guess_type(path)
+    # Like FileResponse: never let the browser decompress an archive on its own
+    if encoding:
+        return 'application/octet-stream'
+    return guessed or 'application/octet-stream'
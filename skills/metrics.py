@@ -0,0 +1,25 @@
+"""Application metrics, exposed on /metrics by skilltrees.metrics."""
+from skilltrees.metrics import counter, gauge
+
+cache_requests = counter(
+    'skilltrees_cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result'],
+)
+progress_writes = counter(
+    'skilltrees_progress_writes_total', 'Learner progress changes by kind', ['kind'],
+)
+heartbeats = counter('skilltrees_heartbeats_total', 'Video position heartbeats received')
+heartbeat_positions_written = counter(
+    'skilltrees_heartbeat_positions_written_total', 'Buffered video positions written to the database',
+)
+heartbeat_buffered = gauge(
+    'skilltrees_heartbeat_buffered_positions', 'Video positions waiting to be written', mode='livesum',
+)
+media_responses = counter(
+    'skilltrees_media_responses_total',
+    'Resource file responses by how the body was sent (accel_redirect, sendfile_header, full, partial, '
+    'not_modified, not_satisfiable)',
+    ['mode'],
+)
+# Whichever worker compiled a tree last knows its current size
+tree_nodes = gauge('skilltrees_tree_nodes', 'Nodes per tree (as of its last compiled version)', ['tree'], mode='last')
+tree_edges = gauge('skilltrees_tree_edges', 'Edges per tree (as of its last compiled version)', ['tree'], mode='last')
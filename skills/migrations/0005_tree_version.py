@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0004_add_preview_fields_to_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tree',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped whenever the graph or its content changes'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.9 on 2026-10-17 18:50
+
+from django.db import migrations, models
+
+
+# A frozen copy of skills.graph.compute_learning_order as of this migration, so
+# later changes to the live code cannot change what it did. Graph problems are
+# left to the next rebuild (manage.py rebuild_learning_order).
+def learning_order(node_ids, edges):
+    """{node_id: (position, depth)}: post-order DFS over prerequisites from the goal."""
+    has_outgoing = {from_id for from_id, _, _ in edges}
+    goal_ids = [node_id for node_id in node_ids if node_id not in has_outgoing]
+    if not goal_ids:
+        return {}
+    by_target = {}
+    for from_id, to_id, priority in edges:
+        by_target.setdefault(to_id, []).append((priority, from_id))
+    prereqs_map = {
+        to_id: [from_id for _, from_id in sorted(prereqs, key=lambda p: p[0])]
+        for to_id, prereqs in by_target.items()
+    }
+
+    sequence = []
+    visited = {goal_ids[0]}
+    stack = [(goal_ids[0], 0)]
+    while stack:
+        node_id, index = stack[-1]
+        prereqs = prereqs_map.get(node_id, ())
+        if index < len(prereqs):
+            stack[-1] = (node_id, index + 1)
+            if prereqs[index] not in visited:
+                visited.add(prereqs[index])
+                stack.append((prereqs[index], 0))
+        else:
+            stack.pop()
+            sequence.append(node_id)
+
+    depths = {node_id: 0 for node_id in sequence}
+    for node_id in reversed(sequence):
+        for prereq_id in prereqs_map.get(node_id, ()):
+            if prereq_id in depths and depths[prereq_id] < depths[node_id] + 1:
+                depths[prereq_id] = depths[node_id] + 1
+    return {node_id: (i, depths[node_id]) for i, node_id in enumerate(sequence)}
+
+
+def populate_learning_order(apps, schema_editor):
+    Tree = apps.get_model('skills', 'Tree')
+    Node = apps.get_model('skills', 'Node')
+    Edge = apps.get_model('skills', 'Edge')
+    for tree in Tree.objects.all():
+        nodes = list(Node.objects.filter(tree=tree).order_by('id'))
+        edges = list(
+            Edge.objects.filter(to_node__tree=tree, from_node__tree=tree)
+            .order_by('to_node_id', 'priority', 'id')
+            .values_list('from_node_id', 'to_node_id', 'priority')
+        )
+        order = learning_order([n.id for n in nodes], edges)
+        for node in nodes:
+            node.position, node.depth = order.get(node.id, (None, None))
+        Node.objects.bulk_update(nodes, ['position', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0005_tree_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='depth',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Longest prerequisite distance from the goal', null=True),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Index in the learning sequence; empty if the goal does not need this node', null=True),
+        ),
+        migrations.AddField(
+            model_name='tree',
+            name='graph_errors',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Problems found when the learning order was last rebuilt'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['tree', 'position'], name='skills_node_tree_id_68755f_idx'),
+        ),
+        migrations.RunPython(populate_learning_order, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 18:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0006_materialized_learning_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_nodes', models.PositiveIntegerField(default=0)),
+                ('total_nodes', models.PositiveIntegerField(default=0)),
+                ('tree_version', models.PositiveIntegerField(default=0, help_text='Tree version the counters were computed for')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_node', models.ForeignKey(blank=True, help_text='Resume cursor: last node the user completed in this tree', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='skills.node')),
+                ('next_node', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='skills.node')),
+                ('tree', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_progress', to='skills.tree')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tree_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Tree progress',
+                'unique_together': {('user', 'tree')},
+            },
+        ),
+    ]
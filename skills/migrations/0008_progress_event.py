@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-17 19:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0007_tree_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('started', 'Started'), ('position', 'Position'), ('completed', 'Completed'), ('ignored', 'Ignored'), ('reset', 'Reset')], max_length=10)),
+                ('position', models.PositiveIntegerField(blank=True, help_text='Video position in seconds', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('node', models.ForeignKey(blank=True, help_text="Set when the event moves this node's tree resume cursor", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='skills.node')),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='skills.skill')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='skills_prog_user_id_d7d8bf_idx')],
+            },
+        ),
+    ]
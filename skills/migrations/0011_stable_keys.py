@@ -0,0 +1,45 @@
+import uuid
+
+from django.db import migrations, models
+
+import skills.models
+
+
+def fill_keys(apps, schema_editor):
+    for model_name in ['File', 'Skill']:
+        model = apps.get_model('skills', model_name)
+        rows = list(model.objects.filter(key__isnull=True).only('pk'))
+        for row in rows:
+            row.key = uuid.uuid4().hex
+        model.objects.bulk_update(rows, ['key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0010_boot_step'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='key',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='key',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='file',
+            name='key',
+            field=models.CharField(default=skills.models.new_key, help_text='Stable identifier used by tree packages', max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='skill',
+            name='key',
+            field=models.CharField(default=skills.models.new_key, help_text='Stable identifier used by tree packages', max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 19:31
+
+from django.db import migrations, models
+
+
+# Layouts are derived data: the boot command's layouts step (or rebuild_learning_order)
+# fills them with the current skills.layout, which a migration must not import
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0011_stable_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tree',
+            name='layout',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Node coordinates computed by skills.layout with the learning order'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0012_tree_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skill',
+            name='pauses_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped whenever the pauses or their attachments change'),
+        ),
+    ]
@@ -1,7 +1,13 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
 
 
+def new_key():
+    return uuid.uuid4().hex
+
+
 class FileCategory(models.TextChoices):
     N8N_WORKFLOW = 'n8n', 'n8n Workflow'
     MAKE_WORKFLOW = 'make', 'Make Workflow'
@@ -12,6 +18,12 @@ class FileCategory(models.TextChoices):
 class File(models.Model):
     """Downloadable resource file attached to skills."""
 
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        default=new_key,
+        help_text='Stable identifier used by tree packages',
+    )
     file = models.FileField(upload_to='resources/')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -25,6 +37,12 @@ class File(models.Model):
 class Skill(models.Model):
     """A short video tutorial with text description and resources."""
 
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        default=new_key,
+        help_text='Stable identifier used by tree packages',
+    )
     title = models.CharField(max_length=255)
     video_url = models.URLField(help_text='YouTube embed URL')
     text = models.TextField(help_text='Markdown content with inline images')
@@ -36,6 +54,11 @@ class Skill(models.Model):
         related_name='created_skills',
     )
     resources = models.ManyToManyField(File, blank=True, related_name='skills')
+    pauses_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text='Bumped whenever the pauses or their attachments change',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -111,6 +134,23 @@ class Tree(models.Model):
         blank=True,
         help_text='Config for preview: strudel={pattern}, animation={type}',
     )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text='Bumped whenever the graph or its content changes',
+    )
+    graph_errors = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        help_text='Problems found when the learning order was last rebuilt',
+    )
+    layout = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Node coordinates computed by skills.layout with the learning order',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -130,9 +170,25 @@ class Node(models.Model):
         blank=True,
         through='Edge',
     )
+    # Materialized learning order, maintained by skills.ordering
+    position = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Index in the learning sequence; empty if the goal does not need this node',
+    )
+    depth = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Longest prerequisite distance from the goal',
+    )
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(fields=['tree', 'position']),
+        ]
 
     def __str__(self):
         return f'{self.tree.title}: {self.skill.title}'
@@ -180,3 +236,123 @@ class SkillProgress(models.Model):
 
     def __str__(self):
         return f'{self.user.username}: {self.skill.title} ({self.status})'
+
+
+class TreeProgress(models.Model):
+    """Denormalized per-user progress in one tree, maintained by skills.progress."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tree_progress',
+    )
+    tree = models.ForeignKey(Tree, on_delete=models.CASCADE, related_name='user_progress')
+    completed_nodes = models.PositiveIntegerField(default=0)
+    total_nodes = models.PositiveIntegerField(default=0)
+    next_node = models.ForeignKey(
+        Node,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    last_node = models.ForeignKey(
+        Node,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        help_text='Resume cursor: last node the user completed in this tree',
+    )
+    tree_version = models.PositiveIntegerField(default=0, help_text='Tree version the counters were computed for')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'tree']
+        verbose_name_plural = 'Tree progress'
+
+    @property
+    def percent(self):
+        return round(100 * self.completed_nodes / self.total_nodes) if self.total_nodes else 0
+
+    def __str__(self):
+        return f'{self.user.username}: {self.tree.title} ({self.completed_nodes}/{self.total_nodes})'
+
+
+class ProgressEvent(models.Model):
+    """Append-only learner progress change, folded into the progress tables by skills.events."""
+
+    class Kind(models.TextChoices):
+        STARTED = 'started', 'Started'
+        POSITION = 'position', 'Position'
+        COMPLETED = 'completed', 'Completed'
+        IGNORED = 'ignored', 'Ignored'
+        RESET = 'reset', 'Reset'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='progress_events',
+    )
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='+')
+    node = models.ForeignKey(
+        Node,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        help_text="Set when the event moves this node's tree resume cursor",
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    position = models.PositiveIntegerField(null=True, blank=True, help_text='Video position in seconds')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'])]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.kind} skill {self.skill_id}'
+
+
+class RequestProfile(models.Model):
+    """cProfile of one request, captured by skills.profiling."""
+
+    class Trigger(models.TextChoices):
+        HEADER = 'header', 'Header'
+        PARAM = 'param', 'Query parameter'
+        SAMPLE = 'sample', 'Random sample'
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True)
+    status = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    trigger = models.CharField(max_length=10, choices=Trigger.choices)
+    duration_ms = models.FloatField()
+    queries = models.PositiveIntegerField(null=True, blank=True)
+    stats = models.BinaryField(help_text='Marshalled pstats data, loadable with pstats or snakeviz')
+    summary = models.TextField(blank=True, help_text='Top functions by cumulative time')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+
+class BootStep(models.Model):
+    """Fingerprint of the inputs a deploy step last ran with (see the boot command)."""
+
+    name = models.CharField(max_length=100, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
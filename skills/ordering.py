@@ -0,0 +1,208 @@
+"""
+Materialized learning order.
+
+Each node's index in its tree's learning sequence (`Node.position`) and its
+distance from the goal (`Node.depth`) are stored, so reads are one ordered,
+indexed query instead of a traversal. Graph edits mark their trees stale; the
+admin and management commands call `rebuild_pending()` inside their own
+transaction, and anything else is rebuilt once its transaction commits. With
+TREE_LAYOUT_BACKGROUND those leftover rebuilds go to a per-worker thread, so a
+loop of saves outside a transaction rebuilds each tree once instead of once
+per save.
+
+The graph's drawing coordinates (`Tree.layout`) follow each rebuild. With
+TREE_LAYOUT_BACKGROUND they are computed by the same thread once the rebuild
+commits, so an admin save does not wait for the layout of a large tree; the
+page lays the tree out itself until they are stored.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .artifacts import bump_tree_versions
+from .graph import compute_learning_order, validate_graph
+from .layout import tree_layout
+from .models import Edge, Node, Tree
+
+logger = logging.getLogger(__name__)
+
+_pending = threading.local()
+
+
+def _pending_tree_ids():
+    if not hasattr(_pending, 'tree_ids'):
+        _pending.tree_ids = set()
+    return _pending.tree_ids
+
+
+def tree_edges(tree_id):
+    return list(
+        Edge.objects.filter(to_node__tree_id=tree_id, from_node__tree_id=tree_id)
+        .order_by('to_node_id', 'priority', 'id')
+        .values_list('from_node_id', 'to_node_id', 'priority')
+    )
+
+
+def graph_edit_errors(tree_id, add=(), remove=()):
+    """
+    Cycles the tree's graph would have with the edges whose ids are in
+    `remove` replaced by `add`, as (from_node_id, to_node_id, priority)
+    tuples. Other graph problems only show up in the next rebuild's errors.
+    """
+    node_ids = list(Node.objects.filter(tree_id=tree_id).values_list('id', flat=True))
+    edges = list(
+        Edge.objects.filter(to_node__tree_id=tree_id, from_node__tree_id=tree_id)
+        .exclude(pk__in=remove)
+        .values_list('from_node_id', 'to_node_id', 'priority')
+    )
+    return validate_graph(node_ids, edges + list(add), complete=False)
+
+
+@transaction.atomic
+def rebuild_learning_order(tree_id, background_layout=None):
+    """
+    Recompute and store the learning order of one tree. Returns its graph errors.
+    The layout is queued for the graph worker unless `background_layout` (by
+    default TREE_LAYOUT_BACKGROUND) is false, in which case it is stored here.
+    """
+    if background_layout is None:
+        background_layout = settings.TREE_LAYOUT_BACKGROUND
+    nodes = list(Node.objects.filter(tree_id=tree_id).select_for_update().order_by('id'))
+    node_ids = [n.id for n in nodes]
+    edges = tree_edges(tree_id)
+    order, errors = compute_learning_order(node_ids, edges)
+
+    changed = []
+    for node in nodes:
+        position, depth = order.get(node.id, (None, None))
+        if node.position != position or node.depth != depth:
+            node.position = position
+            node.depth = depth
+            changed.append(node)
+    if changed:
+        Node.objects.bulk_update(changed, ['position', 'depth'], batch_size=500)
+    fields = {'graph_errors': errors}
+    if background_layout:
+        # The worker reads the graph after this transaction commits
+        transaction.on_commit(lambda: graph_worker.schedule_layout([tree_id]))
+    else:
+        fields['layout'] = tree_layout(node_ids, edges)
+    Tree.objects.filter(pk=tree_id).update(**fields)
+    bump_tree_versions([tree_id])
+
+    if errors:
+        logger.warning('Tree %s graph problems: %s', tree_id, '; '.join(errors))
+    return errors
+
+
+def mark_order_stale(tree_ids):
+    """Queue trees for a rebuild when the current transaction commits."""
+    tree_ids = {tid for tid in tree_ids if tid is not None}
+    if tree_ids:
+        _pending_tree_ids().update(tree_ids)
+        # Registered per call so a rolled-back savepoint cannot drop the rebuild;
+        # once the queue is drained the extra callbacks are no-ops
+        transaction.on_commit(rebuild_committed)
+
+
+def rebuild_committed():
+    """Rebuild the trees still queued after a commit, on the worker with TREE_LAYOUT_BACKGROUND."""
+    if not settings.TREE_LAYOUT_BACKGROUND:
+        rebuild_pending()
+        return
+    pending = _pending_tree_ids()
+    if pending:
+        tree_ids = sorted(pending)
+        pending.clear()
+        graph_worker.schedule_rebuild(tree_ids)
+
+
+def rebuild_pending():
+    """Rebuild every queued tree that still exists. Returns {tree_id: errors}."""
+    pending = _pending_tree_ids()
+    if not pending:
+        return {}
+    tree_ids = sorted(pending)
+    pending.clear()
+    return rebuild_trees(tree_ids)
+
+
+def rebuild_trees(tree_ids):
+    """Rebuild every tree of `tree_ids` that still exists. Returns {tree_id: errors}."""
+    existing = set(Tree.objects.filter(pk__in=tree_ids).values_list('pk', flat=True))
+    return {tree_id: rebuild_learning_order(tree_id) for tree_id in tree_ids if tree_id in existing}
+
+
+def store_layout(tree_id):
+    """Compute and store the layout of one tree's current graph."""
+    node_ids = list(Node.objects.filter(tree_id=tree_id).order_by('id').values_list('id', flat=True))
+    if Tree.objects.filter(pk=tree_id).update(layout=tree_layout(node_ids, tree_edges(tree_id))):
+        bump_tree_versions([tree_id])
+
+
+class GraphWorker:
+    """
+    Per-worker background thread rebuilding the learning orders queued with
+    `schedule_rebuild` and storing the layouts queued with `schedule_layout`.
+    A tree queued several times before the thread gets to it is done once.
+    """
+
+    def __init__(self):
+        self._rebuilds = set()
+        self._layouts = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def schedule_rebuild(self, tree_ids):
+        self._schedule(self._rebuilds, tree_ids)
+
+    def schedule_layout(self, tree_ids):
+        self._schedule(self._layouts, tree_ids)
+
+    def _schedule(self, queue, tree_ids):
+        with self._lock:
+            queue.update(tree_ids)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tree-graph', daemon=True)
+                self._thread.start()
+                # Commands exit right after their edits; finish those trees before they do
+                atexit.register(self.run_once)
+        self._wake.set()
+
+    def run_once(self):
+        """Rebuild, then lay out, every queued tree; returns how many trees were processed."""
+        with self._lock:
+            rebuilds, self._rebuilds = sorted(self._rebuilds), set()
+        done = 0
+        for tree_id in rebuilds:
+            try:
+                # Queues the layout of the tree, which the loop below picks up
+                done += len(rebuild_trees([tree_id]))
+            except Exception:
+                # The tree keeps its previous order until its next edit
+                logger.exception('Learning order of tree %s failed', tree_id)
+
+        with self._lock:
+            layouts, self._layouts = sorted(self._layouts), set()
+        for tree_id in layouts:
+            try:
+                store_layout(tree_id)
+                done += 1
+            except Exception:
+                # The tree keeps its previous layout until its next rebuild
+                logger.exception('Layout of tree %s failed', tree_id)
+        return done
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            close_old_connections()
+            self.run_once()
+
+
+graph_worker = GraphWorker()
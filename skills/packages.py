@@ -0,0 +1,609 @@
+"""
+Portable tree packages: export, import and cloning in bulk.
+
+A package is a directory or a .zip file with one JSON Lines file per table,
+read in this order:
+
+    files.jsonl   {"key", "title", "description", "category", "path"}
+    skills.jsonl  {"key", "title", "video_url", "text", "duration", "creator", "resources"}
+    pauses.jsonl  {"skill", "time", "title", "attachment", "clipboard"}
+    trees.jsonl   {"ref", "title", "description", "intro_video_url", "goal_skill", "is_free",
+                   "preview_type", "preview_config", "graph_errors", "resources_zip"}
+    nodes.jsonl   {"ref", "tree", "skill", "position", "depth"}
+    edges.jsonl   {"from", "to", "optional", "priority"}
+
+plus the resource files bundled at the `path` (and `resources_zip`) each row
+names. Files and skills are identified by their stable `key` and referred to
+by it (`creator` is a username), so importing a package again updates them in
+place: changed rows are upserted, a skill's pauses are replaced by the
+package's. Trees, nodes and edges carry package-local `ref`s and are always
+imported as new rows.
+
+Rows are streamed with iterator() on export and read line by line on import,
+then written with bulk_create in batches; only the key and ref to id maps grow
+with the package. Bulk writes skip the model signals, so the import rebuilds
+the learning order of its trees and bumps the version of existing trees whose
+skills changed and the pause manifests of skills whose pauses or attachments
+changed.
+"""
+import itertools
+import json
+import os
+import shutil
+import zipfile
+from contextlib import contextmanager
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .artifacts import bump_tree_versions
+from .models import Edge, File, Node, Pause, Skill, Tree
+from .ordering import rebuild_learning_order
+from .pauses import bump_pause_versions
+
+BATCH_SIZE = 1000
+SKILL_FIELDS = ['title', 'video_url', 'text', 'duration', 'creator_id']
+FILE_FIELDS = ['title', 'description', 'category']
+PAUSE_FIELDS = ['title', 'attachment_id', 'clipboard']
+
+
+class PackageError(Exception):
+    pass
+
+
+class PackageWriter:
+    """Writes package members into a directory, or a .zip file if `path` ends with .zip."""
+
+    def __init__(self, path):
+        self.path = path
+        if path.endswith('.zip'):
+            self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            self.zip = None
+            os.makedirs(path, exist_ok=True)
+
+    @contextmanager
+    def open(self, name):
+        if self.zip is not None:
+            with self.zip.open(name, 'w', force_zip64=True) as fh:
+                yield fh
+            return
+        target = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as fh:
+            yield fh
+
+    def write_rows(self, name, rows):
+        count = 0
+        with self.open(name) as fh:
+            for row in rows:
+                fh.write(json.dumps(row, ensure_ascii=False).encode() + b'\n')
+                count += 1
+        return count
+
+    def copy(self, name, source):
+        with self.open(name) as fh:
+            shutil.copyfileobj(source, fh)
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+
+class PackageReader:
+    """Reads package members from a directory or a .zip file."""
+
+    def __init__(self, path):
+        if os.path.isdir(path):
+            self.zip = None
+        elif zipfile.is_zipfile(path):
+            self.zip = zipfile.ZipFile(path)
+        else:
+            raise PackageError(f'{path} is neither a directory nor a zip file')
+        self.path = path
+
+    def exists(self, name):
+        if self.zip is not None:
+            try:
+                self.zip.getinfo(name)
+            except KeyError:
+                return False
+            return True
+        return os.path.isfile(self._local(name))
+
+    def open(self, name):
+        if not self.exists(name):
+            raise PackageError(f'{name} is missing from the package')
+        if self.zip is not None:
+            return self.zip.open(name)
+        return open(self._local(name), 'rb')
+
+    def rows(self, name):
+        """Rows of a JSON Lines member; a missing member has none."""
+        if not self.exists(name):
+            return
+        with self.open(name) as fh:
+            for number, line in enumerate(fh, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    raise PackageError(f'{name} line {number}: {exc}') from exc
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+    def _local(self, name):
+        target = os.path.normpath(os.path.join(self.path, name))
+        if os.path.isabs(name) or not target.startswith(os.path.normpath(self.path) + os.sep):
+            raise PackageError(f'{name} points outside the package')
+        return target
+
+
+def batches(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+# Export
+
+def export_package(path, tree_ids=None, bundle_files=True):
+    """
+    Write the given trees (all trees if None) to a package at `path`, with
+    the skills and files they use; exporting every tree also includes the
+    skills and files no tree uses. Returns the row count of every member.
+    """
+    trees = Tree.objects.all()
+    skills = Skill.objects.all()
+    files = File.objects.all()
+    if tree_ids is not None:
+        trees = trees.filter(pk__in=tree_ids)
+        skills = skills.filter(
+            Q(pk__in=Node.objects.filter(tree__in=trees).values('skill_id'))
+            | Q(pk__in=trees.values('goal_skill_id'))
+        )
+        files = files.filter(
+            Q(pk__in=Skill.resources.through.objects.filter(skill__in=skills).values('file_id'))
+            | Q(pk__in=Pause.objects.filter(skill__in=skills).values('attachment_id'))
+        )
+
+    counts = {}
+    writer = PackageWriter(path)
+    try:
+        counts['files.jsonl'] = writer.write_rows('files.jsonl', export_files(files, bundle_files))
+        if bundle_files:
+            for key, name in files.order_by('pk').values_list('key', 'file').iterator():
+                if name:
+                    with File._meta.get_field('file').storage.open(name) as source:
+                        writer.copy(bundled_path('resources', key, name), source)
+        counts['skills.jsonl'] = writer.write_rows('skills.jsonl', export_skills(skills))
+        counts['pauses.jsonl'] = writer.write_rows('pauses.jsonl', export_pauses(skills))
+        counts['trees.jsonl'] = writer.write_rows('trees.jsonl', export_trees(trees, bundle_files))
+        if bundle_files:
+            zips = trees.exclude(resources_zip='').order_by('pk').values_list('pk', 'resources_zip')
+            for pk, name in zips.iterator():
+                with Tree._meta.get_field('resources_zip').storage.open(name) as source:
+                    writer.copy(bundled_path('tree_resources', pk, name), source)
+        counts['nodes.jsonl'] = writer.write_rows('nodes.jsonl', export_nodes(trees))
+        counts['edges.jsonl'] = writer.write_rows('edges.jsonl', export_edges(trees))
+    finally:
+        writer.close()
+    return counts
+
+
+def bundled_path(folder, owner, name):
+    return f'{folder}/{owner}/{os.path.basename(name)}'
+
+
+def export_files(files, bundle_files):
+    rows = files.order_by('pk').values('key', 'title', 'description', 'category', 'file')
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        name = row.pop('file')
+        row['path'] = bundled_path('resources', row['key'], name) if bundle_files and name else None
+        yield row
+
+
+def export_skills(skills):
+    rows = skills.order_by('pk').values(
+        'pk', 'key', 'title', 'video_url', 'text', 'duration', 'creator__username',
+    )
+    resources = (
+        Skill.resources.through.objects.filter(skill__in=skills)
+        .order_by('skill_id', 'file_id')
+        .values_list('skill_id', 'file__key')
+    )
+    # Both streams are ordered by skill id, so the resources are merged in without a query per skill
+    grouped = itertools.groupby(resources.iterator(chunk_size=BATCH_SIZE), key=itemgetter(0))
+    pending = next(grouped, None)
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        pk = row.pop('pk')
+        while pending is not None and pending[0] < pk:
+            pending = next(grouped, None)
+        keys = []
+        if pending is not None and pending[0] == pk:
+            keys = [key for _, key in pending[1]]
+            pending = next(grouped, None)
+        row['creator'] = row.pop('creator__username')
+        row['resources'] = keys
+        yield row
+
+
+def export_pauses(skills):
+    rows = (
+        Pause.objects.filter(skill__in=skills)
+        .order_by('skill_id', 'time')
+        .values('skill__key', 'time', 'title', 'attachment__key', 'clipboard')
+    )
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        yield {
+            'skill': row['skill__key'],
+            'time': row['time'],
+            'title': row['title'],
+            'attachment': row['attachment__key'],
+            'clipboard': row['clipboard'],
+        }
+
+
+def export_trees(trees, bundle_files):
+    rows = trees.order_by('pk').values(
+        'pk', 'title', 'description', 'intro_video_url', 'goal_skill__key', 'is_free',
+        'preview_type', 'preview_config', 'graph_errors', 'resources_zip',
+    )
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        name = row['resources_zip']
+        yield {
+            'ref': row['pk'],
+            'title': row['title'],
+            'description': row['description'],
+            'intro_video_url': row['intro_video_url'],
+            'goal_skill': row['goal_skill__key'],
+            'is_free': row['is_free'],
+            'preview_type': row['preview_type'],
+            'preview_config': row['preview_config'],
+            'graph_errors': row['graph_errors'],
+            'resources_zip': bundled_path('tree_resources', row['pk'], name) if bundle_files and name else None,
+        }
+
+
+def export_nodes(trees):
+    rows = (
+        Node.objects.filter(tree__in=trees)
+        .order_by('tree_id', 'id')
+        .values_list('id', 'tree_id', 'skill__key', 'position', 'depth')
+    )
+    for pk, tree_id, skill_key, position, depth in rows.iterator(chunk_size=BATCH_SIZE):
+        yield {'ref': pk, 'tree': tree_id, 'skill': skill_key, 'position': position, 'depth': depth}
+
+
+def export_edges(trees):
+    rows = (
+        Edge.objects.filter(from_node__tree__in=trees, to_node__tree__in=trees)
+        .order_by('id')
+        .values_list('from_node_id', 'to_node_id', 'optional', 'priority')
+    )
+    for from_ref, to_ref, optional, priority in rows.iterator(chunk_size=BATCH_SIZE):
+        yield {'from': from_ref, 'to': to_ref, 'optional': optional, 'priority': priority}
+
+
+# Import
+
+@transaction.atomic
+def import_package(path, creator=None, batch_size=BATCH_SIZE):
+    """
+    Import a package. Skills whose `creator` username does not exist are
+    credited to `creator`. Returns a summary dict of the rows created and
+    updated.
+    """
+    reader = PackageReader(path)
+    try:
+        importer = PackageImporter(reader, creator, batch_size)
+        importer.run()
+    finally:
+        reader.close()
+    return importer.summary
+
+
+class PackageImporter:
+
+    def __init__(self, reader, creator, batch_size):
+        self.reader = reader
+        self.creator = creator
+        self.batch_size = batch_size
+        self.file_ids = {}
+        self.skill_ids = {}
+        self.tree_ids = {}
+        self.node_ids = {}
+        self.usernames = {}
+        # Existing skills whose content changed, and skills and files whose pauses
+        # changed, for the version bumps
+        self.changed_skills = set()
+        self.changed_pauses = set()
+        self.changed_files = set()
+        self.summary = {
+            'files_created': 0, 'files_updated': 0, 'skills_created': 0, 'skills_updated': 0,
+            'pauses_written': 0, 'pauses_deleted': 0, 'trees': [], 'nodes': 0, 'edges': 0,
+        }
+
+    def run(self):
+        for batch in batches(self.reader.rows('files.jsonl'), self.batch_size):
+            self.import_files(batch)
+        for batch in batches(self.reader.rows('skills.jsonl'), self.batch_size):
+            self.import_skills(batch)
+        self.import_pauses()
+        for batch in batches(self.reader.rows('trees.jsonl'), self.batch_size):
+            self.import_trees(batch)
+        for batch in batches(self.reader.rows('nodes.jsonl'), self.batch_size):
+            self.import_nodes(batch)
+        for batch in batches(self.reader.rows('edges.jsonl'), self.batch_size):
+            self.import_edges(batch)
+
+        # The package's positions make this a check that writes nothing when they are current
+        for tree_id in self.summary['trees']:
+            rebuild_learning_order(tree_id)
+        for chunk in batches(sorted(self.changed_files), self.batch_size):
+            self.changed_pauses.update(Pause.objects.filter(attachment_id__in=chunk).values_list('skill_id', flat=True))
+        for chunk in batches(sorted(self.changed_pauses), self.batch_size):
+            bump_pause_versions(chunk)
+        for chunk in batches(sorted(self.changed_skills), self.batch_size):
+            bump_tree_versions(
+                Node.objects.filter(skill_id__in=chunk).exclude(tree_id__in=self.summary['trees'])
+                .values_list('tree_id', flat=True).distinct()
+            )
+
+    def import_files(self, rows):
+        field = File._meta.get_field('file')
+        existing = {
+            row['key']: row for row in
+            File.objects.filter(key__in=[r['key'] for r in rows]).values('pk', 'key', 'file', *FILE_FIELDS)
+        }
+        new, changed = [], []
+        for row in rows:
+            current = existing.get(row['key'])
+            obj = File(
+                key=row['key'],
+                title=row['title'],
+                description=row.get('description', ''),
+                category=row.get('category') or File._meta.get_field('category').default,
+            )
+            name = current['file'] if current else ''
+            if row.get('path') and not (name and field.storage.exists(name)):
+                with self.reader.open(row['path']) as source:
+                    name = field.storage.save(field.generate_filename(None, os.path.basename(row['path'])), source)
+            obj.file = name
+            if current is None:
+                new.append(obj)
+            elif name != current['file'] or any(getattr(obj, f) != current[f] for f in FILE_FIELDS):
+                obj.pk = current['pk']
+                changed.append(obj)
+            else:
+                self.file_ids[row['key']] = current['pk']
+        File.objects.bulk_create(new)
+        File.objects.bulk_update(changed, ['file', *FILE_FIELDS])
+        self.file_ids.update((obj.key, obj.pk) for obj in new + changed)
+        self.changed_files.update(obj.pk for obj in changed)
+        self.summary['files_created'] += len(new)
+        self.summary['files_updated'] += len(changed)
+
+    def import_skills(self, rows):
+        existing = {
+            row['key']: row for row in
+            Skill.objects.filter(key__in=[r['key'] for r in rows]).values('pk', 'key', *SKILL_FIELDS)
+        }
+        through = Skill.resources.through
+        current_resources = {}
+        for skill_id, file_id in through.objects.filter(
+            skill_id__in=[row['pk'] for row in existing.values()]
+        ).values_list('skill_id', 'file_id'):
+            current_resources.setdefault(skill_id, set()).add(file_id)
+        self.resolve(File, self.file_ids, [key for row in rows for key in row.get('resources', [])])
+
+        new, changed, resources = [], [], []
+        for row in rows:
+            current = existing.get(row['key'])
+            obj = Skill(
+                key=row['key'],
+                title=row['title'],
+                video_url=row['video_url'],
+                text=row.get('text', ''),
+                duration=row.get('duration', 0),
+                creator_id=self.creator_id(row.get('creator')),
+            )
+            files = {self.file_ids[key] for key in row.get('resources', [])}
+            if current is None:
+                new.append(obj)
+                resources.append((obj, files))
+                continue
+            obj.pk = current['pk']
+            self.skill_ids[obj.key] = obj.pk
+            content_changed = any(getattr(obj, f) != current[f] for f in SKILL_FIELDS)
+            resources_changed = files != current_resources.get(obj.pk, set())
+            if content_changed:
+                changed.append(obj)
+            if resources_changed:
+                resources.append((obj, files))
+            if content_changed or resources_changed:
+                self.changed_skills.add(obj.pk)
+
+        replaced = [obj.pk for obj, _ in resources if obj.pk is not None]
+        Skill.objects.bulk_create(new)
+        # auto_now only applies on save(), so bulk_update has to set it
+        for obj in changed:
+            obj.updated_at = Skill._meta.get_field('updated_at').pre_save(obj, add=False)
+        Skill.objects.bulk_update(changed, [*SKILL_FIELDS, 'updated_at'])
+        self.skill_ids.update((obj.key, obj.pk) for obj in new)
+        through.objects.filter(skill_id__in=replaced).delete()
+        through.objects.bulk_create([
+            through(skill_id=obj.pk, file_id=file_id) for obj, files in resources for file_id in files
+        ])
+        self.summary['skills_created'] += len(new)
+        self.summary['skills_updated'] += len(changed)
+
+    def import_pauses(self):
+        """Upsert pauses on (skill, time), then delete the ones of imported skills the package lacks."""
+        seen = set()
+        for rows in batches(self.reader.rows('pauses.jsonl'), self.batch_size):
+            self.resolve(Skill, self.skill_ids, [row['skill'] for row in rows])
+            self.resolve(File, self.file_ids, [row['attachment'] for row in rows if row.get('attachment')])
+            pauses = [
+                Pause(
+                    skill_id=self.skill_ids[row['skill']],
+                    time=row['time'],
+                    title=row['title'],
+                    attachment_id=self.file_ids[row['attachment']] if row.get('attachment') else None,
+                    clipboard=row.get('clipboard', ''),
+                )
+                for row in rows
+            ]
+            current_pauses = Pause.objects.filter(skill_id__in={p.skill_id for p in pauses})
+            existing = {
+                (row['skill_id'], row['time']): row
+                for row in current_pauses.values('skill_id', 'time', *PAUSE_FIELDS)
+            }
+            writes = []
+            for pause in pauses:
+                seen.add((pause.skill_id, pause.time))
+                current = existing.get((pause.skill_id, pause.time))
+                if current is None or any(getattr(pause, f) != current[f] for f in PAUSE_FIELDS):
+                    writes.append(pause)
+            Pause.objects.bulk_create(
+                writes, update_conflicts=True, unique_fields=['skill', 'time'], update_fields=PAUSE_FIELDS,
+            )
+            self.changed_pauses.update(p.skill_id for p in writes)
+            self.summary['pauses_written'] += len(writes)
+
+        for chunk in batches(self.skill_ids.values(), self.batch_size):
+            stale = [
+                (pk, skill_id) for pk, skill_id, time in
+                Pause.objects.filter(skill_id__in=chunk).values_list('pk', 'skill_id', 'time')
+                if (skill_id, time) not in seen
+            ]
+            Pause.objects.filter(pk__in=[pk for pk, _ in stale]).delete()
+            self.changed_pauses.update(skill_id for _, skill_id in stale)
+            self.summary['pauses_deleted'] += len(stale)
+
+    def import_trees(self, rows):
+        field = Tree._meta.get_field('resources_zip')
+        self.resolve(Skill, self.skill_ids, [row['goal_skill'] for row in rows])
+        trees = []
+        for row in rows:
+            name = ''
+            if row.get('resources_zip'):
+                filename = field.generate_filename(None, os.path.basename(row['resources_zip']))
+                with self.reader.open(row['resources_zip']) as source:
+                    name = field.storage.save(filename, source)
+            trees.append(Tree(
+                title=row['title'],
+                description=row.get('description', ''),
+                intro_video_url=row.get('intro_video_url', ''),
+                goal_skill_id=self.skill_ids[row['goal_skill']],
+                resources_zip=name,
+                is_free=row.get('is_free', False),
+                preview_type=row.get('preview_type') or Tree._meta.get_field('preview_type').default,
+                preview_config=row.get('preview_config') or {},
+                graph_errors=row.get('graph_errors') or [],
+            ))
+        Tree.objects.bulk_create(trees)
+        for row, tree in zip(rows, trees):
+            self.tree_ids[row['ref']] = tree.pk
+            self.summary['trees'].append(tree.pk)
+
+    def import_nodes(self, rows):
+        self.resolve(Skill, self.skill_ids, [row['skill'] for row in rows])
+        nodes = []
+        for row in rows:
+            if row['tree'] not in self.tree_ids:
+                raise PackageError(f'Node {row["ref"]} belongs to unknown tree {row["tree"]}')
+            nodes.append(Node(
+                tree_id=self.tree_ids[row['tree']],
+                skill_id=self.skill_ids[row['skill']],
+                position=row.get('position'),
+                depth=row.get('depth'),
+            ))
+        Node.objects.bulk_create(nodes)
+        for row, node in zip(rows, nodes):
+            self.node_ids[row['ref']] = node.pk
+        self.summary['nodes'] += len(nodes)
+
+    def import_edges(self, rows):
+        edges = []
+        for row in rows:
+            if row['from'] not in self.node_ids or row['to'] not in self.node_ids:
+                raise PackageError(f'Edge {row["from"]} -> {row["to"]} refers to an unknown node')
+            edges.append(Edge(
+                from_node_id=self.node_ids[row['from']],
+                to_node_id=self.node_ids[row['to']],
+                optional=row.get('optional', False),
+                priority=row.get('priority', 0),
+            ))
+        Edge.objects.bulk_create(edges)
+        self.summary['edges'] += len(edges)
+
+    def resolve(self, model, ids, keys):
+        """Add the ids of keys this package did not define, which must already exist."""
+        missing = {key for key in keys if key not in ids}
+        if not missing:
+            return
+        ids.update(model.objects.filter(key__in=missing).values_list('key', 'pk'))
+        unknown = missing - ids.keys()
+        if unknown:
+            raise PackageError(f'Unknown {model._meta.verbose_name} keys: {", ".join(sorted(unknown)[:10])}')
+
+    def creator_id(self, username):
+        if username not in self.usernames:
+            user_id = None
+            if username:
+                user_id = get_user_model().objects.filter(username=username).values_list('pk', flat=True).first()
+            if user_id is None:
+                if self.creator is None:
+                    raise PackageError(f'Creator {username!r} does not exist and no default creator was given')
+                user_id = self.creator.pk
+            self.usernames[username] = user_id
+        return self.usernames[username]
+
+
+# Cloning
+
+@transaction.atomic
+def clone_tree(tree, title=None, batch_size=BATCH_SIZE):
+    """
+    Copy a tree with its nodes and edges in a few bulk queries and return the
+    copy. Skills are shared; the learning order and layout are copied as they are.
+    """
+    clone = Tree.objects.get(pk=tree.pk)
+    clone.pk = None
+    clone._state.adding = True
+    clone.title = title or f'{tree.title} (copy)'
+    clone.version = 1
+    clone.save()
+
+    node_ids = {}
+    rows = Node.objects.filter(tree_id=tree.pk).order_by('id').values_list('id', 'skill_id', 'position', 'depth')
+    for batch in batches(rows.iterator(chunk_size=batch_size), batch_size):
+        nodes = Node.objects.bulk_create([
+            Node(tree_id=clone.pk, skill_id=skill_id, position=position, depth=depth)
+            for _, skill_id, position, depth in batch
+        ])
+        node_ids.update((row[0], node.pk) for row, node in zip(batch, nodes))
+
+    rows = (
+        Edge.objects.filter(from_node__tree_id=tree.pk, to_node__tree_id=tree.pk)
+        .order_by('id')
+        .values_list('from_node_id', 'to_node_id', 'optional', 'priority')
+    )
+    for batch in batches(rows.iterator(chunk_size=batch_size), batch_size):
+        Edge.objects.bulk_create([
+            Edge(from_node_id=node_ids[a], to_node_id=node_ids[b], optional=optional, priority=priority)
+            for a, b, optional, priority in batch
+        ])
+    if clone.layout.get('nodes'):
+        clone.layout = {
+            **clone.layout,
+            'nodes': {str(node_ids[int(pk)]): xy for pk, xy in clone.layout['nodes'].items() if int(pk) in node_ids},
+        }
+        Tree.objects.filter(pk=clone.pk).update(layout=clone.layout)
+    return clone
@@ -0,0 +1,98 @@
+"""
+Per-skill pause manifests.
+
+The player fetches a skill's pauses from `skill_pauses` when it opens the
+video, instead of every tree payload carrying the pauses of all its skills.
+A manifest is built with one query (attachments joined in) and kept in a
+bounded, process-local LRU keyed by `Skill.pauses_version`, which the signal
+handlers in `skills.signals` bump whenever a pause or an attached file
+changes; like tree artifacts, every worker notices stale entries on its next
+lookup.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+
+from .metrics import cache_requests
+from .models import Pause, Skill
+
+
+def serialize_pause(pause):
+    """Player data for one pause (its attachment must be loaded)."""
+    data = {
+        'time': pause.time,
+        'title': pause.title,
+    }
+    if pause.clipboard:
+        data['clipboard'] = pause.clipboard
+    elif pause.attachment:
+        data['attachment_url'] = pause.attachment.file.url
+        data['attachment_title'] = pause.attachment.title
+    # else: just a continue button
+    return data
+
+
+def build_manifest(skill_id, version):
+    """Serialized manifest of one skill's pauses."""
+    pauses = Pause.objects.filter(skill_id=skill_id).select_related('attachment').order_by('time')
+    return json.dumps({
+        'skill_id': skill_id,
+        'version': version,
+        'pauses': [serialize_pause(pause) for pause in pauses],
+    }, separators=(',', ':'))
+
+
+class ManifestCache:
+    """Thread-safe LRU of serialized manifests, one entry per skill."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, skill_id, version):
+        with self._lock:
+            entry = self._entries.get(skill_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(skill_id)
+                cache_requests.inc(cache='pause_manifest', result='hit')
+                return entry[1]
+        cache_requests.inc(cache='pause_manifest', result='miss')
+        manifest = build_manifest(skill_id, version)
+        with self._lock:
+            self._entries[skill_id] = (version, manifest)
+            self._entries.move_to_end(skill_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return manifest
+
+    def invalidate(self, skill_ids):
+        with self._lock:
+            for skill_id in skill_ids:
+                self._entries.pop(skill_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+manifest_cache = ManifestCache(settings.PAUSE_MANIFEST_CACHE_SIZE)
+
+
+def bump_pause_versions(skill_ids):
+    """Advance the pauses version of the given skills and drop their local manifests."""
+    skill_ids = {sid for sid in skill_ids if sid is not None}
+    if not skill_ids:
+        return
+    Skill.objects.filter(pk__in=skill_ids).update(pauses_version=F('pauses_version') + 1)
+    manifest_cache.invalidate(skill_ids)
+
+
+def manifest_etag(skill_id, version):
+    return f'"pauses-{skill_id}-v{version}"'
@@ -0,0 +1,186 @@
+"""
+Opt-in cProfile of single requests, stored as RequestProfile rows.
+
+A request is profiled when a staff user sends the `X-Profile: 1` header or
+the `?profile=1` query parameter, or when it is picked by random sampling at
+PROFILE_SAMPLE_RATE. The profile is stored with a summary of the top
+functions; the response carries its id in `X-Profile-Id`. The admin downloads
+single or merged profiles as .prof files (pstats, snakeviz) and shows the hot
+functions across the selected requests; `profile_report` does the same from
+the command line. Only PROFILE_KEEP profiles are kept.
+
+cProfile sees one thread. Under ASGI an async view is profiled on the event
+loop thread: the parts it runs through sync_to_async are missing, and other
+requests the loop serves meanwhile are mixed in, so profile those views under
+WSGI for a clean picture. Only one request per worker is profiled at a time;
+concurrent triggers are skipped.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from skilltrees.timing import untimed, view_label
+
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+SUMMARY_LINES = 40
+
+# cProfile cannot run two profilers in one process reliably
+_profiling = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """Profile staff-triggered and sampled requests (REQUEST_PROFILING=False disables)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger = self.requested(request)
+        if trigger and not request.user.is_staff:
+            trigger = None
+        trigger = trigger or self.sampled()
+        if trigger is None or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler, started = self.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            _profiling.release()
+        return self.finish(request, response, trigger, profiler, started)
+
+    async def __acall__(self, request):
+        trigger = self.requested(request)
+        if trigger and not (await request.auser()).is_staff:
+            trigger = None
+        trigger = trigger or self.sampled()
+        if trigger is None or not _profiling.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profiler, started = self.start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            _profiling.release()
+        return await sync_to_async(self.finish)(request, response, trigger, profiler, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profiled_view = view_func
+
+    def requested(self, request):
+        """The trigger a client asked for; only staff requests are honoured."""
+        if request.META.get(PROFILE_HEADER) == '1':
+            return RequestProfile.Trigger.HEADER
+        if request.GET.get(PROFILE_PARAM) == '1':
+            return RequestProfile.Trigger.PARAM
+        return None
+
+    def sampled(self):
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return RequestProfile.Trigger.SAMPLE
+        return None
+
+    def start(self):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        return profiler, started
+
+    def finish(self, request, response, trigger, profiler, started):
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            profile = save_profile(request, response, trigger, profiler, duration_ms)
+        except Exception:
+            logger.exception('Could not store the profile of %s %s', request.method, request.path)
+        else:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+
+def save_profile(request, response, trigger, profiler, duration_ms):
+    profiler.create_stats()
+    timings = getattr(request, 'timings', None)
+    # Storing the profile is not part of the request's query count
+    with untimed():
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.path[:500],
+            view=view_label(getattr(request, 'profiled_view', None)) or '',
+            status=response.status_code,
+            user=request.user if request.user.is_authenticated else None,
+            trigger=trigger,
+            duration_ms=duration_ms,
+            queries=timings.queries if timings else None,
+            stats=marshal.dumps(profiler.stats),
+            summary=report(pstats.Stats(profiler), limit=SUMMARY_LINES),
+        )
+        prune_profiles(settings.PROFILE_KEEP)
+    return profile
+
+
+def prune_profiles(keep):
+    cutoff = RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[keep:keep + 1]
+    if cutoff:
+        RequestProfile.objects.filter(pk__lte=cutoff[0]).delete()
+
+
+class _StoredStats:
+    """What pstats.Stats needs to load marshalled stats from memory."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+def load_stats(blobs):
+    """pstats.Stats merged from RequestProfile.stats values, or None if there are none."""
+    merged = None
+    for data in blobs:
+        stats = pstats.Stats(_StoredStats(bytes(data)))
+        if merged is None:
+            merged = stats
+        else:
+            merged.add(stats)
+    return merged
+
+
+def dump_stats(stats):
+    """Marshalled stats, the format of a .prof file."""
+    return marshal.dumps(stats.stats)
+
+
+def report(stats, sort='cumulative', limit=SUMMARY_LINES):
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
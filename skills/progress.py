@@ -0,0 +1,334 @@
+"""
+Per-(user, tree) progress rows.
+
+`TreeProgress` keeps a completed-node count, the next node and a resume cursor
+for every tree a user has worked in, so resume and completion percentage are
+single-row reads. Toggling a skill touches only the rows of trees that contain
+it; the status engine re-derives their count and next node for those trees
+alone.
+
+Learner writes go through `apply_progress_ops`, which takes explicit
+set-state operations (not toggles) and applies a whole batch in one
+transaction with bulk M2M inserts and deletes and a single UPDATE of the
+user's bitmap columns and last node, or as progress events when the event
+log is on (see skills.events). Progress an anonymous visitor
+kept in localStorage is ingested in one request by `merge_local_progress`.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from users.bitmaps import SkillBitmap
+from users.skillsets import BITMAP_FIELDS
+
+from .artifacts import get_tree_artifacts
+from .events import append_progress_events, resume_node_id
+from .models import Node, ProgressEvent, Tree, TreeProgress
+from .status import compute_status
+
+
+def _apply_status(row, artifact, status):
+    row.completed_nodes = status.completed_count
+    row.total_nodes = len(artifact.sequence)
+    row.next_node_id = status.next_node_id
+    row.tree_version = artifact.version
+
+
+# Callers let errors propagate, so a failure rolls back their whole transaction anyway
+@transaction.atomic(savepoint=False)
+def record_skill_change(user, added=(), removed=(), cursors=None):
+    """
+    Update the progress rows affected by completing (`added`) or un-completing
+    (`removed`) skills. `cursors` moves resume cursors ({tree_id: node_id or
+    None}). Call after the M2M change so the skill sets are current.
+    """
+    added, removed = set(added), set(removed)
+    changed = added | removed
+    if not changed and not cursors:
+        return {}
+
+    cursors = cursors or {}
+    affected = Q(nodes__skill_id__in=changed) | Q(pk__in=cursors)
+    trees = Tree.objects.filter(affected).distinct().only('id', 'version')
+    artifacts = get_tree_artifacts(trees)
+    rows = {
+        row.tree_id: row
+        for row in TreeProgress.objects.select_for_update().filter(user=user, tree_id__in=artifacts)
+    }
+    completed_skill_ids = user.completed_skill_set()
+    ignored_skill_ids = user.ignored_skill_set()
+
+    to_create, to_update = [], []
+    for tree_id, artifact in artifacts.items():
+        row = rows.get(tree_id)
+        if row is None:
+            row = TreeProgress(user=user, tree_id=tree_id)
+            to_create.append(row)
+        else:
+            to_update.append(row)
+
+        if tree_id in cursors:
+            row.last_node_id = cursors[tree_id]
+        # The next node needs the status engine anyway, and its count is exact
+        _apply_status(row, artifact, compute_status(artifact, completed_skill_ids, ignored_skill_ids, row.last_node_id))
+
+    fields = ['completed_nodes', 'total_nodes', 'next_node', 'last_node', 'tree_version']
+    # A concurrent first toggle may have created the row meanwhile; last writer wins
+    TreeProgress.objects.bulk_create(
+        to_create, update_conflicts=True, unique_fields=['user', 'tree'], update_fields=fields,
+    )
+    TreeProgress.objects.bulk_update(to_update, fields)
+    return {row.tree_id: row for row in to_create + to_update}
+
+
+# Largest batch accepted by apply_progress_ops
+MAX_BATCH_OPS = 500
+
+
+class InvalidOperation(ValueError):
+    """A progress operation is malformed."""
+
+
+def _is_int(value):
+    # JSON true and false arrive as bools, which are ints to isinstance
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_progress_ops(payload):
+    """
+    Validate a batch payload: {"ops": [{"node": id, "done": bool, "ignored": bool, "seq": int}]}.
+    `done` and `ignored` are optional; `seq` orders the operations of this
+    batch (later wins). It is not compared across batches, which are applied
+    in arrival order, so a client keeps one batch in flight at a time.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('ops'), list):
+        raise InvalidOperation('Expected {"ops": [...]}')
+    ops = payload['ops']
+    if len(ops) > MAX_BATCH_OPS:
+        raise InvalidOperation(f'At most {MAX_BATCH_OPS} operations per batch')
+
+    parsed = []
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict) or not _is_int(op.get('node')):
+            raise InvalidOperation(f'Operation {index}: "node" must be an integer')
+        done, ignored = op.get('done'), op.get('ignored')
+        if done is None and ignored is None:
+            raise InvalidOperation(f'Operation {index}: set "done" and/or "ignored"')
+        if any(v is not None and not isinstance(v, bool) for v in (done, ignored)):
+            raise InvalidOperation(f'Operation {index}: "done" and "ignored" must be booleans')
+        if done and ignored:
+            raise InvalidOperation(f'Operation {index}: a skill cannot be both done and ignored')
+        seq = op.get('seq', index)
+        if not _is_int(seq):
+            raise InvalidOperation(f'Operation {index}: "seq" must be an integer')
+        parsed.append({'node': op['node'], 'done': done, 'ignored': ignored, 'seq': seq})
+    parsed.sort(key=lambda op: op['seq'])
+    return parsed
+
+
+@transaction.atomic
+def apply_progress_ops(user, ops):
+    """
+    Apply explicit set-state operations (see parse_progress_ops) in one
+    transaction with bulk M2M writes. Marking a skill done clears its ignored
+    flag and vice versa. Returns {"seq", "states", "unknown"}.
+    """
+    node_ids = {op['node'] for op in ops}
+    nodes = {node.id: node for node in Node.objects.filter(pk__in=node_ids).only('id', 'skill_id', 'tree_id')}
+
+    completed, ignored = _current_skill_sets(user)
+    was_completed, was_ignored = set(completed), set(ignored)
+
+    last_node = resume_node_id(user)
+    cursor_node = None
+    events = []
+    for op in ops:
+        node = nodes.get(op['node'])
+        if node is None:
+            continue
+        skill_id = node.skill_id
+        before = _skill_state(skill_id, completed, ignored)
+        if op['done'] is not None:
+            if op['done']:
+                completed.add(skill_id)
+                ignored.discard(skill_id)
+                last_node = node.id
+            else:
+                completed.discard(skill_id)
+                last_node = None
+            cursor_node = node
+        if op['ignored'] is not None:
+            if op['ignored']:
+                ignored.add(skill_id)
+                completed.discard(skill_id)
+            else:
+                ignored.discard(skill_id)
+        after = _skill_state(skill_id, completed, ignored)
+        if after != before or op['done'] is not None:
+            # Only `done` operations move the resume cursor
+            events.append(ProgressEvent(
+                user_id=user.pk, skill_id=skill_id, kind=after,
+                node_id=node.id if op['done'] is not None else None,
+            ))
+
+    if settings.PROGRESS_EVENT_LOG:
+        append_progress_events(user, events)
+    else:
+        _write_skill_sets(user, completed, ignored, was_completed, was_ignored, last_node)
+        # The cursor follows last_node, even onto a skill that was already done
+        record_skill_change(
+            user, added=completed - was_completed, removed=was_completed - completed,
+            cursors={cursor_node.tree_id: last_node} if cursor_node is not None else None,
+        )
+
+    states = [
+        {
+            'node_id': node.id,
+            'skill_id': node.skill_id,
+            'done': node.skill_id in completed,
+            'ignored': node.skill_id in ignored,
+        }
+        for node in nodes.values()
+    ]
+    return {
+        'seq': max((op['seq'] for op in ops), default=None),
+        'states': states,
+        'unknown': sorted(node_ids - set(nodes)),
+    }
+
+
+def _skill_state(skill_id, completed, ignored):
+    if skill_id in completed:
+        return ProgressEvent.Kind.COMPLETED
+    if skill_id in ignored:
+        return ProgressEvent.Kind.IGNORED
+    return ProgressEvent.Kind.RESET
+
+
+def _current_skill_sets(user):
+    """
+    The user's completed and ignored skill ids, as sets to edit. Without the
+    event log the user's row is locked and its columns reloaded first, once
+    per batch, so concurrent batches of one user apply one after the other.
+    """
+    if not settings.PROGRESS_EVENT_LOG:
+        row = (
+            get_user_model().objects.select_for_update().filter(pk=user.pk)
+            .values(*BITMAP_FIELDS.values(), 'last_node_id').get()
+        )
+        for name, value in row.items():
+            setattr(user, name, value)
+    return set(user.completed_skill_set()), set(user.ignored_skill_set())
+
+
+def _write_skill_sets(user, completed, ignored, was_completed, was_ignored, last_node_id):
+    """
+    Bulk-insert/delete the M2M rows that changed, then write both bitmap
+    columns and `last_node` in one UPDATE. The M2M bulk writes send no
+    m2m_changed, so users.signals does not update the bitmaps a second time.
+    """
+    User = get_user_model()
+    changed = last_node_id != user.last_node_id
+    relations = (('completed_skills', completed, was_completed), ('ignored_skills', ignored, was_ignored))
+    for relation, now, was in relations:
+        through = getattr(User, relation).through
+        add, remove = now - was, was - now
+        if add:
+            through.objects.bulk_create(
+                [through(user_id=user.pk, skill_id=skill_id) for skill_id in add],
+                ignore_conflicts=True,
+            )
+        if remove:
+            through.objects.filter(user_id=user.pk, skill_id__in=remove).delete()
+        changed = changed or add or remove
+    if not changed:
+        return
+    fields = {
+        BITMAP_FIELDS['completed_skills']: SkillBitmap.from_ids(completed).to_bytes(),
+        BITMAP_FIELDS['ignored_skills']: SkillBitmap.from_ids(ignored).to_bytes(),
+        'last_node_id': last_node_id,
+    }
+    User.objects.filter(pk=user.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(user, name, value)
+
+
+# Largest number of skill ids accepted by merge_local_progress
+MAX_MERGE_SKILLS = 5000
+
+
+def parse_local_progress(payload):
+    """
+    Validate a localStorage merge payload:
+    {"trees": {"<tree_id>": {"completed": [skill_id, ...], "ignored": [skill_id, ...]}}}.
+    Returns {tree_id: (completed, ignored)} with sets of skill ids.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('trees'), dict):
+        raise InvalidOperation('Expected {"trees": {...}}')
+
+    parsed = {}
+    total = 0
+    for key, blob in payload['trees'].items():
+        try:
+            tree_id = int(key)
+        except ValueError:
+            raise InvalidOperation(f'Tree {key!r}: id must be an integer')
+        if not isinstance(blob, dict):
+            raise InvalidOperation(f'Tree {tree_id}: expected {{"completed": [...], "ignored": [...]}}')
+        sets = []
+        for name in ('completed', 'ignored'):
+            skill_ids = blob.get(name, [])
+            if not isinstance(skill_ids, list) or not all(_is_int(s) for s in skill_ids):
+                raise InvalidOperation(f'Tree {tree_id}: "{name}" must be a list of skill ids')
+            sets.append(set(skill_ids))
+        total += len(sets[0]) + len(sets[1])
+        parsed[tree_id] = tuple(sets)
+    if total > MAX_MERGE_SKILLS:
+        raise InvalidOperation(f'At most {MAX_MERGE_SKILLS} skill ids per merge')
+    return parsed
+
+
+@transaction.atomic
+def merge_local_progress(user, local):
+    """
+    Merge anonymous progress (see parse_local_progress) into the user's
+    account. Only ids of skills taught in the named tree are accepted. The
+    server wins on conflict: skills the account already marks done or ignored
+    keep their state, everything else takes the local state. Nothing is
+    removed. Returns {"completed", "ignored", "unknown_trees"}.
+    """
+    trees = Tree.objects.filter(pk__in=local).only('id', 'version')
+    artifacts = get_tree_artifacts(trees)
+
+    completed, ignored = _current_skill_sets(user)
+    add_completed, add_ignored = set(), set()
+    for tree_id, artifact in artifacts.items():
+        local_completed, local_ignored = local[tree_id]
+        local_completed = local_completed & artifact.skill_ids
+        # Local toggles keep the two exclusive; done wins over a stale ignore
+        local_ignored = (local_ignored & artifact.skill_ids) - local_completed
+        add_completed |= local_completed
+        add_ignored |= local_ignored
+    add_ignored -= add_completed
+    known = completed | ignored
+    add_completed -= known
+    add_ignored -= known
+
+    if settings.PROGRESS_EVENT_LOG:
+        kinds = ((add_completed, ProgressEvent.Kind.COMPLETED), (add_ignored, ProgressEvent.Kind.IGNORED))
+        append_progress_events(user, [
+            ProgressEvent(user_id=user.pk, skill_id=skill_id, kind=kind)
+            for skill_ids, kind in kinds
+            for skill_id in skill_ids
+        ])
+    else:
+        _write_skill_sets(
+            user, completed | add_completed, ignored | add_ignored, completed, ignored, user.last_node_id,
+        )
+        record_skill_change(user, added=add_completed)
+    return {
+        'completed': sorted(add_completed),
+        'ignored': sorted(add_ignored),
+        'unknown_trees': sorted(set(local) - set(artifacts)),
+    }
@@ -0,0 +1,96 @@
+"""Keep `Tree.version`, `Skill.pauses_version`, their caches and the learning order in step with content edits."""
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .artifacts import bump_tree_versions
+from .models import Edge, File, Node, Pause, Skill, Tree
+from .ordering import mark_order_stale
+from .pauses import bump_pause_versions
+
+
+_state = threading.local()
+
+
+@contextmanager
+def bulk_deletion():
+    """
+    Skip the per-row work that saving or deleting a Node, Edge or Skill
+    triggers (version bumps, rebuilds, users' skill set resyncs), for bulk
+    deletions that do it once themselves.
+    """
+    _state.bulk_deletion = True
+    try:
+        yield
+    finally:
+        _state.bulk_deletion = False
+
+
+def in_bulk_deletion():
+    return getattr(_state, 'bulk_deletion', False)
+
+
+def trees_using_skill(skill_id):
+    return set(Node.objects.filter(skill_id=skill_id).values_list('tree_id', flat=True))
+
+
+@receiver(pre_save, sender=Tree)
+def keep_tree_version(sender, instance, raw, **kwargs):
+    # A full save of a stale instance must not roll the version back
+    if raw or instance.pk is None:
+        return
+    current = Tree.objects.filter(pk=instance.pk).values_list('version', flat=True).first()
+    if current is not None:
+        instance.version = current
+
+
+@receiver(post_save, sender=Tree)
+def tree_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_tree_versions([instance.pk])
+
+
+@receiver(post_save, sender=Node)
+@receiver(post_delete, sender=Node)
+def node_changed(sender, instance, **kwargs):
+    if in_bulk_deletion():
+        return
+    bump_tree_versions([instance.tree_id])
+    mark_order_stale([instance.tree_id])
+
+
+@receiver(post_save, sender=Edge)
+@receiver(post_delete, sender=Edge)
+def edge_changed(sender, instance, **kwargs):
+    if in_bulk_deletion():
+        return
+    tree_ids = Node.objects.filter(
+        pk__in=[instance.from_node_id, instance.to_node_id],
+    ).values_list('tree_id', flat=True)
+    tree_ids = set(tree_ids)
+    bump_tree_versions(tree_ids)
+    mark_order_stale(tree_ids)
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def skill_changed(sender, instance, **kwargs):
+    if in_bulk_deletion():
+        return
+    bump_tree_versions(trees_using_skill(instance.pk))
+
+
+@receiver(post_save, sender=Pause)
+@receiver(post_delete, sender=Pause)
+def pause_changed(sender, instance, **kwargs):
+    # Pauses are not part of the tree artifacts, only of the skill's manifest
+    bump_pause_versions([instance.skill_id])
+
+
+@receiver(post_save, sender=File)
+@receiver(pre_delete, sender=File)
+def file_changed(sender, instance, **kwargs):
+    # Before the delete, while the pauses still point at the file
+    bump_pause_versions(Pause.objects.filter(attachment=instance).values_list('skill_id', flat=True))
@@ -0,0 +1,111 @@
+"""
+Progress status engine.
+
+Derives every node's learner state (done / ignored / next / skipped) for a
+compiled tree artifact in a single linear pass over its learning sequence.
+Views, JSON endpoints and dashboards all share this so they agree on what
+"next" and "skipped" mean.
+"""
+
+# State bits of a node in the packed `tree_progress` flags (decoded in tree_detail.html)
+DONE = 1
+IGNORED = 2
+NEXT = 4
+SKIPPED = 8
+HEX_DIGITS = '0123456789abcdef'
+
+
+class TreeStatus:
+    """Per-user state of one compiled tree."""
+
+    def __init__(self, artifact, done_skill_ids, ignored_skill_ids, position,
+                 next_node_id, skipped_node_ids, completed_count):
+        self.artifact = artifact
+        # Skill ids of this tree that the user completed / ignored
+        self.done_skill_ids = done_skill_ids
+        self.ignored_skill_ids = ignored_skill_ids
+        # Index into artifact.sequence the user has reached, -1 if none
+        self.position = position
+        self.next_node_id = next_node_id
+        # Node ids passed over before `position`, in sequence order
+        self.skipped_node_ids = skipped_node_ids
+        self._skipped = frozenset(skipped_node_ids)
+        # Sequence nodes whose skill is done
+        self.completed_count = completed_count
+
+    @property
+    def total(self):
+        return len(self.artifact.sequence)
+
+    @property
+    def percent(self):
+        return round(100 * self.completed_count / self.total) if self.total else 0
+
+    def node_flags(self, node_id):
+        skill_id = self.artifact.node_skill[node_id]
+        return {
+            'done': skill_id in self.done_skill_ids,
+            'ignored': skill_id in self.ignored_skill_ids,
+            'next': node_id == self.next_node_id,
+            'skipped': node_id in self._skipped,
+        }
+
+    def packed_flags(self):
+        """Every node's state bits as one hex digit, in `artifact.node_ids` order."""
+        digits = []
+        for node_id in self.artifact.node_ids:
+            skill_id = self.artifact.node_skill[node_id]
+            bits = 0
+            if skill_id in self.done_skill_ids:
+                bits |= DONE
+            if skill_id in self.ignored_skill_ids:
+                bits |= IGNORED
+            if node_id == self.next_node_id:
+                bits |= NEXT
+            if node_id in self._skipped:
+                bits |= SKIPPED
+            digits.append(HEX_DIGITS[bits])
+        return ''.join(digits)
+
+
+def compute_status(artifact, completed_skill_ids, ignored_skill_ids, last_node_id=None):
+    """
+    Return the TreeStatus of a user on `artifact`.
+
+    The position is the user's last clicked node when it is in the sequence,
+    otherwise the last completed node. "Next" is the first non-done node after
+    the position and "skipped" are the non-done, non-ignored nodes up to it.
+    """
+    sequence = artifact.sequence
+    sequence_skills = artifact.sequence_skills
+
+    position = artifact.position_of.get(last_node_id, -1) if last_node_id else -1
+    if position == -1:
+        # Fallback: last completed node in sequence
+        for i in range(len(sequence) - 1, -1, -1):
+            if sequence_skills[i] in completed_skill_ids:
+                position = i
+                break
+
+    next_node_id = None
+    skipped_node_ids = []
+    completed_count = 0
+    for i, skill_id in enumerate(sequence_skills):
+        if skill_id in completed_skill_ids:
+            completed_count += 1
+        elif i <= position:
+            if skill_id not in ignored_skill_ids:
+                skipped_node_ids.append(sequence[i])
+        elif next_node_id is None:
+            next_node_id = sequence[i]
+
+    tree_skill_ids = artifact.skill_ids
+    return TreeStatus(
+        artifact=artifact,
+        done_skill_ids=tree_skill_ids & completed_skill_ids,
+        ignored_skill_ids=tree_skill_ids & ignored_skill_ids,
+        position=position,
+        next_node_id=next_node_id,
+        skipped_node_ids=skipped_node_ids,
+        completed_count=completed_count,
+    )
@@ -0,0 +1,154 @@
+"""
+Synthetic course data for benchmarks and load tests.
+
+`generate` builds layered trees with bulk_create: `depth` layers leading to
+one goal node, each node requiring up to `fan_in` nodes of the layer below,
+skills shared between nodes according to `skill_reuse`, and users that have
+completed a `completion` fraction of every tree's skills. Everything it
+creates is named with `prefix`, so `delete_synthetic` can remove it again.
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from users.skillsets import rebuild_skill_bitmaps
+
+from .artifacts import bump_tree_versions
+from .models import Edge, Node, Skill, Tree
+from .ordering import rebuild_learning_order
+from .signals import bulk_deletion
+
+DEFAULT_PREFIX = 'synthetic'
+
+# Rows removed per DELETE by delete_synthetic
+DELETE_CHUNK = 500
+
+
+def layered_graph(size, fan_in, depth, rng):
+    """
+    Node indexes 0..size-1 split into `depth` layers (the last holds only the
+    goal, size - 1). Returns (from, to, priority) edges in which every node
+    below the goal has a path to it.
+    """
+    depth = max(2, min(depth, size))
+    layers = [[] for _ in range(depth)]
+    layers[-1].append(size - 1)
+    for index in range(size - 1):
+        # Fill every lower layer at least once, then spread the rest evenly
+        layer = index if index < depth - 1 else rng.randrange(depth - 1)
+        layers[layer].append(index)
+
+    edges = []
+    for lower, upper in zip(layers, layers[1:]):
+        has_outgoing = set()
+        for to_index in upper:
+            prereqs = rng.sample(lower, min(fan_in, len(lower)))
+            for priority, from_index in enumerate(prereqs):
+                edges.append((from_index, to_index, priority))
+                has_outgoing.add(from_index)
+        for from_index in lower:
+            if from_index not in has_outgoing:
+                edges.append((from_index, rng.choice(upper), fan_in))
+    return edges
+
+
+@transaction.atomic
+def generate(trees=1, nodes=100, fan_in=2, depth=8, skill_reuse=0.3, users=0, completion=0.5,
+             seed=1, prefix=DEFAULT_PREFIX):
+    """Create synthetic trees, skills and users in bulk. Returns a summary dict."""
+    rng = random.Random(seed)
+    User = get_user_model()
+    creator, _ = User.objects.get_or_create(username=f'{prefix}-creator', defaults={'is_staff': True})
+
+    total_nodes = trees * nodes
+    skill_count = max(1, round(total_nodes * (1 - skill_reuse)))
+    skills = Skill.objects.bulk_create([
+        Skill(
+            title=f'{prefix} skill {i}',
+            video_url='https://www.youtube.com/embed/dQw4w9WgXcQ',
+            text=f'# {prefix} skill {i}\n\nGenerated content.',
+            duration=300,
+            creator=creator,
+        )
+        for i in range(skill_count)
+    ], batch_size=1000)
+    # Every skill is used at least once before any is reused
+    node_skills = [skills[i % skill_count] for i in range(total_nodes)]
+    rng.shuffle(node_skills)
+
+    graphs = [layered_graph(nodes, fan_in, depth, rng) for _ in range(trees)]
+    tree_objs = []
+    for t in range(trees):
+        tree_objs.append(Tree(
+            title=f'{prefix} tree {t}',
+            description=f'{nodes} nodes, fan-in {fan_in}, depth {depth}',
+            goal_skill=node_skills[t * nodes + nodes - 1],
+            is_free=True,
+        ))
+    Tree.objects.bulk_create(tree_objs)
+
+    node_objs = [
+        Node(tree=tree_objs[t], skill=node_skills[t * nodes + i])
+        for t in range(trees) for i in range(nodes)
+    ]
+    Node.objects.bulk_create(node_objs, batch_size=1000)
+    edge_objs = [
+        Edge(from_node=node_objs[t * nodes + a], to_node=node_objs[t * nodes + b], priority=priority)
+        for t, edges in enumerate(graphs) for a, b, priority in edges
+    ]
+    Edge.objects.bulk_create(edge_objs, batch_size=1000)
+    # Laid out now, so benchmarks do not see the graph worker bump versions mid-run
+    for tree in tree_objs:
+        rebuild_learning_order(tree.pk, background_layout=False)
+
+    user_objs = User.objects.bulk_create([
+        User(username=f'{prefix}-user-{i}', password=make_password(None)) for i in range(users)
+    ], batch_size=1000)
+    if user_objs:
+        through = User.completed_skills.through
+        rows = []
+        for user in user_objs:
+            done = set()
+            for t in range(trees):
+                tree_skills = {s.pk for s in node_skills[t * nodes:(t + 1) * nodes]}
+                done.update(rng.sample(sorted(tree_skills), round(len(tree_skills) * completion)))
+            rows.extend(through(user_id=user.pk, skill_id=skill_id) for skill_id in done)
+        through.objects.bulk_create(rows, batch_size=1000)
+        rebuild_skill_bitmaps([user.pk for user in user_objs])
+
+    return {
+        'trees': [tree.pk for tree in tree_objs],
+        'users': [user.pk for user in user_objs],
+        'skills': len(skills),
+        'nodes': len(node_objs),
+        'edges': len(edge_objs),
+    }
+
+
+@transaction.atomic
+def delete_synthetic(prefix=DEFAULT_PREFIX):
+    """Remove everything `generate` created with this prefix. Returns the number of trees removed."""
+    User = get_user_model()
+    tree_ids = list(Tree.objects.filter(title__startswith=f'{prefix} tree ').values_list('pk', flat=True))
+    # The deletion collector clears references into these trees (last_node,
+    # progress rows and events). The per-row signals would bump and rebuild a
+    # tree for every node and edge; the trees are bumped once here instead,
+    # and the learners go before their skills, leaving no skill sets to resync
+    with bulk_deletion():
+        _delete_in_chunks(Edge.objects.filter(to_node__tree_id__in=tree_ids))
+        _delete_in_chunks(Node.objects.filter(tree_id__in=tree_ids))
+        bump_tree_versions(tree_ids)
+        _delete_in_chunks(Tree.objects.filter(pk__in=tree_ids))
+        _delete_in_chunks(User.objects.filter(username__startswith=f'{prefix}-user-'))
+        _delete_in_chunks(Skill.objects.filter(title__startswith=f'{prefix} skill '))
+        # The creator last, since its skills protect it
+        _delete_in_chunks(User.objects.filter(username__startswith=f'{prefix}-'))
+    return len(tree_ids)
+
+
+def _delete_in_chunks(queryset):
+    pks = list(queryset.values_list('pk', flat=True))
+    for start in range(0, len(pks), DELETE_CHUNK):
+        queryset.model.objects.filter(pk__in=pks[start:start + DELETE_CHUNK]).delete()
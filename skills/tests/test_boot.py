@@ -0,0 +1,94 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from ..management.commands.boot import Command, static_fingerprint
+from ..models import BootStep, Skill, Tree
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class BootTests(TestCase):
+
+    def setUp(self):
+        self.command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_loaddata_runs_when_the_fixture_changes(self):
+        fixture = os.path.join(self.directory, 'data.json')
+        with open(fixture, 'w') as fh:
+            fh.write('[]')
+        with mock.patch('skills.management.commands.boot.call_command') as call_command:
+            self.assertEqual(self.command.loaddata(fixture, force=False), 'ran')
+            self.assertEqual(self.command.loaddata(fixture, force=False), 'up to date')
+            self.assertEqual(self.command.loaddata(fixture, force=True), 'ran')
+            with open(fixture, 'w') as fh:
+                fh.write('[ ]')
+            self.assertEqual(self.command.loaddata(fixture, force=False), 'ran')
+            self.assertEqual(self.command.loaddata(fixture, force=False), 'up to date')
+        self.assertEqual(call_command.call_count, 3)
+
+    def test_failed_loaddata_runs_again(self):
+        fixture = os.path.join(self.directory, 'data.json')
+        with open(fixture, 'w') as fh:
+            fh.write('[]')
+        with mock.patch('skills.management.commands.boot.call_command', side_effect=ValueError('bad row')):
+            self.assertEqual(self.command.loaddata(fixture, force=False), 'failed')
+        self.assertFalse(BootStep.objects.exists())
+        with mock.patch('skills.management.commands.boot.call_command'):
+            self.assertEqual(self.command.loaddata(fixture, force=False), 'ran')
+
+    def test_collectstatic_keeps_its_fingerprint_next_to_static_root(self):
+        static_root = os.path.join(self.directory, 'static')
+        os.mkdir(static_root)
+        with self.settings(STATIC_ROOT=static_root), \
+                mock.patch('skills.management.commands.boot.call_command') as call_command:
+            self.assertEqual(self.command.collectstatic(force=False), 'ran')
+            with open(f'{static_root}.fingerprint') as fh:
+                self.assertEqual(fh.read(), static_fingerprint())
+            self.assertEqual(self.command.collectstatic(force=False), 'up to date')
+            self.assertEqual(self.command.collectstatic(force=True), 'ran')
+            # A new container starts without the collected files
+            os.rmdir(static_root)
+            self.assertEqual(self.command.collectstatic(force=False), 'ran')
+        self.assertEqual(call_command.call_count, 3)
+
+    def test_static_fingerprint_follows_settings(self):
+        fingerprint = static_fingerprint()
+        self.assertEqual(static_fingerprint(), fingerprint)
+        with self.settings(STATIC_URL='/assets/'):
+            self.assertNotEqual(static_fingerprint(), fingerprint)
+
+    def test_ensure_admin_runs_again_after_a_password_change(self):
+        with mock.patch.dict(os.environ, {'ADMIN_PASSWORD': ''}):
+            self.assertEqual(self.command.ensure_admin(force=False), 'skipped')
+        with mock.patch.dict(os.environ, {'ADMIN_PASSWORD': 'first'}):
+            self.assertEqual(self.command.ensure_admin(force=False), 'ran')
+            self.assertEqual(self.command.ensure_admin(force=False), 'up to date')
+
+            admin = get_user_model().objects.get(username='admin')
+            admin.set_password('changed in the admin')
+            admin.save()
+            self.assertEqual(self.command.ensure_admin(force=False), 'ran')
+            self.assertTrue(get_user_model().objects.get(username='admin').check_password('first'))
+        with mock.patch.dict(os.environ, {'ADMIN_PASSWORD': 'second'}):
+            self.assertEqual(self.command.ensure_admin(force=False), 'ran')
+            self.assertTrue(get_user_model().objects.get(username='admin').check_password('second'))
+
+    def test_layouts_only_for_trees_without_one(self):
+        self.assertEqual(self.command.migrate(force=False), 'up to date')
+        self.assertEqual(self.command.layouts(force=False), 'up to date')
+        creator = get_user_model().objects.create_user('creator', is_staff=True)
+        skill = Skill.objects.create(title='Goal', video_url='https://example.com/v', text='', duration=60,
+                                     creator=creator)
+        tree = Tree.objects.create(title='Tree', description='', goal_skill=skill, layout={})
+        tree.nodes.create(skill=skill)
+        self.assertEqual(self.command.layouts(force=False), 'ran')
+        self.assertNotEqual(Tree.objects.get(pk=tree.pk).layout, {})
+        self.assertEqual(self.command.layouts(force=False), 'up to date')
+        self.assertEqual(self.command.layouts(force=True), 'ran')
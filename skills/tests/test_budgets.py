@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from skilltrees.timing import assert_query_budget
+
+from ..artifacts import artifact_cache
+from ..models import Node, Tree
+from ..packages import clone_tree
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class QueryBudgetTests(TransactionTestCase):
+    # Not TestCase: the "read" alias and the pool threads of async views use
+    # connections of their own, which cannot see into its transaction
+    databases = '__all__'
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        # Budgets hold with a cold cache; reloaded fixtures also reuse tree ids and versions
+        artifact_cache.clear()
+        self.user = get_user_model().objects.create_user('learner', password='secret')
+        self.tree = Tree.objects.order_by('pk').first()
+        self.node = Node.objects.filter(tree=self.tree).order_by('pk').first()
+        self.client.force_login(self.user)
+
+    def skill_sets(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        return set(user.completed_skill_set()), set(user.ignored_skill_set())
+
+    def structure_url(self):
+        return reverse('skills:tree_structure', args=[self.tree.pk]) + f'?v={self.tree.version}'
+
+    def test_tree_structure(self):
+        self.assertEqual(assert_query_budget(self.client, self.structure_url()).status_code, 200)
+        # Served from the artifact cache the second time
+        self.assertEqual(assert_query_budget(self.client, self.structure_url()).status_code, 200)
+
+    def test_tree_structure_anonymous(self):
+        self.client.logout()
+        self.assertEqual(assert_query_budget(self.client, self.structure_url()).status_code, 200)
+
+    def test_tree_progress(self):
+        response = assert_query_budget(self.client, reverse('skills:tree_progress', args=[self.tree.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], self.tree.version)
+
+    def test_progress_batch(self):
+        # Every node of both fixture trees
+        nodes = list(Node.objects.order_by('pk'))
+        response = assert_query_budget(
+            self.client, reverse('skills:progress_batch'), method='post', content_type='application/json',
+            data={'ops': [{'node': node.pk, 'done': True} for node in nodes]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.skill_sets(), ({node.skill_id for node in nodes}, set()))
+
+    def test_toggle_skill(self):
+        url = reverse('skills:toggle_skill', args=[self.node.pk])
+        # Marking done, then undoing it
+        self.assertEqual(assert_query_budget(self.client, url, method='post').status_code, 200)
+        self.assertEqual(assert_query_budget(self.client, url, method='post').status_code, 200)
+        self.assertEqual(self.skill_sets(), (set(), set()))
+
+    def test_toggle_skill_in_two_trees(self):
+        clone_tree(self.tree)
+        url = reverse('skills:toggle_skill', args=[self.node.pk])
+        self.assertEqual(assert_query_budget(self.client, url, method='post').status_code, 200)
+
+    def test_toggle_ignore(self):
+        url = reverse('skills:toggle_ignore', args=[self.node.pk])
+        self.assertEqual(assert_query_budget(self.client, url, method='post').status_code, 200)
+        self.assertEqual(self.skill_sets(), (set(), {self.node.skill_id}))
+
+    def test_toggle_ignore_completed_skill(self):
+        self.client.post(reverse('skills:toggle_skill', args=[self.node.pk]))
+        artifact_cache.clear()
+        url = reverse('skills:toggle_ignore', args=[self.node.pk])
+        self.assertEqual(assert_query_budget(self.client, url, method='post').status_code, 200)
+        self.assertEqual(self.skill_sets(), (set(), {self.node.skill_id}))
+
+    def test_progress_merge(self):
+        nodes = list(Node.objects.filter(tree=self.tree).order_by('pk')[:10])
+        response = assert_query_budget(
+            self.client, reverse('skills:progress_merge'), method='post', content_type='application/json',
+            data={'trees': {str(self.tree.pk): {'completed': [node.skill_id for node in nodes]}}},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.skill_sets(), ({node.skill_id for node in nodes}, set()))
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..artifacts import artifact_cache, get_tree_artifacts
+from ..dashboard import dashboard_rows
+from ..models import Tree, TreeProgress
+from ..ordering import rebuild_learning_order
+from ..packages import clone_tree
+from ..progress import apply_progress_ops
+from ..status import compute_status
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class DashboardTests(TestCase):
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        artifact_cache.clear()
+        self.user = get_user_model().objects.create_user('learner')
+        # The fixture has no stored learning order
+        for tree_id in Tree.objects.values_list('pk', flat=True):
+            rebuild_learning_order(tree_id)
+        self.trees = list(Tree.objects.order_by('pk'))
+        self.artifacts = get_tree_artifacts(self.trees)
+
+    def mark_done(self, node_ids):
+        apply_progress_ops(self.user, [
+            {'node': node_id, 'done': True, 'ignored': None, 'seq': seq} for seq, node_id in enumerate(node_ids)
+        ])
+
+    def rows(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        return {row['tree_id']: row for row in dashboard_rows(user)}
+
+    def assert_matches_status_engine(self, rows):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        completed, ignored = user.completed_skill_set(), user.ignored_skill_set()
+        cursors = dict(TreeProgress.objects.filter(user=user).values_list('tree_id', 'last_node_id'))
+        for tree_id, artifact in self.artifacts.items():
+            status = compute_status(artifact, completed, ignored, cursors.get(tree_id, user.last_node_id))
+            row = rows[tree_id]
+            self.assertEqual((row['completed'], row['total']), (status.completed_count, len(artifact.sequence)))
+            self.assertEqual(row['next_node_id'], status.next_node_id)
+
+    def test_nothing_done(self):
+        rows = self.rows()
+        for tree_id, artifact in self.artifacts.items():
+            row = rows[tree_id]
+            self.assertEqual((row['completed'], row['percent'], row['resume_node_id']), (0, 0, None))
+            self.assertEqual(row['next_node_id'], artifact.sequence[0])
+            self.assertEqual(row['next_skill'], artifact.sequence_items[0]['name'])
+        self.assert_matches_status_engine(rows)
+
+    def test_progress_and_order(self):
+        started, finished = self.trees[0], self.trees[1]
+        self.mark_done(self.artifacts[finished.pk].sequence)
+        sequence = self.artifacts[started.pk].sequence
+        self.mark_done(sequence[:2])
+
+        rows = dashboard_rows(get_user_model().objects.get(pk=self.user.pk))
+        by_tree = {row['tree_id']: row for row in rows}
+        self.assertEqual(by_tree[finished.pk]['percent'], 100)
+        self.assertIsNone(by_tree[finished.pk]['next_node_id'])
+        self.assertEqual(by_tree[started.pk]['resume_node_id'], sequence[1])
+        self.assertGreaterEqual(by_tree[started.pk]['completed'], 2)
+        # In-progress trees come before finished ones
+        self.assertEqual(rows[-1]['tree_id'], finished.pk)
+        self.assert_matches_status_engine(by_tree)
+
+    def test_stale_rows_are_rederived(self):
+        self.mark_done(self.artifacts[self.trees[0].pk].sequence[:3])
+        fresh = self.rows()
+        TreeProgress.objects.filter(user=self.user).update(tree_version=0, completed_nodes=999, next_node=None)
+        self.assertEqual(self.rows(), fresh)
+        self.assert_matches_status_engine(fresh)
+
+    def test_queries_do_not_grow_with_trees(self):
+        self.mark_done(self.artifacts[self.trees[0].pk].sequence[:3])
+
+        def count():
+            user = get_user_model().objects.get(pk=self.user.pk)
+            dashboard_rows(user)  # Warm the artifact cache
+            with CaptureQueriesContext(connection) as queries:
+                dashboard_rows(user)
+            return len(queries)
+
+        before = count()
+        for _ in range(3):
+            clone_tree(self.trees[0])
+        self.assertEqual(count(), before)
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from users.bitmaps import SkillBitmap
+
+from ..artifacts import artifact_cache, get_tree_artifacts
+from ..events import compact_all, compactor, progress_tail
+from ..heartbeat import write_positions
+from ..models import ProgressEvent, SkillProgress, Tree, TreeProgress
+from ..ordering import rebuild_learning_order
+from ..progress import apply_progress_ops
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False, PROGRESS_EVENT_LOG=True)
+class CompactionTests(TestCase):
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        artifact_cache.clear()
+        # The tests compact themselves
+        patcher = mock.patch.object(compactor, '_thread', object())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tree = Tree.objects.order_by('pk').first()
+        rebuild_learning_order(self.tree.pk, background_layout=False)
+        self.sequence = get_tree_artifacts([Tree.objects.get(pk=self.tree.pk)])[self.tree.pk].sequence
+        self.skill_of = dict(self.tree.nodes.values_list('id', 'skill_id'))
+        self.ops = [
+            (self.sequence[0], True, None), (self.sequence[1], True, None), (self.sequence[2], None, True),
+            (self.sequence[3], True, None), (self.sequence[1], False, None), (self.sequence[4], True, None),
+            (self.sequence[3], None, True),
+        ]
+
+    def apply(self, user, ops):
+        # One batch per op, as separate requests would send them
+        for seq, (node_id, done, ignored) in enumerate(ops):
+            user = get_user_model().objects.get(pk=user.pk)
+            apply_progress_ops(user, [{'node': node_id, 'done': done, 'ignored': ignored, 'seq': seq}])
+
+    def state(self, user):
+        user = get_user_model().objects.get(pk=user.pk)
+        self.assertEqual(
+            set(SkillBitmap.from_bytes(user.completed_skills_bitmap)),
+            set(user.completed_skills.values_list('id', flat=True)),
+        )
+        self.assertEqual(
+            set(SkillBitmap.from_bytes(user.ignored_skills_bitmap)),
+            set(user.ignored_skills.values_list('id', flat=True)),
+        )
+        rows = TreeProgress.objects.filter(user=user).values_list(
+            'tree_id', 'completed_nodes', 'total_nodes', 'next_node_id', 'last_node_id',
+        )
+        return set(user.completed_skill_set()), set(user.ignored_skill_set()), user.last_node_id, set(rows)
+
+    def test_compaction_matches_direct_writes(self):
+        direct = get_user_model().objects.create_user('direct')
+        with self.settings(PROGRESS_EVENT_LOG=False):
+            self.apply(direct, self.ops)
+            expected = self.state(direct)
+
+        logged = get_user_model().objects.create_user('logged')
+        self.apply(logged, self.ops)
+        self.assertEqual(ProgressEvent.objects.filter(user=logged).count(), len(self.ops))
+        # Nothing is folded yet, but reads overlay the tail
+        self.assertFalse(logged.completed_skills.exists())
+        user = get_user_model().objects.get(pk=logged.pk)
+        self.assertEqual(set(user.completed_skill_set()), expected[0])
+        self.assertEqual(set(user.ignored_skill_set()), expected[1])
+
+        self.assertEqual(compact_all(), len(self.ops))
+        self.assertFalse(ProgressEvent.objects.exists())
+        self.assertEqual(self.state(logged), expected)
+
+        # The folded skill progress follows the last event per skill
+        statuses = dict(SkillProgress.objects.filter(user=logged).values_list('skill_id', 'status'))
+        self.assertEqual(statuses[self.skill_of[self.sequence[0]]], SkillProgress.Status.COMPLETED)
+        self.assertEqual(statuses[self.skill_of[self.sequence[1]]], SkillProgress.Status.NOT_STARTED)
+
+    def test_small_batches(self):
+        user = get_user_model().objects.create_user('learner')
+        self.apply(user, self.ops)
+        tail = progress_tail(get_user_model().objects.get(pk=user.pk))
+        self.assertEqual(tail.last_node_id, self.sequence[4])
+
+        self.assertEqual(compact_all(limit=2), len(self.ops))
+        once = get_user_model().objects.create_user('once')
+        self.apply(once, self.ops)
+        compact_all()
+        self.assertEqual(self.state(user), self.state(once))
+
+    def test_positions(self):
+        user = get_user_model().objects.create_user('learner')
+        skill_id = self.skill_of[self.sequence[0]]
+        write_positions({(user.pk, skill_id): 40})
+        write_positions({(user.pk, skill_id): 75})
+        self.assertEqual(ProgressEvent.objects.filter(kind=ProgressEvent.Kind.POSITION).count(), 2)
+
+        compact_all()
+        row = SkillProgress.objects.get(user=user, skill_id=skill_id)
+        self.assertEqual((row.status, row.video_position), (SkillProgress.Status.IN_PROGRESS, 75))
+        user.refresh_from_db()
+        self.assertEqual(user.last_video_position, 75)
@@ -0,0 +1,105 @@
+import random
+import sys
+
+from django.test import SimpleTestCase
+
+from ..graph import (
+    CycleError, build_prereqs_map, compute_learning_order, find_cycle, find_goal_ids, learning_sequence,
+    validate_graph,
+)
+
+
+def recursive_sequence(prereqs_map, goal_id):
+    """The recursive DFS the engine replaced; fine for small graphs."""
+    sequence, visited = [], set()
+
+    def dfs(node_id):
+        if node_id in visited:
+            return
+        visited.add(node_id)
+        for prereq_id in prereqs_map.get(node_id, []):
+            dfs(prereq_id)
+        sequence.append(node_id)
+
+    dfs(goal_id)
+    return sequence
+
+
+def chain(length):
+    """Node 0 is the goal; node i + 1 is the prerequisite of node i."""
+    return list(range(length)), [(i + 1, i, 0) for i in range(length - 1)]
+
+
+class LearningSequenceTests(SimpleTestCase):
+
+    def test_deep_chain(self):
+        length = sys.getrecursionlimit() * 20
+        node_ids, edges = chain(length)
+        order, errors = compute_learning_order(node_ids, edges)
+        self.assertEqual(errors, [])
+        # Leaves first, goal last, and every node's depth is its distance from the goal
+        self.assertEqual(order[length - 1], (0, length - 1))
+        self.assertEqual(order[0], (length - 1, 0))
+
+    def test_priority_order(self):
+        # Lower priority values are learned first; equal priorities keep edge order
+        edges = [(1, 0, 5), (2, 0, 1), (3, 0, 1), (4, 2, 0)]
+        self.assertEqual(learning_sequence(build_prereqs_map(edges), 0), [4, 2, 3, 1, 0])
+
+    def test_matches_recursive_order(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            size = rng.randint(1, 40)
+            # Edges only point from higher to lower ids, so the graph is acyclic
+            edges = [
+                (a, b, rng.randint(0, 3))
+                for a in range(1, size) for b in range(a)
+                if rng.random() < 0.15
+            ]
+            prereqs_map = build_prereqs_map(edges)
+            self.assertEqual(learning_sequence(prereqs_map, 0), recursive_sequence(prereqs_map, 0))
+
+
+class CycleTests(SimpleTestCase):
+    # 0 is the goal; 1 -> 2 -> 3 -> 1 is a prerequisite cycle below it
+    node_ids = [0, 1, 2, 3]
+    edges = [(1, 0, 0), (2, 1, 0), (3, 2, 0), (1, 3, 0)]
+
+    def test_strict_sequence_raises(self):
+        with self.assertRaises(CycleError) as caught:
+            learning_sequence(build_prereqs_map(self.edges), 0)
+        cycle = caught.exception.cycle
+        self.assertEqual(cycle[0], cycle[-1])
+        self.assertEqual(set(cycle), {1, 2, 3})
+
+    def test_find_cycle(self):
+        cycle = find_cycle(build_prereqs_map(self.edges))
+        self.assertEqual(set(cycle), {1, 2, 3})
+        self.assertIsNone(find_cycle(build_prereqs_map(chain(10)[1])))
+
+    def test_long_cycle(self):
+        node_ids, edges = chain(sys.getrecursionlimit() * 5)
+        edges.append((0, node_ids[-1], 0))
+        self.assertEqual(len(find_cycle(build_prereqs_map(edges))), len(node_ids) + 1)
+
+    def test_compute_learning_order_reports_and_still_orders(self):
+        order, errors = compute_learning_order(self.node_ids, self.edges)
+        self.assertTrue(any(error.startswith('Prerequisite cycle') for error in errors))
+        self.assertEqual(set(order), {0, 1, 2, 3})
+        self.assertEqual(order[0][0], 3)
+
+
+class ValidateGraphTests(SimpleTestCase):
+
+    def test_valid(self):
+        self.assertEqual(validate_graph(*chain(5)), [])
+
+    def test_goal_count(self):
+        self.assertEqual(find_goal_ids([0, 1, 2], [(1, 0, 0)]), [0, 2])
+        errors = validate_graph([0, 1, 2], [(1, 0, 0)])
+        self.assertIn('Expected exactly one goal node, found 2: [0, 2]', errors)
+
+    def test_unreachable(self):
+        # 2 and 3 only lead to each other: neither is a goal, and the goal never needs them
+        errors = validate_graph([0, 1, 2, 3], [(1, 0, 0), (3, 2, 0), (2, 3, 0)])
+        self.assertIn('Nodes not leading to the goal: [2, 3]', errors)
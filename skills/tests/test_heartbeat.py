@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from ..heartbeat import MAX_POSITION, HeartbeatBuffer, parse_position
+from ..models import Skill, SkillProgress
+
+
+class ParsePositionTests(SimpleTestCase):
+
+    def test_parses(self):
+        self.assertEqual(parse_position(b'{"position": 12.9}'), 12)
+        self.assertEqual(parse_position(b'{"position": 0}'), 0)
+        self.assertEqual(parse_position(f'{{"position": {MAX_POSITION}}}'.encode()), MAX_POSITION)
+
+    def test_rejects(self):
+        bodies = [
+            b'', b'null', b'[]', b'{', b'{}',
+            b'{"position": -1}', b'{"position": 1e20}', b'{"position": Infinity}', b'{"position": NaN}',
+            b'{"position": true}', b'{"position": "5"}', b'{"position": [1]}',
+            f'{{"position": {MAX_POSITION + 1}}}'.encode(),
+        ]
+        for body in bodies:
+            with self.subTest(body=body), self.assertRaises(ValueError):
+                parse_position(body)
+
+
+class HeartbeatBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('learner', is_staff=True)
+        cls.skills = [
+            Skill.objects.create(title=f'Skill {i}', video_url='https://example.com/v', text='', duration=600,
+                                 creator=cls.user)
+            for i in range(2)
+        ]
+
+    def buffer(self, interval=3600):
+        buffer = HeartbeatBuffer(interval, max_size=100)
+        # No flusher thread: the tests flush themselves
+        buffer._thread = object()
+        return buffer
+
+    def positions(self):
+        return dict(SkillProgress.objects.filter(user=self.user).values_list('skill_id', 'video_position'))
+
+    def test_latest_position_wins(self):
+        first, second = self.skills
+        buffer = self.buffer()
+        buffer.record(self.user.pk, first.pk, 10)
+        buffer.record(self.user.pk, second.pk, 20)
+        buffer.record(self.user.pk, first.pk, 30)
+        buffer.record(self.user.pk, 10 ** 6, 40)
+        self.assertEqual(self.positions(), {})
+
+        # The unknown skill is dropped
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.positions(), {first.pk: 30, second.pk: 20})
+        # The user's last position is that of their latest heartbeat
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_video_position, 30)
+
+    def test_failed_flush_keeps_newer_positions(self):
+        skill = self.skills[0]
+        buffer = self.buffer()
+        buffer.record(self.user.pk, skill.pk, 10)
+
+        def locked(positions):
+            # A heartbeat arrives while the flush is failing
+            buffer.record(self.user.pk, skill.pk, 50)
+            raise OperationalError('database is locked')
+
+        with mock.patch('skills.heartbeat.write_positions', side_effect=locked), \
+                self.assertLogs('skills.heartbeat', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.positions(), {skill.pk: 50})
+
+    def test_write_through(self):
+        buffer = self.buffer(interval=0)
+        buffer.record(self.user.pk, self.skills[1].pk, 15)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.positions(), {self.skills[1].pk: 15})
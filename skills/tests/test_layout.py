@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..layout import EDGE_SEP, NODE_HEIGHT, NODE_WIDTH, RANK_SEP, inversions, spaced, tree_layout
+
+
+class TreeLayoutTests(SimpleTestCase):
+
+    def positions(self, node_ids, edges):
+        layout = tree_layout(node_ids, edges)
+        self.assertEqual(set(layout['nodes']), {str(node_id) for node_id in node_ids})
+        return {int(node_id): tuple(xy) for node_id, xy in layout['nodes'].items()}
+
+    def assert_no_overlap(self, positions):
+        by_rank = {}
+        for x, y in positions.values():
+            by_rank.setdefault(x, []).append(y)
+        for ys in by_rank.values():
+            ys.sort()
+            # Nodes with an edge routed between them are spaced by EDGE_SEP
+            for upper, lower in zip(ys, ys[1:]):
+                self.assertGreaterEqual(lower - upper, NODE_HEIGHT + EDGE_SEP * 2 - 0.2)
+
+    def test_empty(self):
+        self.assertEqual(tree_layout([], []), {'width': 0, 'height': 0, 'nodes': {}})
+
+    def test_chain_runs_left_to_right(self):
+        layout = tree_layout([1, 2, 3], [(1, 2, 0), (2, 3, 0)])
+        self.assertEqual(layout['nodes'], {
+            '1': [NODE_WIDTH / 2, NODE_HEIGHT / 2],
+            '2': [NODE_WIDTH * 1.5 + RANK_SEP, NODE_HEIGHT / 2],
+            '3': [NODE_WIDTH * 2.5 + RANK_SEP * 2, NODE_HEIGHT / 2],
+        })
+        self.assertEqual((layout['width'], layout['height']), (NODE_WIDTH * 3 + RANK_SEP * 2, NODE_HEIGHT))
+
+    def test_prerequisites_left_of_dependents(self):
+        edges = [(1, 5, 0), (2, 5, 1), (3, 4, 0), (4, 5, 0), (1, 6, 0), (6, 5, 0), (2, 4, 0)]
+        positions = self.positions(range(1, 7), edges)
+        for from_id, to_id, _ in edges:
+            self.assertLess(positions[from_id][0], positions[to_id][0])
+        self.assert_no_overlap(positions)
+        # Deterministic, so every worker stores the same layout
+        self.assertEqual(tree_layout(range(1, 7), edges), tree_layout(range(1, 7), edges))
+
+    def test_ordering_removes_crossings(self):
+        positions = self.positions([1, 2, 3, 4], [(1, 4, 0), (2, 3, 0)])
+        self.assertEqual(positions[1][1] < positions[2][1], positions[4][1] < positions[3][1])
+
+    def test_cycles_and_stray_edges_are_drawn(self):
+        edges = [(1, 2, 0), (2, 3, 0), (3, 1, 0), (3, 3, 0), (3, 99, 0), (1, 2, 0)]
+        positions = self.positions([1, 2, 3], edges)
+        self.assert_no_overlap(positions)
+        self.assertEqual(len(set(positions.values())), 3)
+
+    def test_limits(self):
+        with mock.patch('skills.layout.MAX_LAYOUT_NODES', 2):
+            self.assertEqual(tree_layout([1, 2, 3], []), {})
+        # A shared prerequisite of a long chain: the longest edges get no dummies once the budget runs out
+        chain = list(range(1, 60))
+        edges = [(a, a + 1, 0) for a in chain[:-1]] + [(0, node_id, 0) for node_id in chain[1:]]
+        with mock.patch('skills.layout.MAX_DUMMIES', 100):
+            positions = self.positions([0, *chain], edges)
+        self.assertEqual(positions[0][0], NODE_WIDTH / 2)
+        self.assert_no_overlap(positions)
+
+
+class HelperTests(SimpleTestCase):
+
+    def test_spaced(self):
+        self.assertEqual(spaced([0, 0, 0], [10, 10]), [-10, 0, 10])
+        self.assertEqual(spaced([0, 100], [10]), [0, 100])
+        self.assertEqual(spaced([5, 0], [20]), [-7.5, 12.5])
+
+    def test_inversions(self):
+        self.assertEqual(inversions([]), 0)
+        self.assertEqual(inversions([0, 1, 1, 2]), 0)
+        self.assertEqual(inversions([3, 1, 2]), 2)
@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..media import RangeNotSatisfiable, parse_range
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=100-': (100, 999),
+            'bytes=900-2000': (900, 999),
+            'bytes=-100': (900, 999),
+            'bytes=-5000': (0, 999),
+            'Bytes = 5-9': (5, 9),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 1000), expected)
+
+    def test_ignored(self):
+        for header in ('items=0-1', 'bytes=0-1,5-9', 'bytes=-', 'bytes=5', 'bytes=a-b', 'bytes=9-5', 'bytes=+1-2',
+                       'bytes=²-'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 1000))
+
+    def test_not_satisfiable(self):
+        for header, size in (('bytes=1000-', 1000), ('bytes=-0', 1000), ('bytes=-5', 0), ('bytes=0-', 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, size)
+
+
+class ResourceFileTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.mkdir(os.path.join(directory.name, 'resources'))
+        with open(os.path.join(directory.name, 'resources', 'data.json'), 'wb') as fh:
+            fh.write(bytes(range(100)))
+        settings = override_settings(MEDIA_ROOT=directory.name, MEDIA_ACCEL_REDIRECT='', MEDIA_SENDFILE_HEADER='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.url = reverse('skills:resource_file', args=['resources/data.json'])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_full_and_conditional(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, bytes(range(100))))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(self.get(if_none_match=response['ETag'])[0].status_code, 304)
+
+    def test_range(self):
+        response, body = self.get(range='bytes=10-19')
+        self.assertEqual((response.status_code, body), (206, bytes(range(10, 20))))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(response['Content-Length'], '10')
+
+        response, body = self.get(range='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+        self.assertNotIn('max-age', response.get('Cache-Control', ''))
+
+    def test_if_range(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(range='bytes=0-9', if_range=etag)
+        self.assertEqual((response.status_code, body), (206, bytes(range(10))))
+        # A stale validator gets the whole current file
+        for validator in ('"stale"', http_date(0)):
+            with self.subTest(if_range=validator):
+                response, body = self.get(range='bytes=0-9', if_range=validator)
+                self.assertEqual((response.status_code, len(body)), (200, 100))
+
+    def test_outside_the_upload_directories(self):
+        for name in ('../settings.py', 'resources/../db.sqlite3', 'resources/missing.json', 'resources'):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse('skills:resource_file', args=[name])).status_code, 404)
@@ -0,0 +1,155 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.forms import inlineformset_factory
+from django.test import TestCase, override_settings
+
+from ..admin import EdgeForm, NodeForm, OutgoingEdgeFormSet
+from ..models import Edge, Node, Skill, Tree
+from ..ordering import _pending_tree_ids, graph_worker, rebuild_learning_order
+
+
+class GraphTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = get_user_model().objects.create_user('author', is_staff=True)
+        cls.skills = [
+            Skill.objects.create(
+                title=f'Skill {i}', video_url='https://example.com/v', text='', duration=60, creator=creator,
+            )
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        # Edits whose commit callbacks a test did not run stay queued
+        _pending_tree_ids().clear()
+
+    def make_tree(self, title='Tree'):
+        """goal <- middle <- (first, second); second is learned before first."""
+        tree = Tree.objects.create(title=title, description='', goal_skill=self.skills[0])
+        goal, middle, first, second = [Node.objects.create(tree=tree, skill=skill) for skill in self.skills]
+        Edge.objects.create(from_node=middle, to_node=goal)
+        Edge.objects.create(from_node=first, to_node=middle, priority=2)
+        Edge.objects.create(from_node=second, to_node=middle, priority=1)
+        return tree, goal, middle, first, second
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class RebuildTests(GraphTestCase):
+
+    def test_edits_rebuild_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tree, goal, middle, first, second = self.make_tree()
+        orders = dict(Node.objects.filter(tree=tree).values_list('pk', 'position'))
+        self.assertEqual(orders, {second.pk: 0, first.pk: 1, middle.pk: 2, goal.pk: 3})
+        depths = dict(Node.objects.filter(tree=tree).values_list('pk', 'depth'))
+        self.assertEqual(depths, {goal.pk: 0, middle.pk: 1, first.pk: 2, second.pk: 2})
+        tree.refresh_from_db()
+        self.assertEqual(tree.graph_errors, [])
+        self.assertEqual(len(tree.layout['nodes']), 4)
+
+        with self.assertLogs('skills.ordering', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            Edge.objects.create(from_node=goal, to_node=second)
+        tree.refresh_from_db()
+        self.assertEqual(len(tree.graph_errors), 2)
+        self.assertTrue(tree.graph_errors[0].startswith('Expected exactly one goal node, found 0'))
+        self.assertTrue(tree.graph_errors[1].startswith('Prerequisite cycle'))
+
+    def test_one_rebuild_per_tree_per_transaction(self):
+        with mock.patch('skills.ordering.rebuild_learning_order', wraps=rebuild_learning_order) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                tree = self.make_tree()[0]
+                other = self.make_tree('Other')[0]
+        self.assertEqual(sorted(call.args[0] for call in rebuild.call_args_list), [tree.pk, other.pk])
+
+    @override_settings(TREE_LAYOUT_BACKGROUND=True)
+    def test_committed_edits_go_to_the_worker(self):
+        with mock.patch.object(graph_worker, 'schedule_rebuild') as schedule, \
+                mock.patch('skills.ordering.rebuild_learning_order') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                tree = self.make_tree()[0]
+        schedule.assert_called_once_with([tree.pk])
+        rebuild.assert_not_called()
+
+    def test_worker_coalesces(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tree = self.make_tree()[0]
+        Node.objects.filter(tree=tree).update(position=None, depth=None)
+        Tree.objects.filter(pk=tree.pk).update(layout={})
+        with mock.patch.object(graph_worker, '_thread', object()):
+            graph_worker.schedule_rebuild([tree.pk])
+            graph_worker.schedule_rebuild([tree.pk, 0])
+        with mock.patch('skills.ordering.rebuild_learning_order', wraps=rebuild_learning_order) as rebuild:
+            # Tree 0 does not exist
+            self.assertEqual(graph_worker.run_once(), 1)
+        rebuild.assert_called_once_with(tree.pk)
+        self.assertFalse(Node.objects.filter(tree=tree, position=None).exists())
+
+        Tree.objects.filter(pk=tree.pk).update(layout={})
+        with mock.patch.object(graph_worker, '_thread', object()):
+            graph_worker.schedule_layout([tree.pk])
+            graph_worker.schedule_layout([tree.pk])
+        self.assertEqual(graph_worker.run_once(), 1)
+        tree.refresh_from_db()
+        self.assertEqual(len(tree.layout['nodes']), 4)
+
+
+class AdminValidationTests(GraphTestCase):
+
+    def edge_form(self, from_node, to_node, instance=None):
+        data = {'from_node': from_node.pk, 'to_node': to_node.pk, 'priority': 0}
+        return EdgeForm(data, instance=instance)
+
+    def test_edge_form(self):
+        tree, goal, middle, first, second = self.make_tree()
+        other_goal = self.make_tree('Other')[1]
+        self.assertTrue(self.edge_form(first, second).is_valid())
+
+        form = self.edge_form(goal, first)
+        self.assertFalse(form.is_valid())
+        self.assertTrue(form.non_field_errors()[0].startswith('Prerequisite cycle'))
+        self.assertFalse(self.edge_form(first, first).is_valid())
+        self.assertEqual(
+            self.edge_form(first, other_goal).errors['__all__'], ['Both nodes of an edge must be in the same tree.'],
+        )
+
+        # Turning first -> middle around is fine; adding middle -> first next to it is not
+        edge = Edge.objects.get(from_node=first, to_node=middle)
+        self.assertTrue(self.edge_form(middle, first, instance=edge).is_valid())
+        self.assertFalse(self.edge_form(middle, first).is_valid())
+
+    def test_outgoing_edge_formset(self):
+        tree, goal, middle, first, second = self.make_tree()
+        FormSet = inlineformset_factory(
+            Node, Edge, fk_name='from_node', formset=OutgoingEdgeFormSet, fields=['to_node', 'priority'],
+        )
+        edge = Edge.objects.get(from_node=middle)
+
+        def formset(*rows):
+            data = {'edges-TOTAL_FORMS': len(rows), 'edges-INITIAL_FORMS': 1}
+            for i, row in enumerate(rows):
+                data.update({f'edges-{i}-{key}': value for key, value in row.items()})
+            return FormSet(data, instance=middle, prefix='edges')
+
+        existing = {'id': edge.pk, 'to_node': goal.pk, 'priority': 0}
+        self.assertTrue(formset(existing, {'to_node': '', 'priority': 0}).is_valid())
+        self.assertTrue(formset({**existing, 'DELETE': 'on'}).is_valid())
+
+        invalid = formset(existing, {'to_node': second.pk, 'priority': 0})
+        self.assertFalse(invalid.is_valid())
+        self.assertTrue(invalid.non_form_errors()[0].startswith('Prerequisite cycle'))
+
+        other_goal = self.make_tree('Other')[1]
+        invalid = formset(existing, {'to_node': other_goal.pk, 'priority': 0})
+        self.assertFalse(invalid.is_valid())
+        self.assertIn('not in the same tree', invalid.non_form_errors()[0])
+
+    def test_node_form_keeps_prerequisites_in_their_tree(self):
+        tree, goal, middle, first, second = self.make_tree()
+        other = self.make_tree('Other')[0]
+        data = {'tree': other.pk, 'skill': goal.skill_id}
+        form = NodeForm(data, instance=goal)
+        self.assertFalse(form.is_valid())
+        self.assertIn('tree', form.errors)
+        self.assertTrue(NodeForm(data, instance=first).is_valid())
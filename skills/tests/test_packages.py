@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from ..models import Edge, Node, Skill, Tree
+from ..packages import PackageError, clone_tree, export_package, import_package
+
+
+def graph(tree_id):
+    """A tree's edges by skill, which survive a copy that renumbers the nodes."""
+    return sorted(
+        Edge.objects.filter(from_node__tree_id=tree_id)
+        .values_list('from_node__skill__key', 'to_node__skill__key', 'optional', 'priority')
+    )
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class PackageTests(TestCase):
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.tree = Tree.objects.order_by('pk').first()
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory, 'package')
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, name), 'w') as fh:
+            for row in rows:
+                fh.write(row if isinstance(row, str) else json.dumps(row))
+                fh.write('\n')
+        return path
+
+    def test_round_trip(self):
+        for name in ('package', 'package.zip'):
+            with self.subTest(path=name):
+                path = os.path.join(self.directory, name)
+                counts = export_package(path, tree_ids=[self.tree.pk], bundle_files=False)
+                self.assertEqual(counts['trees.jsonl'], 1)
+                self.assertEqual(counts['nodes.jsonl'], self.tree.nodes.count())
+
+                skills = Skill.objects.count()
+                summary = import_package(path)
+                # Same keys, same content: the skills are matched, not copied
+                self.assertEqual((summary['skills_created'], summary['skills_updated']), (0, 0))
+                self.assertEqual(Skill.objects.count(), skills)
+                [tree_id] = summary['trees']
+                copy = Tree.objects.get(pk=tree_id)
+                self.assertEqual(copy.title, self.tree.title)
+                self.assertEqual(
+                    sorted(copy.nodes.values_list('skill_id', flat=True)),
+                    sorted(self.tree.nodes.values_list('skill_id', flat=True)),
+                )
+                self.assertEqual(graph(tree_id), graph(self.tree.pk))
+
+    def test_changed_skill_is_updated_in_place(self):
+        path = os.path.join(self.directory, 'package')
+        export_package(path, tree_ids=[self.tree.pk], bundle_files=False)
+        skill = Skill.objects.get(pk=self.tree.nodes.order_by('pk').first().skill_id)
+        Skill.objects.filter(pk=skill.pk).update(title='Edited since the export')
+        version = Tree.objects.get(pk=self.tree.pk).version
+
+        summary = import_package(path)
+        self.assertEqual((summary['skills_created'], summary['skills_updated']), (0, 1))
+        self.assertEqual(Skill.objects.get(pk=skill.pk).title, skill.title)
+        # Trees outside the package that use the skill show the new content
+        self.assertGreater(Tree.objects.get(pk=self.tree.pk).version, version)
+
+    def test_unknown_creator(self):
+        row = {'key': 'new-skill', 'title': 'New', 'video_url': 'https://example.com/v', 'creator': 'nobody'}
+        path = self.write('skills.jsonl', [row])
+        with self.assertRaisesMessage(PackageError, "Creator 'nobody' does not exist"):
+            import_package(path)
+        creator = get_user_model().objects.create_user('importer')
+        self.assertEqual(import_package(path, creator=creator)['skills_created'], 1)
+        self.assertEqual(Skill.objects.get(key='new-skill').creator, creator)
+
+    def test_errors(self):
+        with self.assertRaisesMessage(PackageError, 'is neither a directory nor a zip file'):
+            import_package(os.path.join(self.directory, 'missing.zip'))
+        with self.assertRaisesMessage(PackageError, 'skills.jsonl line 1'):
+            import_package(self.write('skills.jsonl', ['{"key": ']))
+
+        os.remove(os.path.join(self.directory, 'package', 'skills.jsonl'))
+        path = self.write('edges.jsonl', [{'from': 1, 'to': 2}])
+        with self.assertRaisesMessage(PackageError, 'unknown node'):
+            import_package(path)
+
+        os.remove(os.path.join(path, 'edges.jsonl'))
+        self.write('files.jsonl', [{'key': 'escape', 'title': 'Escape', 'path': '../outside.pdf'}])
+        with self.assertRaisesMessage(PackageError, 'points outside the package'):
+            import_package(path)
+
+    def test_clone_tree(self):
+        Tree.objects.filter(pk=self.tree.pk).update(
+            layout={'nodes': {str(pk): [pk, 0] for pk in self.tree.nodes.values_list('pk', flat=True)}},
+        )
+        copy = clone_tree(self.tree)
+        self.assertEqual(copy.title, f'{self.tree.title} (copy)')
+        self.assertEqual(graph(copy.pk), graph(self.tree.pk))
+        # The layout follows the copied nodes
+        layout = Tree.objects.get(pk=copy.pk).layout['nodes']
+        self.assertEqual(set(layout), {str(pk) for pk in Node.objects.filter(tree=copy).values_list('pk', flat=True)})
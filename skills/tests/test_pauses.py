@@ -0,0 +1,108 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..models import File, Pause, Skill
+from ..pauses import ManifestCache, manifest_cache
+
+
+class ManifestCacheTests(SimpleTestCase):
+
+    @mock.patch('skills.pauses.build_manifest', side_effect=lambda skill_id, version: f'{skill_id}v{version}')
+    def test_lru(self, build_manifest):
+        cache = ManifestCache(maxsize=2)
+        self.assertEqual(cache.get(1, 1), '1v1')
+        self.assertEqual(cache.get(2, 1), '2v1')
+        self.assertEqual(cache.get(1, 1), '1v1')
+        self.assertEqual(build_manifest.call_count, 2)
+
+        # A newer version replaces the entry
+        self.assertEqual(cache.get(1, 2), '1v2')
+        self.assertEqual(len(cache), 2)
+        # Skill 2 is the least recently used
+        cache.get(3, 1)
+        self.assertEqual(len(cache), 2)
+        cache.get(1, 2)
+        cache.get(2, 1)
+        self.assertEqual(build_manifest.call_count, 5)
+
+        cache.invalidate([1, 99])
+        cache.get(1, 2)
+        self.assertEqual(build_manifest.call_count, 6)
+
+
+class SkillPausesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = get_user_model().objects.create_user('creator', is_staff=True)
+        cls.skill = Skill.objects.create(
+            title='Skill', video_url='https://example.com/v', text='', duration=600, creator=creator,
+        )
+        cls.file = File.objects.create(file='resources/workflow.json', title='Workflow')
+        cls.url = reverse('skills:skill_pauses', args=[cls.skill.pk])
+
+    def setUp(self):
+        manifest_cache.clear()
+
+    def fetch(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def manifest(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        return response['ETag'], json.loads(response.content)
+
+    def test_manifest(self):
+        Pause.objects.create(skill=self.skill, time=90, title='Download', attachment=self.file)
+        Pause.objects.create(skill=self.skill, time=30, title='Copy', clipboard='{"a": 1}')
+        etag, manifest = self.manifest()
+        self.assertEqual(manifest['pauses'], [
+            {'time': 30, 'title': 'Copy', 'clipboard': '{"a": 1}'},
+            {'time': 90, 'title': 'Download', 'attachment_url': self.file.file.url, 'attachment_title': 'Workflow'},
+        ])
+        self.assertEqual(self.fetch(if_none_match=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('skills:skill_pauses', args=[0])).status_code, 404)
+
+    def test_pause_edits_invalidate(self):
+        etag, manifest = self.manifest()
+        self.assertEqual(manifest['pauses'], [])
+
+        pause = Pause.objects.create(skill=self.skill, time=30, title='First')
+        self.assertEqual(self.fetch(if_none_match=etag).status_code, 200)
+        etag, manifest = self.manifest()
+        self.assertEqual([p['title'] for p in manifest['pauses']], ['First'])
+
+        pause.title = 'Renamed'
+        pause.save()
+        etag, manifest = self.manifest()
+        self.assertEqual([p['title'] for p in manifest['pauses']], ['Renamed'])
+
+        pause.delete()
+        self.assertEqual(self.fetch(if_none_match=etag).status_code, 200)
+        self.assertEqual(self.manifest()[1]['pauses'], [])
+
+    def test_file_edits_invalidate(self):
+        Pause.objects.create(skill=self.skill, time=30, title='Download', attachment=self.file)
+        etag, manifest = self.manifest()
+        self.assertEqual(manifest['pauses'][0]['attachment_title'], 'Workflow')
+
+        self.file.title = 'Workflow v2'
+        self.file.save()
+        etag, manifest = self.manifest()
+        self.assertEqual(manifest['pauses'][0]['attachment_title'], 'Workflow v2')
+
+        # The pause outlives its file as a plain continue button
+        self.file.delete()
+        self.assertEqual(self.fetch(if_none_match=etag).status_code, 200)
+        self.assertEqual(self.manifest()[1]['pauses'], [{'time': 30, 'title': 'Download'}])
+
+    def test_other_workers_notice_the_bump(self):
+        self.manifest()
+        # A bump from another process leaves this one's entry behind, under the old version
+        Skill.objects.filter(pk=self.skill.pk).update(pauses_version=self.skill.pauses_version + 5)
+        Pause.objects.bulk_create([Pause(skill=self.skill, time=10, title='Bulk')])
+        self.assertEqual([p['title'] for p in self.manifest()[1]['pauses']], ['Bulk'])
@@ -0,0 +1,230 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from users.bitmaps import SkillBitmap
+
+from ..artifacts import artifact_cache, get_tree_artifacts
+from ..models import Tree, TreeProgress
+from ..ordering import rebuild_learning_order
+from ..packages import clone_tree
+from ..progress import (
+    MAX_BATCH_OPS, MAX_MERGE_SKILLS, InvalidOperation, apply_progress_ops, merge_local_progress, parse_local_progress,
+    parse_progress_ops,
+)
+from ..status import compute_status
+
+
+class ParseProgressOpsTests(SimpleTestCase):
+
+    def test_orders_by_seq(self):
+        ops = parse_progress_ops({'ops': [
+            {'node': 1, 'done': True, 'seq': 5},
+            {'node': 2, 'ignored': True, 'seq': 2},
+        ]})
+        self.assertEqual([op['node'] for op in ops], [2, 1])
+        self.assertEqual(ops[1], {'node': 1, 'done': True, 'ignored': None, 'seq': 5})
+
+    def test_seq_defaults_to_index(self):
+        ops = parse_progress_ops({'ops': [{'node': 3, 'done': False}, {'node': 4, 'done': True}]})
+        self.assertEqual([(op['node'], op['seq']) for op in ops], [(3, 0), (4, 1)])
+
+    def test_rejects_malformed(self):
+        payloads = [
+            None, [], {'ops': {}}, {'ops': [1]},
+            {'ops': [{'node': '1', 'done': True}]},
+            {'ops': [{'node': True, 'done': True}]},
+            {'ops': [{'node': 1.5, 'done': True}]},
+            {'ops': [{'node': 1}]},
+            {'ops': [{'node': 1, 'done': 1}]},
+            {'ops': [{'node': 1, 'done': True, 'ignored': True}]},
+            {'ops': [{'node': 1, 'done': True, 'seq': False}]},
+            {'ops': [{'node': 1, 'done': True, 'seq': '1'}]},
+            {'ops': [{'node': 1, 'done': True}] * (MAX_BATCH_OPS + 1)},
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload if payload is None or len(str(payload)) < 80 else 'too many'):
+                with self.assertRaises(InvalidOperation):
+                    parse_progress_ops(payload)
+
+
+class ParseLocalProgressTests(SimpleTestCase):
+
+    def test_parses(self):
+        parsed = parse_local_progress({'trees': {'3': {'completed': [1, 2, 2], 'ignored': [5]}, '4': {}}})
+        self.assertEqual(parsed, {3: ({1, 2}, {5}), 4: (set(), set())})
+
+    def test_rejects_malformed(self):
+        payloads = [
+            None, {'trees': []},
+            {'trees': {'x': {}}},
+            {'trees': {'1': []}},
+            {'trees': {'1': {'completed': 1}}},
+            {'trees': {'1': {'completed': ['1']}}},
+            {'trees': {'1': {'ignored': [True]}}},
+            {'trees': {'1': {'completed': list(range(MAX_MERGE_SKILLS + 1))}}},
+        ]
+        for payload in payloads:
+            with self.subTest(payload=str(payload)[:80]):
+                with self.assertRaises(InvalidOperation):
+                    parse_local_progress(payload)
+
+
+class ProgressTestCase(TestCase):
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        artifact_cache.clear()
+        self.user = get_user_model().objects.create_user('learner')
+        # The fixture has no stored learning order
+        self.tree = Tree.objects.order_by('pk').first()
+        rebuild_learning_order(self.tree.pk, background_layout=False)
+        self.sequence = get_tree_artifacts([Tree.objects.get(pk=self.tree.pk)])[self.tree.pk].sequence
+
+    def apply(self, *ops):
+        self.user = get_user_model().objects.get(pk=self.user.pk)
+        return apply_progress_ops(self.user, [
+            {'node': node_id, 'done': done, 'ignored': ignored, 'seq': seq}
+            for seq, (node_id, done, ignored) in enumerate(ops)
+        ])
+
+    def row(self, tree=None):
+        return TreeProgress.objects.get(user=self.user, tree=tree or self.tree)
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class TreeProgressTests(ProgressTestCase):
+
+    def assert_row_matches_status_engine(self, tree):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        row = self.row(tree)
+        artifact = get_tree_artifacts([Tree.objects.get(pk=tree.pk)])[tree.pk]
+        status = compute_status(artifact, user.completed_skill_set(), user.ignored_skill_set(), row.last_node_id)
+        self.assertEqual(
+            (row.completed_nodes, row.total_nodes, row.next_node_id, row.tree_version),
+            (status.completed_count, len(artifact.sequence), status.next_node_id, artifact.version),
+        )
+
+    def test_counters_follow_changes(self):
+        first, second, third = self.sequence[:3]
+        self.apply((first, True, None), (second, True, None))
+        row = self.row()
+        # Several nodes can teach the same skill, so at least two are done
+        self.assertGreaterEqual(row.completed_nodes, 2)
+        self.assertEqual(row.last_node_id, second)
+        self.assert_row_matches_status_engine(self.tree)
+
+        self.apply((third, None, True))
+        self.assert_row_matches_status_engine(self.tree)
+        self.apply((first, False, None))
+        self.assertLess(self.row().completed_nodes, row.completed_nodes)
+        self.assert_row_matches_status_engine(self.tree)
+
+    def test_cursor_follows_last_node(self):
+        first, second = self.sequence[:2]
+        self.apply((first, True, None), (second, True, None))
+        # Marking an already completed skill done again still moves the cursor
+        self.apply((first, True, None))
+        self.assertEqual(self.row().last_node_id, first)
+        self.assertEqual(self.user.last_node_id, first)
+
+        # Only an explicit undo clears it
+        self.apply((second, False, None))
+        self.assertIsNone(self.row().last_node_id)
+        self.assertIsNone(get_user_model().objects.get(pk=self.user.pk).last_node_id)
+
+    def test_ignore_leaves_cursor(self):
+        first, second = self.sequence[:2]
+        self.apply((first, True, None))
+        self.apply((second, None, True))
+        self.assertEqual(self.row().last_node_id, first)
+
+    def test_shared_skill_updates_every_tree(self):
+        copy = clone_tree(self.tree)
+        rebuild_learning_order(copy.pk, background_layout=False)
+        self.apply((self.sequence[0], True, None))
+        copy_row = self.row(copy)
+        self.assertEqual(copy_row.completed_nodes, self.row().completed_nodes)
+        # The cursor only moves in the tree that was acted on
+        self.assertIsNone(copy_row.last_node_id)
+        self.assert_row_matches_status_engine(copy)
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class ApplyProgressOpsTests(ProgressTestCase):
+
+    def stored_sets(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        m2m = (
+            set(user.completed_skills.values_list('id', flat=True)),
+            set(user.ignored_skills.values_list('id', flat=True)),
+        )
+        bitmaps = (
+            set(SkillBitmap.from_bytes(user.completed_skills_bitmap)),
+            set(SkillBitmap.from_bytes(user.ignored_skills_bitmap)),
+        )
+        self.assertEqual(bitmaps, m2m)
+        return m2m
+
+    def test_batch(self):
+        first, second, third = self.sequence[:3]
+        skill_of = dict(self.tree.nodes.values_list('id', 'skill_id'))
+        result = self.apply(
+            (first, True, None), (second, None, True), (third, True, None), (second, True, None), (0, True, None),
+        )
+        self.assertEqual(result['seq'], 4)
+        self.assertEqual(result['unknown'], [0])
+        self.assertEqual(
+            {state['node_id']: (state['done'], state['ignored']) for state in result['states']},
+            {first: (True, False), second: (True, False), third: (True, False)},
+        )
+        self.assertEqual(self.stored_sets(), ({skill_of[first], skill_of[second], skill_of[third]}, set()))
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).last_node_id, second)
+
+        # Ignoring a done skill un-completes it; undo clears last_node
+        self.apply((first, None, True), (third, False, None))
+        self.assertEqual(self.stored_sets(), ({skill_of[second]}, {skill_of[first]}))
+        self.assertIsNone(get_user_model().objects.get(pk=self.user.pk).last_node_id)
+
+    def test_one_user_update_per_batch(self):
+        ops = [(node_id, True, None) for node_id in self.sequence[:5]] + [(self.sequence[5], None, True)]
+        with CaptureQueriesContext(connection) as queries:
+            self.apply(*ops)
+        statements = [query['sql'] for query in queries]
+        user_updates = [sql for sql in statements if sql.startswith('UPDATE "users_user"')]
+        self.assertEqual(len(user_updates), 1)
+        # Only the batch's own transaction: no nested savepoints for the bitmap writes
+        self.assertEqual(sum(sql.startswith('SAVEPOINT') for sql in statements), 1)
+        self.stored_sets()
+
+    def test_unchanged_batch_writes_nothing(self):
+        self.apply((self.sequence[0], True, None))
+        with CaptureQueriesContext(connection) as queries:
+            self.apply((self.sequence[0], None, False))
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "users_user"')])
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class MergeLocalProgressTests(ProgressTestCase):
+
+    def test_server_wins(self):
+        skill_of = dict(self.tree.nodes.values_list('id', 'skill_id'))
+        first, second, third, fourth = [skill_of[node_id] for node_id in self.sequence[:4]]
+        self.apply((self.sequence[0], None, True))
+
+        self.user = get_user_model().objects.get(pk=self.user.pk)
+        result = merge_local_progress(self.user, {
+            # first is ignored on the server and stays so; the unknown skill and tree are dropped
+            self.tree.pk: ({first, second, 10 ** 6}, {third, second}),
+            0: ({fourth}, set()),
+        })
+        self.assertEqual(result['completed'], [second])
+        self.assertEqual(result['ignored'], [third])
+        self.assertEqual(result['unknown_trees'], [0])
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(set(user.completed_skill_set()), {second})
+        self.assertEqual(set(user.ignored_skill_set()), {first, third})
+        in_sequence = self.tree.nodes.filter(skill_id=second, position__isnull=False)
+        self.assertEqual(self.row().completed_nodes, in_sequence.count())
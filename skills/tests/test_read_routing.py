@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from skilltrees.db import READ_ALIAS, ReadWriteRouter
+
+from ..artifacts import artifact_cache
+from ..models import Tree
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class ReadMirrorTests(TestCase):
+    databases = '__all__'
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        artifact_cache.clear()
+        self.tree = Tree.objects.order_by('pk').first()
+
+    def test_mirror_sees_the_test_transaction(self):
+        tree = Tree.objects.create(title='New', description='', goal_skill=self.tree.goal_skill)
+        self.assertTrue(Tree.objects.using(READ_ALIAS).filter(pk=tree.pk).exists())
+
+    def test_tree_detail(self):
+        url = reverse('skills:tree_detail', args=[self.tree.pk])
+        self.assertContains(self.client.get(url), self.tree.title)
+        self.client.force_login(get_user_model().objects.create_user('learner'))
+        self.assertContains(self.client.get(url), self.tree.title)
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class ReadRoutingTests(TransactionTestCase):
+    # Not TestCase: inside its transaction every read stays on "default"
+    databases = '__all__'
+    fixtures = ['initial_data']
+
+    def setUp(self):
+        artifact_cache.clear()
+        self.tree = Tree.objects.order_by('pk').first()
+        self.client.force_login(get_user_model().objects.create_user('learner'))
+
+    def read_aliases(self, url):
+        aliases = []
+        db_for_read = ReadWriteRouter.db_for_read
+
+        def recording(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            aliases.append((model._meta.label, alias))
+            return alias
+
+        ReadWriteRouter.db_for_read = recording
+        try:
+            response = self.client.get(url)
+        finally:
+            ReadWriteRouter.db_for_read = db_for_read
+        self.assertEqual(response.status_code, 200)
+        return aliases
+
+    def test_read_only_views_use_the_read_alias(self):
+        for name in ('skills:tree_detail', 'skills:tree_structure'):
+            with self.subTest(view=name):
+                artifact_cache.clear()
+                aliases = self.read_aliases(reverse(name, args=[self.tree.pk]))
+                self.assertIn(('skills.Tree', READ_ALIAS), aliases)
+
+    def test_other_views_use_default(self):
+        aliases = self.read_aliases(reverse('skills:tree_progress', args=[self.tree.pk]))
+        self.assertTrue(aliases)
+        self.assertNotIn(READ_ALIAS, {alias for _, alias in aliases})
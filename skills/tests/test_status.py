@@ -0,0 +1,92 @@
+import random
+
+from django.test import SimpleTestCase
+
+from ..artifacts import TreeArtifact
+from ..status import DONE, HEX_DIGITS, IGNORED, NEXT, SKIPPED, compute_status
+
+
+def baseline_flags(node_ids, node_skill, sequence, completed, ignored, last_node_id):
+    """Per-node flags as the original tree_detail view computed them."""
+    position = -1
+    if last_node_id and last_node_id in sequence:
+        position = sequence.index(last_node_id)
+    else:
+        for i, node_id in enumerate(sequence):
+            if node_skill[node_id] in completed:
+                position = i
+
+    next_node_id = None
+    for i in range(position + 1, len(sequence)):
+        if node_skill[sequence[i]] not in completed:
+            next_node_id = sequence[i]
+            break
+
+    flags = {}
+    for node_id in node_ids:
+        done = node_skill[node_id] in completed
+        is_ignored = node_skill[node_id] in ignored
+        is_next = node_id == next_node_id
+        flags[node_id] = {
+            'done': done,
+            'ignored': is_ignored,
+            'next': is_next,
+            'skipped': not done and not is_ignored and node_id in sequence[:position + 1] and not is_next,
+        }
+    return flags
+
+
+def make_artifact(node_ids, node_skill, sequence):
+    return TreeArtifact(
+        tree_id=1, version=1, node_ids=node_ids, node_skill=node_skill, edges=[],
+        goal_node_id=sequence[-1] if sequence else None, sequence=sequence,
+        sequence_items=[], skills={'ids': [], 'names': [], 'videos': []}, layout={},
+    )
+
+
+def packed(flags):
+    bits = (DONE if flags['done'] else 0) | (IGNORED if flags['ignored'] else 0)
+    bits |= (NEXT if flags['next'] else 0) | (SKIPPED if flags['skipped'] else 0)
+    return HEX_DIGITS[bits]
+
+
+class ComputeStatusTests(SimpleTestCase):
+
+    def test_matches_baseline(self):
+        rng = random.Random(4)
+        for _ in range(500):
+            size = rng.randint(0, 30)
+            node_ids = list(range(100, 100 + size))
+            # Some skills appear in several nodes, and some nodes are outside the learning order
+            node_skill = {node_id: rng.randint(1, max(size // 2, 1)) for node_id in node_ids}
+            sequence = rng.sample(node_ids, rng.randint(0, size))
+            skills = list(set(node_skill.values())) + [999]
+            completed = set(rng.sample(skills, rng.randint(0, len(skills))))
+            ignored = set(rng.sample(skills, rng.randint(0, len(skills)))) - completed
+            last_node_id = rng.choice(node_ids + [None, 1]) if node_ids else None
+
+            expected = baseline_flags(node_ids, node_skill, sequence, completed, ignored, last_node_id)
+            status = compute_status(make_artifact(node_ids, node_skill, sequence), completed, ignored, last_node_id)
+            for node_id in node_ids:
+                self.assertEqual(status.node_flags(node_id), expected[node_id])
+            self.assertEqual(status.packed_flags(), ''.join(packed(expected[node_id]) for node_id in node_ids))
+            self.assertEqual(
+                status.completed_count, sum(node_skill[node_id] in completed for node_id in sequence),
+            )
+
+    def test_resume_from_last_node(self):
+        node_skill = {1: 10, 2: 20, 3: 30, 4: 40}
+        artifact = make_artifact([1, 2, 3, 4], node_skill, [1, 2, 3, 4])
+        status = compute_status(artifact, {10, 30}, {20}, last_node_id=3)
+        self.assertEqual(status.position, 2)
+        self.assertEqual(status.next_node_id, 4)
+        # 2 is ignored, so nothing was skipped
+        self.assertEqual(status.skipped_node_ids, [])
+        self.assertEqual((status.completed_count, status.total, status.percent), (2, 4, 50))
+
+    def test_without_cursor_resumes_after_last_completed(self):
+        artifact = make_artifact([1, 2, 3], {1: 10, 2: 20, 3: 30}, [1, 2, 3])
+        status = compute_status(artifact, {20}, set())
+        self.assertEqual(status.next_node_id, 3)
+        self.assertEqual(status.skipped_node_ids, [1])
+        self.assertEqual(status.packed_flags(), '814')
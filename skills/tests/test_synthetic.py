@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Edge, Node, ProgressEvent, Skill, Tree, TreeProgress
+from ..synthetic import delete_synthetic, generate
+
+
+@override_settings(TREE_LAYOUT_BACKGROUND=False)
+class DeleteSyntheticTests(TestCase):
+    fixtures = ['initial_data']
+
+    def test_removes_only_synthetic_data(self):
+        before = {model: model.objects.count() for model in (Tree, Node, Edge, Skill)}
+        summary = generate(trees=2, nodes=40, users=3, seed=3)
+        node = Node.objects.filter(tree_id=summary['trees'][0]).first()
+        learner = get_user_model().objects.create_user('learner', last_node=node)
+        TreeProgress.objects.create(user=learner, tree_id=node.tree_id, last_node=node)
+        # An event on a kept skill outlives the synthetic node it was recorded on
+        ProgressEvent.objects.create(
+            user=learner, skill=Skill.objects.order_by('pk').first(), node=node, kind=ProgressEvent.Kind.COMPLETED,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(delete_synthetic(), 2)
+        # Chunked deletes, not a version bump and rebuild per node and edge
+        self.assertLess(len(queries), summary['nodes'])
+
+        self.assertEqual({model: model.objects.count() for model in (Tree, Node, Edge, Skill)}, before)
+        self.assertFalse(get_user_model().objects.filter(username__startswith='synthetic-').exists())
+        learner.refresh_from_db()
+        self.assertIsNone(learner.last_node_id)
+        self.assertFalse(TreeProgress.objects.filter(user=learner).exists())
+        self.assertIsNone(ProgressEvent.objects.get(user=learner).node_id)
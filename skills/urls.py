@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -7,6 +8,15 @@ app_name = 'skills'
 urlpatterns = [
     path('', views.homepage, name='homepage'),
     path('tree/<int:pk>/', views.tree_detail, name='tree_detail'),
+    path('tree/<int:pk>/structure/', views.tree_structure, name='tree_structure'),
+    path('tree/<int:pk>/progress/', views.tree_progress, name='tree_progress'),
+    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/api/', views.dashboard_api, name='dashboard_api'),
+    path('progress/batch/', views.progress_batch, name='progress_batch'),
+    path('progress/merge/', views.progress_merge, name='progress_merge'),
+    path('skill/<int:skill_id>/pauses/', views.skill_pauses, name='skill_pauses'),
+    path('skill/<int:skill_id>/heartbeat/', views.video_heartbeat, name='video_heartbeat'),
     path('node/<int:node_id>/toggle/', views.toggle_skill, name='toggle_skill'),
     path('node/<int:node_id>/ignore/', views.toggle_ignore, name='toggle_ignore'),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', views.resource_file, name='resource_file'),
 ]
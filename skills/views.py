@@ -1,52 +1,38 @@
 import json
 
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, render
-from django.views.decorators.http import require_POST
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_POST, require_safe
 
-from .models import Node, Skill, Tree
+from skilltrees.db import db_sync_to_async, use_read_database
+from skilltrees.timing import query_budget
 
+from .artifacts import STRUCTURE_FORMAT, get_tree_artifact
+from .dashboard import dashboard_rows
+from .events import progress_tail, resume_node_id
+from .heartbeat import arecord_heartbeat, parse_position
+from .media import serve_resource
+from .metrics import progress_writes
+from .models import Node, Skill, Tree, TreeProgress
+from .pauses import manifest_cache, manifest_etag
+from .progress import (
+    InvalidOperation, apply_progress_ops, merge_local_progress, parse_local_progress, parse_progress_ops,
+)
+from .status import compute_status
 
-def compute_dfs_sequence(nodes, goal_node):
-    """
-    Compute DFS sequence from goal node.
-    - Traverse prerequisites with priorities reversed (highest priority first in DFS)
-    - Reverse the final list to get learning order
-    """
-    node_by_id = {n.id: n for n in nodes}
-    
-    # Build adjacency: node_id -> list of (prereq_node_id, priority)
-    prereqs_map = {}
-    for node in nodes:
-        prereqs = []
-        for edge in node.incoming_edges.all():
-            prereqs.append((edge.from_node_id, edge.priority))
-        # Sort by priority ascending (lowest first = highest priority branch first)
-        prereqs.sort(key=lambda x: x[1])
-        prereqs_map[node.id] = [p[0] for p in prereqs]
-    
-    # DFS from goal
-    sequence = []
-    visited = set()
-    
-    def dfs(node_id):
-        if node_id in visited:
-            return
-        visited.add(node_id)
-        for prereq_id in prereqs_map.get(node_id, []):
-            dfs(prereq_id)
-        sequence.append(node_id)
-    
-    dfs(goal_node.id)
-    
-    # Post-order gives correct sequence: leaves first, goal last
-    return sequence
+# Versioned structure URLs never change content, so browsers may keep them for a year
+STRUCTURE_MAX_AGE = 60 * 60 * 24 * 365
 
 
+@query_budget(4)
+@use_read_database
 def homepage(request):
     """Homepage with carousel of all skill trees."""
     # Order: strudel previews first, then animations
-    trees = Tree.objects.all().order_by('-preview_type')
+    # The stored layout can be hundreds of KB per tree and only the structure endpoint uses it
+    trees = Tree.objects.defer('layout').order_by('-preview_type')
     trees_data = []
     for t in trees:
         trees_data.append({
@@ -63,176 +49,228 @@ def homepage(request):
     })
 
 
-def tree_detail(request, pk):
-    tree = get_object_or_404(Tree, pk=pk)
-    nodes = list(tree.nodes.select_related('skill').prefetch_related(
-        'incoming_edges__from_node',
-        'outgoing_edges__to_node',
-        'skill__pauses',
-    ))
-    
-    node_by_id = {n.id: n for n in nodes}
-    node_ids = set(node_by_id.keys())
-
-    # Find goal node
-    goal_node = None
-    for node in nodes:
-        outgoing_ids = {e.to_node_id for e in node.outgoing_edges.all() if e.to_node_id in node_ids}
-        if not outgoing_ids:
-            goal_node = node
-            break
-
-    # Get user's completed/ignored skills and last node
-    completed_skill_ids = set()
-    ignored_skill_ids = set()
-    last_node_id = None
-    if request.user.is_authenticated:
-        completed_skill_ids = set(request.user.completed_skills.values_list('id', flat=True))
-        ignored_skill_ids = set(request.user.ignored_skills.values_list('id', flat=True))
-        if request.user.last_node_id:
-            last_node_id = request.user.last_node_id
-
-    # Compute DFS sequence
-    sequence = []
-    if goal_node:
-        sequence = compute_dfs_sequence(nodes, goal_node)
-
-    # Find position in sequence based on last_node (the node user manually clicked)
-    position = -1
-    if last_node_id and last_node_id in sequence:
-        position = sequence.index(last_node_id)
-    else:
-        # Fallback: find last completed node in sequence
-        for i, node_id in enumerate(sequence):
-            node = node_by_id[node_id]
-            if node.skill_id in completed_skill_ids:
-                position = i
-
-    # Determine "next" node (first non-done after position)
-    next_node_id = None
-    for i in range(position + 1, len(sequence)):
-        node_id = sequence[i]
-        node = node_by_id[node_id]
-        if node.skill_id not in completed_skill_ids:
-            next_node_id = node_id
-            break
-
-    # Build sequence data for sidebar
-    sequence_data = []
-    for i, node_id in enumerate(sequence):
-        node = node_by_id[node_id]
-        is_done = node.skill_id in completed_skill_ids
-        is_ignored = node.skill_id in ignored_skill_ids
-        is_next = node_id == next_node_id
-        is_skipped = not is_done and not is_ignored and i < position + 1 and not is_next
-        
-        sequence_data.append({
-            'node_id': f'n{node_id}',
-            'skill_id': node.skill_id,
-            'name': node.skill.title,
-            'done': is_done,
-            'ignored': is_ignored,
-            'next': is_next,
-            'skipped': is_skipped,
-        })
-
-    # Build cytoscape elements
-    elements = []
-
-    # Add nodes
-    for node in nodes:
-        is_done = node.skill_id in completed_skill_ids
-        is_ignored = node.skill_id in ignored_skill_ids
-        is_next = node.id == next_node_id
-        is_skipped = not is_done and not is_ignored and node.id in sequence[:position + 1] and not is_next
-        
-        # Build pause data for this skill
-        pauses = []
-        for pause in node.skill.pauses.all():
-            pause_data = {
-                'time': pause.time,
-                'title': pause.title,
-            }
-            if pause.clipboard:
-                pause_data['clipboard'] = pause.clipboard
-            elif pause.attachment:
-                pause_data['attachment_url'] = pause.attachment.file.url
-                pause_data['attachment_title'] = pause.attachment.title
-            # else: just a continue button
-            pauses.append(pause_data)
-        
-        elements.append({
-            'data': {
-                'id': f'n{node.id}',
-                'name': node.skill.title,
-                'skill_id': node.skill.id,
-                'video_url': node.skill.video_url,
-                'done': is_done,
-                'ignored': is_ignored,
-                'next': is_next,
-                'skipped': is_skipped,
-                'pauses': pauses,
-            }
-        })
+def _user_skill_sets(user):
+    """Return (completed_skill_ids, ignored_skill_ids, last_node_id) for a user."""
+    if not user.is_authenticated:
+        return set(), set(), None
+    return user.completed_skill_set(), user.ignored_skill_set(), resume_node_id(user)
 
-    # Add edges
-    for node in nodes:
-        for edge in node.incoming_edges.all():
-            elements.append({
-                'data': {
-                    'source': f'n{edge.from_node_id}',
-                    'target': f'n{node.id}',
-                }
-            })
 
+@query_budget(4)
+@use_read_database
+async def tree_detail(request, pk):
+    """Page shell; graph and progress are loaded from the JSON endpoints below."""
+    tree = await aget_object_or_404(Tree.objects.defer('layout'), pk=pk)
+    user = await request.auser()
     context = {
         'tree': tree,
-        'elements_json': json.dumps(elements),
-        'sequence_json': json.dumps(sequence_data),
-        'is_authenticated': request.user.is_authenticated,
+        'structure_url': reverse('skills:tree_structure', args=[tree.pk]),
+        'structure_format': STRUCTURE_FORMAT,
+        'progress_url': reverse('skills:tree_progress', args=[tree.pk]),
+        'batch_url': reverse('skills:progress_batch'),
+        'merge_url': reverse('skills:progress_merge'),
+        'pauses_url': reverse('skills:skill_pauses', args=[0]),
+        'heartbeat_url': reverse('skills:video_heartbeat', args=[0]),
+        'is_authenticated': user.is_authenticated,
     }
     return render(request, 'skills/tree_detail.html', context)
 
 
-@require_POST
-def toggle_skill(request, node_id):
-    """Toggle a skill's completion status for the current user."""
+@query_budget(5)
+@use_read_database
+def tree_structure(request, pk):
+    """
+    User-independent graph of a tree, identical for every visitor.
+    Requests carrying the current `?v=<version>` are cacheable forever; the
+    page adds `&f=<format>` so a new payload format gets new URLs.
+    """
+    tree = get_object_or_404(Tree.objects.only('id', 'version'), pk=pk)
+    etag = f'"tree-{tree.pk}-v{tree.version}-f{STRUCTURE_FORMAT}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        artifact = get_tree_artifact(tree)
+        response = HttpResponse(artifact.structure_json, content_type='application/json')
+    response['ETag'] = etag
+    if request.GET.get('v') == str(tree.version):
+        patch_cache_control(response, public=True, max_age=STRUCTURE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@query_budget(3)
+@use_read_database
+def skill_pauses(request, skill_id):
+    """
+    Pause manifest of one skill, fetched when the player opens its video.
+    Revalidated with the ETag, which changes with `Skill.pauses_version`.
+    """
+    version = Skill.objects.filter(pk=skill_id).values_list('pauses_version', flat=True).first()
+    if version is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    etag = manifest_etag(skill_id, version)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(manifest_cache.get(skill_id, version), content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@query_budget(0)
+@require_safe
+def resource_file(request, path):
+    """An uploaded resource or tree zip, with conditional and range requests (see skills.media)."""
+    return serve_resource(request, path)
+
+
+@query_budget(8)
+def tree_progress(request, pk):
+    """
+    Compact per-user state for one tree: packed state bits per node of the
+    structure's version. The bits cover every node, so this runs the status
+    engine; the TreeProgress rows serve the dashboard's counts and resume.
+    """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Not authenticated'}, status=401)
 
-    node = get_object_or_404(Node, pk=node_id)
-    skill = node.skill
+    tree = get_object_or_404(Tree.objects.only('id', 'version'), pk=pk)
+    artifact = get_tree_artifact(tree)
+    completed_skill_ids, ignored_skill_ids, last_node_id = _user_skill_sets(request.user)
+    # Prefer this tree's own resume cursor over the global last node
+    row = TreeProgress.objects.filter(user=request.user, tree=tree).only('last_node').first()
+    if row is not None:
+        last_node_id = row.last_node_id
+    last_node_id = progress_tail(request.user).cursors.get(tree.pk, last_node_id)
+    status = compute_status(artifact, completed_skill_ids, ignored_skill_ids, last_node_id)
 
-    if skill in request.user.completed_skills.all():
-        request.user.completed_skills.remove(skill)
-        request.user.last_node = None
-        done = False
-    else:
-        request.user.completed_skills.add(skill)
-        request.user.last_node = node
-        done = True
-    
-    request.user.save()
+    response = JsonResponse({
+        'format': STRUCTURE_FORMAT,
+        'version': artifact.version,
+        'flags': status.packed_flags(),
+    })
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+@query_budget(11)
+def dashboard(request):
+    """Progress and next step across every tree."""
+    rows = dashboard_rows(request.user) if request.user.is_authenticated else []
+    return render(request, 'skills/dashboard.html', {
+        'rows': rows,
+        'is_authenticated': request.user.is_authenticated,
+    })
 
-    return JsonResponse({'skill_id': skill.id, 'node_id': node.id, 'done': done})
 
+@query_budget(8)
+def dashboard_api(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    response = JsonResponse({'trees': dashboard_rows(request.user)})
+    patch_cache_control(response, private=True, no_store=True)
+    return response
 
+
+# Session, user, the user row lock, nodes, M2M writes, progress rows and a
+# cold artifact load; measured 12-13 for 1 to 31 ops across two trees
+@query_budget(14)
 @require_POST
-def toggle_ignore(request, node_id):
-    """Toggle a skill's ignored status for the current user."""
+def progress_batch(request):
+    """
+    Apply a batch of explicit set-state operations in one transaction.
+    Body: {"ops": [{"node": id, "done": bool, "ignored": bool, "seq": int}, ...]}.
+    """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Not authenticated'}, status=401)
+    try:
+        ops = parse_progress_ops(json.loads(request.body or b'null'))
+    except (json.JSONDecodeError, InvalidOperation) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    progress_writes.inc(len(ops), kind='batch_op')
+    return JsonResponse(apply_progress_ops(request.user, ops))
 
-    node = get_object_or_404(Node, pk=node_id)
-    skill = node.skill
 
-    if skill in request.user.ignored_skills.all():
-        request.user.ignored_skills.remove(skill)
-        ignored = False
-    else:
-        request.user.ignored_skills.add(skill)
-        # Also remove from completed if ignoring
-        request.user.completed_skills.remove(skill)
-        ignored = True
+# Measured 15 with a cold artifact cache
+@query_budget(16)
+@require_POST
+def progress_merge(request):
+    """
+    Fold progress kept in localStorage before signing in into the account.
+    Body: {"trees": {"<tree_id>": {"completed": [skill_id, ...], "ignored": [...]}}}.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    try:
+        local = parse_local_progress(json.loads(request.body or b'null'))
+    except (json.JSONDecodeError, InvalidOperation) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    progress_writes.inc(kind='merge')
+    return JsonResponse(merge_local_progress(request.user, local))
+
+
+# Session and user; a write-through flush adds its own four
+@query_budget(6)
+@require_POST
+async def video_heartbeat(request, skill_id):
+    """
+    Report the player position for a skill's video. Buffered in memory and
+    written in batches, so this does not touch the database unless the
+    buffer writes through (HEARTBEAT_FLUSH_SECONDS=0).
+    Body: {"position": seconds}.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    try:
+        position = parse_position(request.body)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    await arecord_heartbeat(user.pk, skill_id, position)
+    return HttpResponse(status=204)
+
+
+def _toggle(user, node, field):
+    """Flip `field` ('done' or 'ignored') of the node's skill; returns the new value."""
+    skill_ids = user.completed_skill_set() if field == 'done' else user.ignored_skill_set()
+    value = node.skill_id not in skill_ids
+    op = {'node': node.id, 'done': None, 'ignored': None, 'seq': 0}
+    op[field] = value
+    apply_progress_ops(user, [op])
+    return value
+
+
+# Measured 13, or 14 when the toggle also clears an ignore or the skill is in
+# four trees, with a cold artifact cache
+@query_budget(15)
+@require_POST
+async def toggle_skill(request, node_id):
+    """Toggle a skill's completion status for the current user."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+    node = await aget_object_or_404(Node.objects.only('id', 'skill_id'), pk=node_id)
+    # The write is transactional, which the async ORM does not support
+    done = await db_sync_to_async(_toggle)(user, node, 'done')
+    progress_writes.inc(kind='toggle')
+
+    return JsonResponse({'skill_id': node.skill_id, 'node_id': node.id, 'done': done})
+
+
+# Measured 7, or 14 when ignoring a completed skill updates the progress rows
+@query_budget(15)
+@require_POST
+async def toggle_ignore(request, node_id):
+    """Toggle a skill's ignored status for the current user."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+    node = await aget_object_or_404(Node.objects.only('id', 'skill_id'), pk=node_id)
+    ignored = await db_sync_to_async(_toggle)(user, node, 'ignored')
+    progress_writes.inc(kind='ignore')
 
-    return JsonResponse({'skill_id': skill.id, 'node_id': node.id, 'ignored': ignored})
+    return JsonResponse({'skill_id': node.skill_id, 'node_id': node.id, 'ignored': ignored})
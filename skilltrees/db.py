@@ -0,0 +1,121 @@
+"""
+SQLite engine profile and read/write routing.
+
+`sqlite_database` builds a DATABASES entry with persistent connections that
+runs the production pragmas on every new connection (WAL journaling, NORMAL
+sync, memory-mapped reads, a busy timeout) and starts write transactions with
+BEGIN IMMEDIATE, so concurrent writers queue on the busy timeout instead of
+failing with "database is locked" when a read transaction tries to upgrade.
+
+`db_sync_to_async` runs ORM work of async views on a pool thread of its own,
+so one request waiting on the write lock does not block the worker's others.
+
+`ReadWriteRouter` sends the reads of views wrapped in `use_read_database` to
+the "read" alias: a second connection to the same file (WAL readers never wait
+for the writer) or a replica file. Everything else uses "default".
+"""
+import contextvars
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.db import close_old_connections, connections
+
+READ_ALIAS = 'read'
+
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def sqlite_database(name, tuned=True, read_only=False, busy_timeout=20, conn_max_age=0):
+    """DATABASES entry for an SQLite file; `tuned=False` gives Django's stock settings."""
+    database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name}
+    # Only shared-cache connections take table locks, and the test runner's
+    # in-memory database is the one place this app uses them: there the read
+    # mirror must read past the open transaction of "default" instead of
+    # failing with "database table is locked"
+    read_pragmas = ['PRAGMA read_uncommitted=1'] if read_only else []
+    if not tuned:
+        if read_pragmas:
+            database['OPTIONS'] = {'init_command': ';'.join(read_pragmas)}
+        return database
+    pragmas = PRAGMAS + read_pragmas
+    options = {'timeout': busy_timeout}
+    if read_only:
+        pragmas.append('PRAGMA query_only=1')
+    else:
+        options['transaction_mode'] = 'IMMEDIATE'
+    options['init_command'] = ';'.join(pragmas)
+    database.update({'OPTIONS': options, 'CONN_MAX_AGE': conn_max_age, 'CONN_HEALTH_CHECKS': True})
+    return database
+
+
+def db_sync_to_async(func):
+    """
+    sync_to_async with thread_sensitive=False: the call gets a thread from the
+    default executor instead of the single thread all of a worker's
+    thread-sensitive calls share, so a transaction waiting on the SQLite write
+    lock only holds that thread. Like channels' database_sync_to_async, the
+    thread's expired or broken connections are closed around the call, since
+    the request signals that normally do it fire on another thread.
+    """
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(inner, thread_sensitive=False)
+
+
+_use_read = contextvars.ContextVar('use_read_database', default=False)
+
+
+def use_read_database(view):
+    """Route the ORM reads of a read-only view (sync or async) to the read connection."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _use_read.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_read.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _use_read.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_read.reset(token)
+    return wrapper
+
+
+class ReadWriteRouter:
+
+    def db_for_read(self, model, **hints):
+        if (
+            _use_read.get()
+            and READ_ALIAS in connections.settings
+            and not connections['default'].in_atomic_block
+        ):
+            return READ_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
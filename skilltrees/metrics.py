@@ -0,0 +1,399 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in a process-local registry. With a
+single process, `/metrics` renders the registry directly. Gunicorn workers
+cannot see each other's memory, so when METRICS_DIR is set every worker also
+writes its registry to `<METRICS_DIR>/<pid>.json` every METRICS_FLUSH_SECONDS
+and at exit, and `/metrics` adds up all files: counters and histograms are
+summed (dead workers keep counting, like a restarted counter would), gauges
+are combined by their `mode` ("max", "livesum" over workers still alive, or
+"last": the most recent set() in any worker). Clear METRICS_DIR when the
+server starts.
+
+`/metrics` needs "Authorization: Bearer <METRICS_TOKEN>" when the token is
+set, and a staff session otherwise.
+
+`MetricsMiddleware` records the latency of every request by view; other
+modules register their own metrics with `counter`, `gauge` and `histogram`.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .timing import view_label
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class Metric:
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def describe(self):
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labels)}
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {**self.describe(), 'samples': samples}
+
+
+class Counter(Metric):
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), mode='max'):
+        super().__init__(name, documentation, labels)
+        self.mode = mode
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # "last" gauges keep when they were set, to pick the latest across workers
+            self._values[key] = (value, time.time()) if self.mode == 'last' else value
+
+    def describe(self):
+        return {**super().describe(), 'mode': self.mode}
+
+    def snapshot(self):
+        if self.mode != 'last':
+            return super().snapshot()
+        with self._lock:
+            samples = [[list(key), value, updated] for key, (value, updated) in self._values.items()]
+        return {**self.describe(), 'samples': samples}
+
+
+class Histogram(Metric):
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                sample = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][i] += 1
+                    break
+            sample['sum'] += value
+            sample['count'] += 1
+
+    def describe(self):
+        return {**super().describe(), 'buckets': list(self.buckets)}
+
+    def snapshot(self):
+        with self._lock:
+            samples = [
+                [list(key), {**value, 'buckets': list(value['buckets'])}] for key, value in self._values.items()
+            ]
+        return {**self.describe(), 'samples': samples}
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Return the metric registered under this name, registering `metric` if there is none."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labels != metric.labels:
+            raise ValueError(f'Metric {metric.name} is already registered differently')
+        return existing
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+registry = Registry()
+
+
+def counter(name, documentation, labels=()):
+    return registry.register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=(), mode='max'):
+    return registry.register(Gauge(name, documentation, labels, mode))
+
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, documentation, labels, buckets))
+
+
+request_duration = histogram(
+    'skilltrees_request_duration_seconds', 'Request latency by view', ['view', 'method', 'status'],
+)
+db_lock_wait = histogram(
+    'skilltrees_db_lock_wait_seconds', 'Time spent starting write transactions (waiting for the SQLite lock)',
+    ['alias'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 20.0),
+)
+db_lock_errors = counter(
+    'skilltrees_db_lock_errors_total', 'Statements that failed with "database is locked"', ['alias'],
+)
+
+
+def record_lock_wait(execute, sql, params, many, context):
+    alias = context['connection'].alias
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as exc:
+        if 'locked' in str(exc):
+            db_lock_errors.inc(alias=alias)
+        raise
+    finally:
+        # BEGIN IMMEDIATE (see skilltrees.db) is where writers queue for the lock
+        if sql.startswith('BEGIN'):
+            db_lock_wait.observe(time.perf_counter() - started, alias=alias)
+
+
+def install_lock_recorder(connection, **kwargs):
+    if record_lock_wait not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_lock_wait)
+
+
+connection_created.connect(install_lock_recorder)
+
+
+class MetricsMiddleware:
+    """Observe every request's latency by view (METRICS=False disables it)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if settings.METRICS_DIR:
+            flusher.ensure_started()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_func
+
+    def observe(self, request, response, started):
+        request_duration.observe(
+            time.perf_counter() - started,
+            view=view_label(getattr(request, 'metrics_view', None)) or '',
+            method=request.method,
+            status=response.status_code,
+        )
+
+
+class MetricsFlusher:
+    """Writes this worker's registry to METRICS_DIR periodically and at exit."""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as fh:
+            json.dump(registry.snapshot(), fh)
+        os.replace(temporary, path)
+
+    def _run(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            self.flush()
+
+
+flusher = MetricsFlusher()
+
+
+def collect():
+    """This process's snapshot merged with the other workers' files."""
+    snapshots = [(os.getpid(), registry.snapshot())]
+    if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+        for filename in os.listdir(settings.METRICS_DIR):
+            pid, ext = os.path.splitext(filename)
+            if ext != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, filename)) as fh:
+                    snapshots.append((int(pid), json.load(fh)))
+            except (OSError, ValueError):
+                continue
+    return merge(snapshots)
+
+
+def merge(snapshots):
+    merged = {}
+    for pid, snapshot in snapshots:
+        alive = None
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'samples': {}, 'updated': {}})
+            if metric['type'] == 'gauge' and metric.get('mode') == 'livesum':
+                if alive is None:
+                    alive = pid_alive(pid)
+                if not alive:
+                    continue
+            last = metric['type'] == 'gauge' and metric.get('mode') == 'last'
+            for labels, value, *updated in metric['samples']:
+                key = tuple(labels)
+                if last:
+                    if key not in target['updated'] or updated[0] >= target['updated'][key]:
+                        target['samples'][key] = value
+                        target['updated'][key] = updated[0]
+                    continue
+                current = target['samples'].get(key)
+                target['samples'][key] = value if current is None else combine(metric, current, value)
+    return merged
+
+
+def combine(metric, current, value):
+    if metric['type'] == 'histogram':
+        return {
+            'buckets': [a + b for a, b in zip(current['buckets'], value['buckets'])],
+            'sum': current['sum'] + value['sum'],
+            'count': current['count'] + value['count'],
+        }
+    if metric['type'] == 'gauge' and metric.get('mode') == 'max':
+        return max(current, value)
+    return current + value
+
+
+def pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render(metrics):
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f'# HELP {name} {escape_help(metric["help"])}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for key in sorted(metric['samples']):
+            labels = list(zip(metric['labels'], key))
+            value = metric['samples'][key]
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'], value['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + [("le", format_value(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels + [("le", "+Inf")])} {value["count"]}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(value["sum"])}')
+            lines.append(f'{name}_count{format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of all workers' metrics (Bearer METRICS_TOKEN, or staff without one)."""
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}')
+    else:
+        # View names, tree ids and traffic are not public
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
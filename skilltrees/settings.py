@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from .db import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,12 +48,15 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'skilltrees.metrics.MetricsMiddleware',
+    'skilltrees.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'skills.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,7 +65,7 @@ ROOT_URLCONF = 'skilltrees.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'skilltrees.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,12 +84,27 @@ WSGI_APPLICATION = 'skilltrees.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL, pragmas and BEGIN IMMEDIATE on every connection (see skilltrees.db);
+# SQLITE_TUNED=False falls back to Django's stock SQLite settings
+SQLITE_PATH = os.environ.get('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3'))
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'True') == 'True'
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20'))
+# Keep connections open per worker between requests
+DB_CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', '600'))
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': sqlite_database(
+        SQLITE_PATH, tuned=SQLITE_TUNED, busy_timeout=SQLITE_BUSY_TIMEOUT, conn_max_age=DB_CONN_MAX_AGE,
+    ),
 }
+if os.environ.get('DB_READ_ROUTING', 'True') == 'True':
+    # Read-only views read through a second connection, or a replica file
+    DATABASES['read'] = sqlite_database(
+        os.environ.get('SQLITE_READ_REPLICA', SQLITE_PATH),
+        tuned=SQLITE_TUNED, read_only=True, busy_timeout=SQLITE_BUSY_TIMEOUT, conn_max_age=DB_CONN_MAX_AGE,
+    )
+    DATABASES['read']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['skilltrees.db.ReadWriteRouter']
 
 
 # Password validation
@@ -125,10 +145,80 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Uploaded resources (File.file under resources/, Tree.resources_zip under
+# tree_resources/), served by skills.views.resource_file. MEDIA_ROOT defaults to
+# the project directory, where uploads have always been stored.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', str(BASE_DIR))
+# Hand resource bodies to the front server instead of the worker: an internal
+# nginx location aliasing MEDIA_ROOT for X-Accel-Redirect (e.g. /protected-media/),
+# or the name of an X-Sendfile style header (Apache mod_xsendfile, lighttpd)
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+# Browser cache lifetime of resource files; after it they revalidate by ETag
+MEDIA_CACHE_SECONDS = int(os.environ.get('MEDIA_CACHE_SECONDS', str(30 * 24 * 3600)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Read users' completed/ignored skills from packed bitmap columns instead of the M2M tables
+COMPACT_SKILL_SETS = os.environ.get('COMPACT_SKILL_SETS', 'True') == 'True'
+
+# Compiled tree artifacts kept per worker (see skills.artifacts)
+TREE_ARTIFACT_CACHE_SIZE = int(os.environ.get('TREE_ARTIFACT_CACHE_SIZE', '512'))
+
+# Compute tree layouts, and the learning orders of graph edits saved outside the
+# admin and commands, on a background thread after the edits commit instead of
+# inside the saving request; False does both before the request returns
+TREE_LAYOUT_BACKGROUND = os.environ.get('TREE_LAYOUT_BACKGROUND', 'True') == 'True'
+
+# Serialized pause manifests kept per worker (see skills.pauses)
+PAUSE_MANIFEST_CACHE_SIZE = int(os.environ.get('PAUSE_MANIFEST_CACHE_SIZE', '4096'))
+
+# Log a warning when the cross-tree dashboard takes longer than this
+DASHBOARD_BUDGET_MS = int(os.environ.get('DASHBOARD_BUDGET_MS', '50'))
+
+# Video position heartbeats are buffered per worker and written in batches (see skills.heartbeat)
+HEARTBEAT_FLUSH_SECONDS = float(os.environ.get('HEARTBEAT_FLUSH_SECONDS', '5'))
+HEARTBEAT_MAX_BUFFER = int(os.environ.get('HEARTBEAT_MAX_BUFFER', '5000'))
+
+# Append learner writes to an event log folded in bulk every PROGRESS_COMPACT_SECONDS (see skills.events)
+PROGRESS_EVENT_LOG = os.environ.get('PROGRESS_EVENT_LOG', 'False') == 'True'
+PROGRESS_COMPACT_SECONDS = float(os.environ.get('PROGRESS_COMPACT_SECONDS', '10'))
+
+# Per-request query count, DB, view and template times as Server-Timing headers
+# and JSON lines on the skilltrees.timing logger (see skilltrees.timing)
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING', 'True') == 'True'
+# WARNING logs only over-budget requests; INFO adds a line for every request
+REQUEST_TIMING_LOG_LEVEL = os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'WARNING')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'skilltrees.timing': {'handlers': ['console'], 'level': REQUEST_TIMING_LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Staff can profile a request with the X-Profile: 1 header or ?profile=1; a
+# PROFILE_SAMPLE_RATE fraction of all requests is profiled too (see skills.profiling)
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'True') == 'True'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '500'))
+
+# Prometheus metrics on /metrics (see skilltrees.metrics). With several gunicorn
+# workers set METRICS_DIR to a directory that is emptied on every start, so /metrics
+# adds up all workers. Scrapers send "Authorization: Bearer <METRICS_TOKEN>";
+# without a token only staff sessions can read it
+METRICS = os.environ.get('METRICS', 'True') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Allow YouTube embeds to work (prevents error 153)
 SECURE_REFERRER_POLICY = 'strict-origin-when-cross-origin'
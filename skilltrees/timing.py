@@ -0,0 +1,257 @@
+"""
+Per-request SQL, view and template timings.
+
+`RequestTimingMiddleware` collects, for every request, the number of queries
+and the time spent in cursor.execute on all database aliases, the view time
+and the template render time. It sends them back as a Server-Timing header
+(visible in the browser's network panel) and logs them as one JSON line on the
+"skilltrees.timing" logger.
+
+Queries are counted by an execute wrapper that every connection gets when it
+opens; it adds to the timings of the current context, so the queries async
+views run through sync_to_async (on any thread) are counted as well.
+Transaction control (BEGIN IMMEDIATE, savepoints) also runs through the
+cursor; `is_transaction_control` sets it apart, and it is logged next to the
+query count instead of in it. Template rendering is timed by the
+`TimedDjangoTemplates` backend.
+
+Views declare how many queries they may issue with `query_budget(n)`. The
+middleware logs a warning for requests over budget; `assert_query_budget`
+counts through the same wrapper and fails a test instead.
+"""
+import contextvars
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_CONTROL = re.compile(r'\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+# Timings collected by assert_query_budget around a test client request
+_captured = contextvars.ContextVar('captured_timings', default=None)
+
+
+def is_transaction_control(sql):
+    """Whether a statement opens, ends or marks a transaction rather than reading or writing data."""
+    return TRANSACTION_CONTROL.match(sql) is not None
+
+
+class RequestTimings:
+
+    def __init__(self, keep_sql=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.transaction_statements = 0
+        self.db_ms = 0.0
+        # SQL of the counted queries, for assert_query_budget's failure message
+        self.sql = [] if keep_sql else None
+        self.template_ms = 0.0
+        self.view_started = None
+        self.view_ms = 0.0
+        self.view = None
+
+    def server_timing(self, total_ms):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_ms:.1f};desc="templates"',
+            f'view;dur={self.view_ms:.1f};desc="view"',
+            f'total;dur={total_ms:.1f};desc="total"',
+        ])
+
+    def add_statement(self, sql, ms):
+        self.db_ms += ms
+        if is_transaction_control(sql):
+            self.transaction_statements += 1
+            return
+        self.queries += 1
+        if self.sql is not None:
+            self.sql.append(sql)
+
+
+def record_query(execute, sql, params, many, context):
+    recorders = [timings for timings in (_current.get(), _captured.get()) if timings is not None]
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        for timings in recorders:
+            timings.add_statement(sql, ms)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def install_query_recorders():
+    # Connections opened before this module was imported missed the signal
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_ms += (time.perf_counter() - start) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates whose templates add their render time to the request's timings."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class RequestTimingMiddleware:
+    """Server-Timing header and a JSON log line per request (REQUEST_TIMING=False disables)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def begin(self, request):
+        install_query_recorders()
+        request.timings = RequestTimings()
+        return request.timings, _current.set(request.timings)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timings.view = view_func
+        request.timings.view_started = time.perf_counter()
+
+    def finish(self, request, response, timings):
+        now = time.perf_counter()
+        total_ms = (now - timings.started) * 1000
+        if timings.view_started is not None:
+            timings.view_ms = (now - timings.view_started) * 1000
+        server_timing = timings.server_timing(total_ms)
+        if response.has_header('Server-Timing'):
+            server_timing = f'{response["Server-Timing"]}, {server_timing}'
+        response['Server-Timing'] = server_timing
+
+        view_name = view_label(timings.view)
+        budget = getattr(timings.view, 'query_budget', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': view_name,
+            'queries': timings.queries,
+            'transaction_statements': timings.transaction_statements,
+            'query_budget': budget,
+            'db_ms': round(timings.db_ms, 2),
+            'template_ms': round(timings.template_ms, 2),
+            'view_ms': round(timings.view_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }))
+        if budget is not None and timings.queries > budget:
+            logger.warning(
+                '%s issued %d queries for %s %s (budget %d)',
+                view_name, timings.queries, request.method, request.path, budget,
+            )
+        return response
+
+
+@contextmanager
+def untimed():
+    """Leave the queries in this block out of the current request's timings."""
+    token, captured_token = _current.set(None), _captured.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        _captured.reset(captured_token)
+
+
+def view_label(view):
+    if view is None:
+        return None
+    return f'{view.__module__}.{getattr(view, "__qualname__", type(view).__name__)}'
+
+
+def query_budget(queries):
+    """Declare the most queries a view may issue per request."""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def assert_query_budget(client, path, method='get', **kwargs):
+    """
+    Request `path` with a test client and raise AssertionError, listing the
+    SQL, if it issues more queries than its view's `query_budget`. Counts
+    what the middleware counts, through the same execute wrapper, so the
+    queries of pool threads (db_sync_to_async) are included. Returns the
+    response.
+    """
+    view = resolve(urlsplit(path).path).func
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        raise AssertionError(f'{view_label(view)} declares no query budget')
+    install_query_recorders()
+    captured = RequestTimings(keep_sql=True)
+    token = _captured.set(captured)
+    try:
+        response = getattr(client, method)(path, **kwargs)
+    finally:
+        _captured.reset(token)
+    if captured.queries > budget:
+        raise AssertionError(
+            f'{path} issued {captured.queries} queries, {view_label(view)} allows {budget}:\n'
+            + '\n'.join(captured.sql)
+        )
+    return response
@@ -1,6 +1,10 @@
 #!/bin/bash
-python manage.py collectstatic --noinput
-python manage.py migrate
-python manage.py loaddata skills/fixtures/initial_data.json || true
-python manage.py ensure_admin
+# collectstatic, migrate, fixture and admin user, skipping whatever is up to date
+python manage.py boot
+# Workers share metrics through files; start from zero on every deploy
+export METRICS_DIR="${METRICS_DIR:-/tmp/skilltrees-metrics}"
+rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    exec gunicorn skilltrees.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:${PORT:-8000}
+fi
 gunicorn skilltrees.wsgi --bind 0.0.0.0:${PORT:-8000}
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from skills.models import Node
+
 from .models import User
 
 
@@ -17,3 +19,9 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('last_node', 'last_video_position', 'completed_skills'),
         }),
     )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'last_node':
+            # Node.__str__ reads the tree and skill of every option
+            kwargs['queryset'] = Node.objects.select_related('tree', 'skill')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
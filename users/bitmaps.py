@@ -0,0 +1,105 @@
+"""
+Packed skill-id bitmaps.
+
+A user's completed and ignored skills are mirrored into columns on `User`,
+so membership tests, intersections with a tree's skills and counts need no
+row-per-skill reads. In memory a set is an int with bit N set for skill id N.
+Stored, it is its sorted ids as gaps from the previous id minus one, each a
+LEB128 varint (seven bits per byte, high bit set on all but the last byte),
+so a row's size follows how many skills the user has, not the largest skill
+id: a run of consecutive ids costs one byte per id.
+"""
+
+
+def _mask(skill_ids):
+    skill_ids = list(skill_ids)
+    if not skill_ids:
+        return 0
+    # Setting bits in a buffer is linear; OR-ing each id into an int copies it every time
+    bits = bytearray(max(skill_ids) // 8 + 1)
+    for skill_id in skill_ids:
+        bits[skill_id >> 3] |= 1 << (skill_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class SkillBitmap:
+    """Immutable set of skill ids backed by a Python int."""
+
+    __slots__ = ('mask',)
+
+    def __init__(self, mask=0):
+        self.mask = mask
+
+    @classmethod
+    def from_ids(cls, skill_ids):
+        return cls(_mask(skill_ids))
+
+    @classmethod
+    def from_bytes(cls, data):
+        skill_ids = []
+        skill_id, gap, shift = -1, 0, 0
+        for byte in data or b'':
+            gap |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            skill_id += gap + 1
+            skill_ids.append(skill_id)
+            gap, shift = 0, 0
+        return cls(_mask(skill_ids))
+
+    def to_bytes(self):
+        data = bytearray()
+        previous = -1
+        for skill_id in self:
+            gap = skill_id - previous - 1
+            previous = skill_id
+            while gap >= 0x80:
+                data.append(gap & 0x7F | 0x80)
+                gap >>= 7
+            data.append(gap)
+        return bytes(data)
+
+    def with_ids(self, skill_ids):
+        return SkillBitmap(self.mask | _mask(skill_ids))
+
+    def without_ids(self, skill_ids):
+        return SkillBitmap(self.mask & ~_mask(skill_ids))
+
+    def count_in(self, other):
+        """Number of ids shared with another bitmap, without building a set."""
+        return (self.mask & other.mask).bit_count()
+
+    def __contains__(self, skill_id):
+        return skill_id is not None and skill_id >= 0 and (self.mask >> skill_id) & 1 == 1
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __and__(self, other):
+        if isinstance(other, SkillBitmap):
+            return SkillBitmap(self.mask & other.mask)
+        return frozenset(skill_id for skill_id in other if skill_id in self)
+
+    __rand__ = __and__
+
+    def __eq__(self, other):
+        if isinstance(other, SkillBitmap):
+            return self.mask == other.mask
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return f'SkillBitmap({sorted(self)!r})'
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from skills.models import Skill
+from users.bitmaps import SkillBitmap
+from users.models import User
+from users.skillsets import rebuild_skill_bitmaps
+
+
+class Command(BaseCommand):
+    help = 'Compares M2M and bitmap skill sets for one user with many skills (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skills', type=int, default=12000, help='Skills completed by the user')
+        parser.add_argument('--tree-skills', type=int, default=500, help='Skills in the tree used for intersections')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        repeat = options['repeat']
+        creator = User.objects.create(username='bench-creator', is_staff=True)
+        user = User.objects.create(username='bench-learner')
+        skills = Skill.objects.bulk_create([
+            Skill(title=f'bench {i}', video_url='https://example.com', text='', duration=1, creator=creator)
+            for i in range(options['skills'])
+        ], batch_size=1000)
+        skill_ids = [s.pk for s in skills]
+        through = User.completed_skills.through
+        through.objects.bulk_create(
+            [through(user_id=user.pk, skill_id=skill_id) for skill_id in skill_ids], batch_size=1000,
+        )
+        rebuild_skill_bitmaps([user.pk])
+        user.refresh_from_db()
+
+        rng = random.Random(1)
+        probes = [rng.choice(skill_ids) for _ in range(repeat)]
+        tree_ids = rng.sample(skill_ids, min(options['tree_skills'], len(skill_ids)))
+        tree_bitmap = SkillBitmap.from_ids(tree_ids)
+        stored = user.completed_skills_bitmap
+
+        def timed(fn):
+            start = time.perf_counter()
+            for probe in probes:
+                fn(probe)
+            return (time.perf_counter() - start) * 1000 / repeat
+
+        results = [
+            ('membership', 'm2m .all() scan', timed(
+                lambda sid: sid in {s.pk for s in user.completed_skills.all()})),
+            ('membership', 'm2m exists()', timed(
+                lambda sid: user.completed_skills.filter(pk=sid).exists())),
+            ('membership', 'bitmap', timed(
+                lambda sid: sid in SkillBitmap.from_bytes(stored))),
+            ('load set', 'm2m values_list', timed(
+                lambda sid: set(user.completed_skills.values_list('id', flat=True)))),
+            ('load set', 'bitmap', timed(
+                lambda sid: SkillBitmap.from_bytes(stored))),
+            ('tree count', 'm2m filter().count()', timed(
+                lambda sid: user.completed_skills.filter(pk__in=tree_ids).count())),
+            ('tree count', 'bitmap', timed(
+                lambda sid: SkillBitmap.from_bytes(stored).count_in(tree_bitmap))),
+        ]
+
+        self.stdout.write(
+            f'{options["skills"]} completed skills, {len(stored)} stored bytes, '
+            f'{len(tree_ids)} tree skills, {repeat} runs'
+        )
+        self.stdout.write(f'{"operation":<12} {"storage":<22} {"ms/op":>10}')
+        for operation, storage, ms in results:
+            self.stdout.write(f'{operation:<12} {storage:<22} {ms:>10.4f}')
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.9 on 2026-10-17 18:52
+
+from django.db import migrations, models
+
+
+def bitmap_bytes(skill_ids):
+    """A frozen copy of SkillBitmap.from_ids(ids).to_bytes(): bit N set for skill N, little-endian."""
+    mask = 0
+    for skill_id in skill_ids:
+        mask |= 1 << skill_id
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+
+def backfill_bitmaps(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    ids = {'completed_skills': {}, 'ignored_skills': {}}
+    for relation, ids_by_user in ids.items():
+        through = getattr(User, relation).through
+        for user_id, skill_id in through.objects.values_list('user_id', 'skill_id').iterator():
+            ids_by_user.setdefault(user_id, []).append(skill_id)
+    users = []
+    for user in User.objects.only('pk').iterator():
+        user.completed_skills_bitmap = bitmap_bytes(ids['completed_skills'].get(user.pk, []))
+        user.ignored_skills_bitmap = bitmap_bytes(ids['ignored_skills'].get(user.pk, []))
+        users.append(user)
+    User.objects.bulk_update(users, ['completed_skills_bitmap', 'ignored_skills_bitmap'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_ignored_skills'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='completed_skills_bitmap',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='ignored_skills_bitmap',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.RunPython(backfill_bitmaps, migrations.RunPython.noop),
+    ]
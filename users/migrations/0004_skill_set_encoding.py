@@ -0,0 +1,70 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:05
+
+from django.db import migrations
+
+
+def bitmap_ids(data):
+    """A frozen decoder for the 0003 format: bit N set for skill N, little-endian."""
+    mask = int.from_bytes(data, 'little') if data else 0
+    return [skill_id for skill_id in range(mask.bit_length()) if mask >> skill_id & 1]
+
+
+def bitmap_bytes(skill_ids):
+    """A frozen encoder for the 0003 format."""
+    mask = 0
+    for skill_id in skill_ids:
+        mask |= 1 << skill_id
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+
+def gap_ids(data):
+    """A frozen copy of SkillBitmap.from_bytes: sorted ids as LEB128 gaps from the previous id minus one."""
+    skill_ids = []
+    skill_id, gap, shift = -1, 0, 0
+    for byte in data or b'':
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        skill_id += gap + 1
+        skill_ids.append(skill_id)
+        gap, shift = 0, 0
+    return skill_ids
+
+
+def gap_bytes(skill_ids):
+    """A frozen copy of SkillBitmap.to_bytes."""
+    data = bytearray()
+    previous = -1
+    for skill_id in sorted(skill_ids):
+        gap = skill_id - previous - 1
+        previous = skill_id
+        while gap >= 0x80:
+            data.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        data.append(gap)
+    return bytes(data)
+
+
+def reencode(decode, encode):
+    def run(apps, schema_editor):
+        User = apps.get_model('users', 'User')
+        fields = ['completed_skills_bitmap', 'ignored_skills_bitmap']
+        users = []
+        for user in User.objects.only('pk', *fields).iterator():
+            for field in fields:
+                setattr(user, field, encode(decode(bytes(getattr(user, field)))))
+            users.append(user)
+        User.objects.bulk_update(users, fields, batch_size=500)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_skill_bitmaps'),
+    ]
+
+    operations = [
+        migrations.RunPython(reencode(bitmap_ids, gap_bytes), reencode(gap_ids, bitmap_bytes)),
+    ]
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .bitmaps import SkillBitmap
+
 
 class User(AbstractUser):
     """Custom user model with subscription and progress tracking."""
@@ -33,3 +36,42 @@ class User(AbstractUser):
         blank=True,
         related_name='ignored_by',
     )
+
+    # Packed mirrors of the two M2M sets above, kept in sync by users.skillsets
+    completed_skills_bitmap = models.BinaryField(default=b'', blank=True, editable=False)
+    ignored_skills_bitmap = models.BinaryField(default=b'', blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        # Bitmaps are only written by users.skillsets; a full save of a stale
+        # instance must not overwrite them. Deferred fields are left out as
+        # Django itself does, rather than loaded one query each
+        if kwargs.get('update_fields') is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in deferred
+                and f.name not in ('completed_skills_bitmap', 'ignored_skills_bitmap')
+            ]
+        super().save(*args, **kwargs)
+
+    def completed_skill_set(self):
+        """Completed skill ids, from the bitmap column in compact mode, plus unfolded progress events."""
+        if settings.COMPACT_SKILL_SETS:
+            skill_ids = SkillBitmap.from_bytes(self.completed_skills_bitmap)
+        else:
+            skill_ids = set(self.completed_skills.values_list('id', flat=True))
+        return self._with_progress_events(skill_ids, 'completed')
+
+    def ignored_skill_set(self):
+        """Ignored skill ids, from the bitmap column in compact mode, plus unfolded progress events."""
+        if settings.COMPACT_SKILL_SETS:
+            skill_ids = SkillBitmap.from_bytes(self.ignored_skills_bitmap)
+        else:
+            skill_ids = set(self.ignored_skills.values_list('id', flat=True))
+        return self._with_progress_events(skill_ids, 'ignored')
+
+    def _with_progress_events(self, skill_ids, kind):
+        if not settings.PROGRESS_EVENT_LOG:
+            return skill_ids
+        from skills.events import progress_tail
+        return progress_tail(self).apply(skill_ids, kind)
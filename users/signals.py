@@ -0,0 +1,69 @@
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import receiver
+
+from skills.models import Skill
+from skills.signals import in_bulk_deletion
+
+from .models import User
+from .skillsets import BITMAP_FIELDS, rebuild_skill_bitmaps, update_skill_bitmap
+
+
+def _sync_bitmap(relation, instance, action, reverse, pk_set):
+    if not reverse:
+        # instance is the user, pk_set holds skill ids
+        if action == 'post_add':
+            data = update_skill_bitmap(instance.pk, relation, add=pk_set)
+        elif action == 'post_remove':
+            data = update_skill_bitmap(instance.pk, relation, remove=pk_set)
+        elif action == 'post_clear':
+            data = update_skill_bitmap(instance.pk, relation, clear=True)
+        else:
+            return
+        setattr(instance, BITMAP_FIELDS[relation], data)
+        return
+
+    # instance is the skill, pk_set holds user ids
+    if action == 'pre_clear':
+        instance._bitmap_clear_users = list(
+            getattr(User, relation).through.objects.filter(skill_id=instance.pk)
+            .values_list('user_id', flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_bitmap_clear_users', [])
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    for user_id in pk_set:
+        if action == 'post_add':
+            update_skill_bitmap(user_id, relation, add=[instance.pk])
+        else:
+            update_skill_bitmap(user_id, relation, remove=[instance.pk])
+
+
+@receiver(m2m_changed, sender=User.completed_skills.through)
+def completed_skills_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _sync_bitmap('completed_skills', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=User.ignored_skills.through)
+def ignored_skills_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _sync_bitmap('ignored_skills', instance, action, reverse, pk_set)
+
+
+@receiver(pre_delete, sender=Skill)
+def skill_deleting(sender, instance, **kwargs):
+    if in_bulk_deletion():
+        return
+    # The cascade removes the M2M rows without an m2m_changed signal
+    instance._bitmap_users = set()
+    for relation in BITMAP_FIELDS:
+        instance._bitmap_users.update(
+            getattr(User, relation).through.objects.filter(skill_id=instance.pk).values_list('user_id', flat=True)
+        )
+
+
+@receiver(post_delete, sender=Skill)
+def skill_deleted(sender, instance, **kwargs):
+    user_ids = getattr(instance, '_bitmap_users', None)
+    if user_ids:
+        rebuild_skill_bitmaps(user_ids)
@@ -0,0 +1,60 @@
+"""Keep the packed skill bitmaps on `User` in step with the M2M tables."""
+from django.db import transaction
+
+from .bitmaps import SkillBitmap
+from .models import User
+
+BITMAP_FIELDS = {
+    'completed_skills': 'completed_skills_bitmap',
+    'ignored_skills': 'ignored_skills_bitmap',
+}
+
+
+@transaction.atomic
+def update_skill_bitmap(user_id, relation, add=(), remove=(), clear=False):
+    """Apply an M2M change to a user's bitmap; the row lock serializes writers."""
+    field = BITMAP_FIELDS[relation]
+    current = (
+        User.objects.select_for_update().filter(pk=user_id).values_list(field, flat=True).first()
+    )
+    bitmap = SkillBitmap() if clear else SkillBitmap.from_bytes(current)
+    bitmap = bitmap.with_ids(add).without_ids(remove)
+    data = bitmap.to_bytes()
+    User.objects.filter(pk=user_id).update(**{field: data})
+    return data
+
+
+def rebuild_skill_bitmaps(user_ids=None):
+    """Recompute bitmaps from the M2M tables. Returns the number of users updated."""
+    users = User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+    updated = 0
+    for user_ids_chunk in _chunks(users.values_list('pk', flat=True).iterator(), 500):
+        rows = []
+        for relation, field in BITMAP_FIELDS.items():
+            through = getattr(User, relation).through
+            ids_by_user = {user_id: [] for user_id in user_ids_chunk}
+            for user_id, skill_id in through.objects.filter(
+                user_id__in=user_ids_chunk,
+            ).values_list('user_id', 'skill_id').iterator():
+                ids_by_user[user_id].append(skill_id)
+            rows.append((field, ids_by_user))
+        changed = []
+        for user_id in user_ids_chunk:
+            user = User(pk=user_id)
+            for field, ids_by_user in rows:
+                setattr(user, field, SkillBitmap.from_ids(ids_by_user[user_id]).to_bytes())
+            changed.append(user)
+        User.objects.bulk_update(changed, list(BITMAP_FIELDS.values()))
+        updated += len(changed)
+    return updated
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
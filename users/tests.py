@@ -1,3 +1,100 @@
-from django.test import TestCase
+import random
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from skills.models import Skill
+
+from .bitmaps import SkillBitmap
+from .models import User
+
+
+class SkillBitmapTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        rng = random.Random(6)
+        cases = [[], [0], [127], [128], [1, 2, 3], [5, 100000], rng.sample(range(50000), 2000)]
+        for skill_ids in cases:
+            data = SkillBitmap.from_ids(skill_ids).to_bytes()
+            self.assertEqual(list(SkillBitmap.from_bytes(data)), sorted(skill_ids))
+
+    def test_size_follows_the_set(self):
+        # One byte per id in a run, a few for an id far from the previous one
+        self.assertEqual(SkillBitmap.from_ids(range(1000, 1100)).to_bytes()[2:], bytes(99))
+        self.assertEqual(len(SkillBitmap.from_ids([10 ** 6]).to_bytes()), 3)
+
+    def test_set_operations(self):
+        bitmap = SkillBitmap.from_ids([1, 5, 9]).with_ids([2]).without_ids([5])
+        self.assertEqual(set(bitmap), {1, 2, 9})
+        self.assertIn(9, bitmap)
+        self.assertNotIn(None, bitmap)
+        self.assertEqual(bitmap.count_in(SkillBitmap.from_ids([2, 9, 10])), 2)
+        self.assertEqual(bitmap & {1, 3}, frozenset({1}))
+
+
+class BitmapSyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user('author', is_staff=True)
+        cls.skills = [
+            Skill.objects.create(title=f'Skill {i}', video_url='https://example.com/v', text='', duration=60,
+                                 creator=creator)
+            for i in range(3)
+        ]
+        cls.learners = [User.objects.create_user(f'learner{i}') for i in range(2)]
+
+    def stored(self, user, field='completed_skills_bitmap'):
+        return set(SkillBitmap.from_bytes(getattr(User.objects.get(pk=user.pk), field)))
+
+    def test_forward_changes(self):
+        user = self.learners[0]
+        a, b, c = self.skills
+        user.completed_skills.add(a, b)
+        user.ignored_skills.add(c)
+        self.assertEqual(self.stored(user), {a.pk, b.pk})
+        self.assertEqual(self.stored(user, 'ignored_skills_bitmap'), {c.pk})
+        # The instance is updated too
+        self.assertEqual(set(SkillBitmap.from_bytes(user.completed_skills_bitmap)), {a.pk, b.pk})
+
+        user.completed_skills.remove(a)
+        self.assertEqual(self.stored(user), {b.pk})
+        user.completed_skills.set([a, c])
+        self.assertEqual(self.stored(user), {a.pk, c.pk})
+        user.completed_skills.clear()
+        self.assertEqual(self.stored(user), set())
+        self.assertEqual(self.stored(user, 'ignored_skills_bitmap'), {c.pk})
+
+    def test_reverse_changes(self):
+        first, second = self.learners
+        a, b, _ = self.skills
+        a.completed_by.add(first, second)
+        b.completed_by.add(first)
+        self.assertEqual((self.stored(first), self.stored(second)), ({a.pk, b.pk}, {a.pk}))
+
+        a.completed_by.remove(second)
+        self.assertEqual(self.stored(second), set())
+        a.completed_by.clear()
+        self.assertEqual((self.stored(first), self.stored(second)), ({b.pk}, set()))
+
+    def test_skill_deletion(self):
+        first, second = self.learners
+        a, b, c = self.skills
+        first.completed_skills.add(a, b)
+        second.ignored_skills.add(b)
+        b.delete()
+        self.assertEqual(self.stored(first), {a.pk})
+        self.assertEqual(self.stored(second, 'ignored_skills_bitmap'), set())
+
+    def test_full_save_keeps_bitmaps_and_deferred_fields(self):
+        user = self.learners[0]
+        stale = User.objects.defer('email', 'completed_skills_bitmap').get(pk=user.pk)
+        user.completed_skills.add(self.skills[0])
+        User.objects.filter(pk=user.pk).update(email='new@example.com')
+
+        stale.first_name = 'Ada'
+        with self.assertNumQueries(1):
+            stale.save()
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, 'Ada')
+        self.assertEqual(user.email, 'new@example.com')
+        self.assertEqual(self.stored(user), {self.skills[0].pk})